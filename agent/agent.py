@@ -6,14 +6,29 @@ import json
 import os
 import subprocess
 import shutil
-from datetime import datetime
-from flask import Flask, request, jsonify, send_file
+from datetime import datetime, date
+from flask import Flask, request, jsonify, send_file, Response
 import logging
 import glob
 import zipfile
 import tarfile
 import signal
+import atexit
+import codecs
+import gzip
+import queue
+import zlib
+import re
+import sqlite3
+import selectors
+import hashlib
+import fcntl
+import uuid
+import itertools
+from collections import deque
+from itertools import islice
 from werkzeug.utils import secure_filename
+from requests.adapters import HTTPAdapter
 
 # Configure logging
 logging.basicConfig(
@@ -23,11 +38,2084 @@ logging.basicConfig(
 )
 logger = logging.getLogger('MCPanelAgent')
 
+CONSOLE_EPOCH_SHIFT = 20
+_console_epoch_lock = threading.Lock()
+_console_last_epoch = 0
+
+def _new_console_epoch():
+    """Pierwszy numer nowego bufora (sekunda << CONSOLE_EPOCH_SHIFT) - kursor niesie epokę bufora"""
+    global _console_last_epoch
+    with _console_epoch_lock:
+        _console_last_epoch = max(int(time.time()) << CONSOLE_EPOCH_SHIFT,
+                                  _console_last_epoch + (1 << CONSOLE_EPOCH_SHIFT))
+        return _console_last_epoch
+
+class ConsoleBuffer:
+    """Bufor pierścieniowy konsoli serwera z numerami sekwencyjnymi linii (od epoki `base`)"""
+    
+    def __init__(self, capacity=1000):
+        self.capacity = max(1, int(capacity))
+        self._lines = deque(maxlen=self.capacity)
+        self.base = _new_console_epoch()
+        self._next_seq = self.base
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self.closed = False
+    
+    def __len__(self):
+        return len(self._lines)
+    
+    @property
+    def next_seq(self):
+        return self._next_seq
+    
+    @property
+    def first_seq(self):
+        with self._lock:
+            return self._next_seq - len(self._lines)
+    
+    def owns(self, seq):
+        """Czy kursor pochodzi z tego bufora (a nie z poprzedniego procesu)"""
+        return self.base <= seq <= self._next_seq
+    
+    def append(self, line):
+        """Dopisz linię (O(1)) i zwróć jej numer sekwencyjny"""
+        with self._lock:
+            seq = self._next_seq
+            self._lines.append(line)
+            self._next_seq = seq + 1
+            self._cond.notify_all()
+        return seq
+    
+    def tail(self, count):
+        """Zwróć ostatnie `count` linii bez kopiowania całego bufora"""
+        if count <= 0:
+            return []
+        with self._lock:
+            recent = list(islice(reversed(self._lines), count))
+        recent.reverse()
+        return recent
+    
+    def read_since(self, seq):
+        """Zwróć (start_seq, linie) od numeru `seq` włącznie"""
+        with self._lock:
+            start = max(seq, self._next_seq - len(self._lines))
+            count = self._next_seq - start
+            if count <= 0:
+                return self._next_seq, []
+            lines = list(islice(reversed(self._lines), count))
+        lines.reverse()
+        return start, lines
+    
+    def read_cursor(self, since, limit=None):
+        """Odczyt przyrostowy: nowe linie, kursor, luka po zawinięciu bufora i reset"""
+        reset = not self.owns(since)
+        if reset:
+            since = self.base
+        start, lines = self.read_since(since)
+        if limit is not None and len(lines) > limit:
+            lines = lines[:limit]
+        return {
+            'lines': lines,
+            'next': start + len(lines),
+            'gap': start - since,
+            'reset': reset
+        }
+    
+    def wait(self, seq, timeout=None):
+        """Czekaj na linię o numerze `seq` lub zamknięcie bufora"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._next_seq > seq or self.closed, timeout)
+    
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+LOG_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def parse_line_timestamp(line):
+    """Znacznik czasu '[YYYY-mm-dd HH:MM:SS]' z początku linii jako epoch (albo None)"""
+    if isinstance(line, bytes):
+        line = line[:21].decode('ascii', errors='ignore')
+    if len(line) < 21 or line[0] != '[' or line[20] != ']':
+        return None
+    try:
+        return datetime.strptime(line[1:20], LOG_TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+def _in_window(ts, start, end):
+    return (start is None or ts >= start) and (end is None or ts <= end)
+
+def console_log_path(server_path):
+    """Log konsoli agenta (logs/panel/console.log) - latest.log przenosi i kompresuje log4j serwera"""
+    return os.path.join(server_path, 'logs', 'panel', 'console.log')
+
+class LogArchive:
+    """Segmenty gzip (wiele członów) logu serwera w logs/panel/ z indeksem czasu bloków"""
+    
+    def __init__(self, log_dir, keep_segments=30, block_bytes=256 * 1024):
+        self.log_dir = log_dir
+        self.archive_dir = os.path.join(log_dir, 'panel')
+        self.index_path = os.path.join(self.archive_dir, 'index.json')
+        self.keep_segments = keep_segments
+        self.block_bytes = block_bytes
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def for_log(cls, log_file, **kwargs):
+        """Archiwum logu konsoli (plik leży w katalogu archiwum)"""
+        return cls(os.path.dirname(os.path.dirname(log_file)), **kwargs)
+    
+    def pending_path(self, stamp):
+        return os.path.join(self.archive_dir, f'rotating-{stamp}.log')
+    
+    def pending_segments(self):
+        return sorted(glob.glob(os.path.join(self.archive_dir, 'rotating-*.log')))
+    
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'segments': []}
+    
+    def _save_index(self, index):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+    
+    def _segment_name(self, start):
+        day = datetime.fromtimestamp(start).strftime('%Y-%m-%d') if start else \
+            datetime.now().strftime('%Y-%m-%d')
+        n = 1
+        while os.path.exists(os.path.join(self.archive_dir, f'{day}-{n}.log.gz')):
+            n += 1
+        return f'{day}-{n}.log.gz'
+    
+    def compress_segment(self, raw_path):
+        if not os.path.exists(raw_path):
+            return None
+        
+        blocks = []
+        block = []
+        block_size = 0
+        block_start = block_end = None
+        last_ts = None
+        raw_bytes = 0
+        
+        tmp_path = raw_path + '.gz.tmp'
+        with open(raw_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            def write_block():
+                offset = dst.tell()
+                dst.write(gzip.compress(b''.join(block)))
+                blocks.append([block_start, block_end, offset, dst.tell() - offset])
+            
+            for line in src:
+                ts = parse_line_timestamp(line)
+                if ts is not None:
+                    last_ts = ts
+                if block_start is None:
+                    block_start = last_ts
+                block_end = last_ts
+                block.append(line)
+                block_size += len(line)
+                raw_bytes += len(line)
+                if block_size >= self.block_bytes:
+                    write_block()
+                    block, block_size, block_start = [], 0, None
+            if block:
+                write_block()
+        
+        if not blocks:
+            os.remove(tmp_path)
+            os.remove(raw_path)
+            return None
+        
+        with self._lock:
+            start = next((b[0] for b in blocks if b[0] is not None), None)
+            name = self._segment_name(start)
+            os.replace(tmp_path, os.path.join(self.archive_dir, name))
+            os.remove(raw_path)
+            
+            index = self.load_index()
+            index['segments'].append({
+                'file': name,
+                'start': start,
+                'end': blocks[-1][1],
+                'bytes': raw_bytes,
+                'blocks': blocks
+            })
+            segments = index['segments']
+            if self.keep_segments and len(segments) > self.keep_segments:
+                for segment in segments[:-self.keep_segments]:
+                    try:
+                        os.remove(os.path.join(self.archive_dir, segment['file']))
+                    except OSError:
+                        pass
+                index['segments'] = segments[-self.keep_segments:]
+            self._save_index(index)
+        return name
+    
+    def read_window(self, start=None, end=None, limit=None):
+        result = []
+        for segment in self.load_index()['segments']:
+            if not self._overlaps(segment['start'], segment['end'], start, end):
+                continue
+            path = os.path.join(self.archive_dir, segment['file'])
+            try:
+                f = open(path, 'rb')
+            except OSError:
+                continue
+            with f:
+                for block_start, block_end, offset, length in segment['blocks']:
+                    if not self._overlaps(block_start, block_end, start, end):
+                        continue
+                    f.seek(offset)
+                    data = zlib.decompress(f.read(length), 16 + zlib.MAX_WBITS)
+                    last_ts = block_start
+                    for line in data.decode('utf-8', errors='ignore').splitlines(keepends=True):
+                        ts = parse_line_timestamp(line)
+                        if ts is not None:
+                            last_ts = ts
+                        if last_ts is not None and _in_window(last_ts, start, end):
+                            result.append(line)
+                            if limit is not None and len(result) >= limit:
+                                return result
+        return result
+    
+    @staticmethod
+    def _overlaps(range_start, range_end, start, end):
+        if range_start is None or range_end is None:
+            return True
+        return (end is None or range_start <= end) and (start is None or range_end >= start)
+
+def read_log_window(log_file, start=None, end=None, limit=1000):
+    """Okno czasowe logu: segmenty archiwum, potem bieżący plik (bisekcja po czasie)"""
+    lines = LogArchive.for_log(log_file).read_window(start, end, limit)
+    if (limit is None or len(lines) < limit) and os.path.exists(log_file):
+        with open(log_file, 'rb') as f:
+            if start is not None:
+                lo, hi = 0, os.fstat(f.fileno()).st_size
+                while hi - lo > 4096:
+                    mid = (lo + hi) // 2
+                    f.seek(mid)
+                    f.readline()
+                    ts = None
+                    while ts is None and f.tell() < hi:
+                        line = f.readline()
+                        if not line:
+                            break
+                        ts = parse_line_timestamp(line)
+                    if ts is not None and ts < start:
+                        lo = mid
+                    else:
+                        hi = mid
+                f.seek(lo)
+                if lo > 0:
+                    f.readline()
+            last_ts = None
+            for line in f:
+                ts = parse_line_timestamp(line)
+                if ts is not None:
+                    last_ts = ts
+                if last_ts is None:
+                    continue
+                if end is not None and last_ts > end:
+                    break
+                if _in_window(last_ts, start, end):
+                    lines.append(line.decode('utf-8', errors='ignore'))
+                    if limit is not None and len(lines) >= limit:
+                        break
+    return {'lines': lines, 'truncated': limit is not None and len(lines) >= limit}
+
+LOG_SEARCH_MIN_FTS_QUERY = 3
+LOG_SEARCH_PRUNE_INTERVAL = 3600
+
+def _detect_trigram():
+    try:
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')")
+        conn.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+# Tokenizer trigram (SQLite >= 3.34) pozwala szukać dowolnych podciągów przez FTS5
+FTS_HAS_TRIGRAM = _detect_trigram()
+
+_LOG_SEARCH_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS lines (id INTEGER PRIMARY KEY, ts REAL NOT NULL, line TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS lines_ts ON lines (ts)',
+]
+_LOG_SEARCH_FTS_SCHEMA = [
+    # detail=none: indeks o połowę mniejszy, a wyszukiwanie LIKE nadal idzie przez trigramy
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5("
+    "line, content='lines', content_rowid='id', tokenize='trigram', detail=none)",
+    'CREATE TRIGGER IF NOT EXISTS lines_ai AFTER INSERT ON lines BEGIN '
+    'INSERT INTO lines_fts (rowid, line) VALUES (new.id, new.line); END',
+    'CREATE TRIGGER IF NOT EXISTS lines_ad AFTER DELETE ON lines BEGIN '
+    "INSERT INTO lines_fts (lines_fts, rowid, line) VALUES ('delete', old.id, old.line); END",
+]
+
+def log_search_db_path(log_file):
+    return os.path.join(os.path.dirname(log_file), 'search.db')
+
+def _log_rows(lines, last_ts=None):
+    """Pary (ts, linia); linie bez znacznika czasu dziedziczą czas poprzedniej"""
+    rows = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        ts = parse_line_timestamp(line)
+        if ts is not None:
+            last_ts = ts
+        rows.append((last_ts if last_ts is not None else time.time(), line))
+    return rows, last_ts
+
+class LogSearchIndex:
+    """Indeks pełnotekstowy logów (SQLite FTS5, logs/panel/search.db) zasilany z LogSink"""
+
+    def __init__(self, retention_days=30):
+        self.retention = retention_days * 86400 if retention_days else None
+        self._queue = queue.Queue()
+        self._connections = {}
+        self._last_prune = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enqueue(self, log_file, data, offset=None):
+        """Dodaj zapisaną paczkę linii (`offset` - pozycja w pliku przed zapisem)"""
+        self._put(('lines', log_file, data, offset))
+
+    def request_backfill(self, log_file):
+        self._put(('backfill', log_file, None, None))
+
+    def _put(self, item):
+        self._queue.put(item)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='LogSearchIndex', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            try:
+                while True:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            touched = set()
+            for kind, log_file, data, offset in items:
+                try:
+                    conn = self._connection(log_file, offset)
+                    if kind == 'lines':
+                        rows, _ = _log_rows(data.splitlines())
+                        conn.executemany('INSERT INTO lines (ts, line) VALUES (?, ?)', rows)
+                    touched.add(log_file)
+                except Exception as e:
+                    logger.error(f"Error indexing log {log_file}: {e}")
+
+            for log_file in touched:
+                try:
+                    conn = self._connections[log_file]
+                    conn.commit()
+                    self._prune(log_file, conn)
+                except Exception as e:
+                    logger.error(f"Error committing log index {log_file}: {e}")
+
+    def _connection(self, log_file, offset=None):
+        conn = self._connections.get(log_file)
+        if conn is not None:
+            return conn
+        path = log_search_db_path(log_file)
+        created = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in _LOG_SEARCH_SCHEMA + (_LOG_SEARCH_FTS_SCHEMA if FTS_HAS_TRIGRAM else []):
+            conn.execute(statement)
+        self._connections[log_file] = conn
+        if created:
+            self._backfill(conn, log_file, offset)
+        return conn
+
+    def _backfill(self, conn, log_file, live_limit=None):
+        """Zaindeksuj archiwum, pliki czekające na kompresję i bieżący log"""
+        archive = LogArchive.for_log(log_file)
+        last_ts = None
+
+        def insert(lines):
+            nonlocal last_ts
+            rows, last_ts = _log_rows(lines, last_ts)
+            conn.executemany('INSERT INTO lines (ts, line) VALUES (?, ?)', rows)
+
+        for segment in archive.load_index()['segments']:
+            try:
+                with gzip.open(os.path.join(archive.archive_dir, segment['file']), 'rt',
+                               encoding='utf-8', errors='ignore') as f:
+                    insert(f)
+            except OSError:
+                continue
+        for pending in archive.pending_segments():
+            try:
+                with open(pending, 'r', encoding='utf-8', errors='ignore') as f:
+                    insert(f)
+            except OSError:
+                continue
+        if os.path.exists(log_file):
+            with open(log_file, 'rb') as f:
+                # Linie zapisane od `live_limit` przyjdą z kolejki - nie dubluj ich
+                data = f.read(live_limit) if live_limit is not None else f.read()
+            insert(data.decode('utf-8', errors='ignore').splitlines())
+        conn.commit()
+
+    def _prune(self, log_file, conn):
+        if not self.retention:
+            return
+        now = time.time()
+        if now - self._last_prune.get(log_file, 0) < LOG_SEARCH_PRUNE_INTERVAL:
+            return
+        self._last_prune[log_file] = now
+        conn.execute('DELETE FROM lines WHERE ts < ?', (now - self.retention,))
+        conn.commit()
+
+    def search(self, log_file, query=None, regex=None, start=None, end=None, limit=200):
+        """Szukaj linii po podciągu (bez rozróżniania wielkości liter), regexie i czasie.
+
+        Zwraca {'results': [{'time', 'line'}], 'indexing', 'took_ms'} - najnowsze
+        linie pierwsze. Nieprawidłowy regex zgłasza ValueError.
+        """
+        started = time.perf_counter()
+        path = log_search_db_path(log_file)
+        if not os.path.exists(path):
+            self.request_backfill(log_file)
+            return {'results': [], 'indexing': True, 'took_ms': 0}
+
+        pattern = None
+        if regex:
+            try:
+                pattern = re.compile(regex)
+            except re.error as e:
+                raise ValueError(f'Invalid regex: {e}')
+
+        use_fts = bool(query) and FTS_HAS_TRIGRAM and len(query) >= LOG_SEARCH_MIN_FTS_QUERY
+        clauses = []
+        params = []
+        if start is not None:
+            clauses.append('l.ts >= ?')
+            params.append(start)
+        if end is not None:
+            clauses.append('l.ts <= ?')
+            params.append(end)
+        if use_fts:
+            escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("f.line LIKE ? ESCAPE '\\'")
+            params.append(f'%{escaped}%')
+        elif query:
+            clauses.append('instr(lower(l.line), lower(?)) > 0')
+            params.append(query)
+        if pattern is not None:
+            clauses.append('l.line REGEXP ?')
+            params.append(regex)
+
+        conn = sqlite3.connect(path, timeout=5)
+        try:
+            # Zakres czasu zamieniony na zakres id (indeks po ts), żeby FTS
+            # i skan regexu nie przeglądały linii spoza okna
+            id_column = 'f.rowid' if use_fts else 'l.id'
+            if start is not None:
+                row = conn.execute('SELECT id FROM lines WHERE ts >= ? ORDER BY ts LIMIT 1', (start,)).fetchone()
+                if row is None:
+                    return {'results': [], 'indexing': False, 'took_ms': 0}
+                clauses.append(f'{id_column} >= {int(row[0])}')
+            if end is not None:
+                row = conn.execute('SELECT id FROM lines WHERE ts <= ? ORDER BY ts DESC LIMIT 1', (end,)).fetchone()
+                if row is None:
+                    return {'results': [], 'indexing': False, 'took_ms': 0}
+                clauses.append(f'{id_column} <= {int(row[0])}')
+
+            if use_fts:
+                sql = 'SELECT l.ts, l.line FROM lines_fts f JOIN lines l ON l.id = f.rowid'
+            else:
+                sql = 'SELECT l.ts, l.line FROM lines l'
+            if clauses:
+                sql += ' WHERE ' + ' AND '.join(clauses)
+            sql += f' ORDER BY {id_column} DESC LIMIT ?'
+            params.append(limit)
+
+            if pattern is not None:
+                conn.create_function('regexp', 2,
+                                     lambda _expr, value: pattern.search(value) is not None,
+                                     deterministic=True)
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        return {
+            'results': [{'time': ts, 'line': line} for ts, line in rows],
+            'indexing': False,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+
+class LogSink:
+    """Buforowany zapis własnego logu konsoli (console_log_path) - jeden uchwyt, zapis paczkami, rotacja obok"""
+    
+    def __init__(self, path, flush_interval=1.0, flush_bytes=64 * 1024,
+                 rotate_bytes=0, rotate_daily=False, on_rotate=None, on_flush=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.on_rotate = on_rotate
+        self.on_flush = on_flush
+        self._pending = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._opened_day = None
+        self.closed = False
+        # Rotacja przenosi plik - tylko dla własnego logu w logs/panel/, nigdy dla latest.log serwera
+        self.rotatable = os.path.basename(os.path.dirname(path)) == 'panel'
+        if (rotate_bytes or rotate_daily) and not self.rotatable:
+            logger.warning(f"Log {path} is not an agent console log, rotation disabled for it")
+    
+    def write(self, line):
+        with self._lock:
+            if self.closed:
+                return
+            self._pending.append(line)
+            self._pending_bytes += len(line.encode('utf-8'))
+            if (self._pending_bytes >= self.flush_bytes or
+                    time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+    
+    def flush(self, force=False):
+        with self._lock:
+            if force or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+    
+    def _ensure_open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._size = self._file.tell()
+            if self._size:
+                self._opened_day = date.fromtimestamp(os.path.getmtime(self.path))
+            else:
+                self._opened_day = date.today()
+    
+    def _should_rotate(self, incoming):
+        if not self._size or not self.rotatable:
+            return False
+        if self.rotate_bytes and self._size + incoming > self.rotate_bytes:
+            return True
+        return self.rotate_daily and self._opened_day != date.today()
+    
+    def _rotate_locked(self):
+        self._file.close()
+        self._file = None
+        archive = LogArchive.for_log(self.path)
+        target = archive.pending_path(time.time_ns())
+        try:
+            os.makedirs(archive.archive_dir, exist_ok=True)
+            os.replace(self.path, target)
+        except OSError as e:
+            logger.error(f"Error rotating log file {self.path}: {e}")
+            self._ensure_open()
+            # Stary plik nadal ma swoje dane - offsety indeksu liczone od jego rozmiaru
+            self._size = os.fstat(self._file.fileno()).st_size
+            self._opened_day = date.today()
+            return
+        if self.on_rotate:
+            self.on_rotate(target)
+    
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        try:
+            data = ''.join(self._pending)
+            size = len(data.encode('utf-8'))
+            self._ensure_open()
+            if self._should_rotate(size):
+                self._rotate_locked()
+                self._ensure_open()
+            offset = self._size
+            self._file.write(data)
+            self._file.flush()
+            self._size += size
+            if self.on_flush:
+                self.on_flush(self.path, data, offset)
+        except Exception as e:
+            logger.error(f"Error writing to log file {self.path}: {e}")
+        finally:
+            self._pending = []
+            self._pending_bytes = 0
+    
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self._flush_locked()
+            self.closed = True
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except Exception:
+                    pass
+                self._file = None
+
+class LogSinkRegistry:
+    """Otwarte logi serwerów + wątek dopisujący zaległe paczki i wątek kompresji; domykane przy wyjściu"""
+    
+    def __init__(self, flush_interval=1.0, flush_bytes=64 * 1024,
+                 rotate_bytes=0, rotate_daily=False, archive_keep=30, on_flush=None):
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.archive_keep = archive_keep
+        self.on_flush = on_flush
+        self._sinks = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._archive_queue = queue.Queue()
+        self._archive_lock = threading.Lock()
+        self._archiver = None
+        atexit.register(self.close_all)
+    
+    def open(self, key, path):
+        with self._lock:
+            sink = self._sinks.get(key)
+            if sink is not None and (sink.closed or sink.path != path):
+                sink.close()
+                sink = None
+            if sink is None:
+                sink = LogSink(path, self.flush_interval, self.flush_bytes,
+                               self.rotate_bytes, self.rotate_daily, self._queue_archive,
+                               self.on_flush)
+                self._sinks[key] = sink
+                for pending in LogArchive.for_log(path).pending_segments():
+                    self._queue_archive(pending)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+            return sink
+    
+    def _queue_archive(self, raw_path):
+        self._archive_queue.put(raw_path)
+        with self._archive_lock:
+            if self._archiver is None:
+                self._archiver = threading.Thread(target=self._archive_loop, daemon=True)
+                self._archiver.start()
+    
+    def _archive_loop(self):
+        while True:
+            raw_path = self._archive_queue.get()
+            log_dir = os.path.dirname(os.path.dirname(raw_path))
+            try:
+                LogArchive(log_dir, keep_segments=self.archive_keep).compress_segment(raw_path)
+            except Exception as e:
+                logger.error(f"Error archiving log segment {raw_path}: {e}")
+    
+    def close(self, key):
+        with self._lock:
+            sink = self._sinks.pop(key, None)
+        if sink is not None:
+            sink.close()
+    
+    def close_all(self):
+        with self._lock:
+            sinks = list(self._sinks.values())
+            self._sinks.clear()
+        for sink in sinks:
+            sink.close()
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                sinks = list(self._sinks.values())
+            for sink in sinks:
+                sink.flush()
+
+def tail_lines(path, lines=100, before=None, block_size=64 * 1024):
+    """Ostatnie `lines` linii pliku czytane blokami od końca (przed offsetem `before`)"""
+    lines = max(0, int(lines))
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if before is None else max(0, min(int(before), size))
+        if lines == 0 or end == 0:
+            return {'lines': [], 'start': end, 'end': end, 'size': size, 'has_more': end > 0}
+        
+        pos = end
+        chunks = []
+        newlines = 0
+        while pos > 0 and newlines <= lines:
+            read_size = min(block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            chunk = f.read(read_size)
+            chunks.append(chunk)
+            newlines += chunk.count(b'\n')
+    
+    chunks.reverse()
+    data = b''.join(chunks)
+    trailing = data.endswith(b'\n')
+    parts = data.split(b'\n')
+    if trailing:
+        parts.pop()
+    if pos > 0:
+        parts.pop(0)
+    
+    keep = parts[-lines:]
+    start = end - len(b'\n'.join(keep)) - (1 if trailing else 0)
+    result = [part.decode('utf-8', errors='ignore') + '\n' for part in keep]
+    if result and not trailing:
+        result[-1] = result[-1][:-1]
+    
+    return {'lines': result, 'start': start, 'end': end, 'size': size, 'has_more': start > 0}
+
+def stream_console_sse(get_buffer, since=None, backlog=100, keepalive=15):
+    """Generator Server-Sent Events z nowymi liniami konsoli serwera"""
+    buffer = None
+    cursor = since
+    ended = False
+    last_activity = time.monotonic()
+    yield 'retry: 3000\n\n'
+    
+    while True:
+        current = get_buffer()
+        if current is not buffer:
+            if current is not None:
+                if buffer is not None or (cursor is not None and not current.owns(cursor)):
+                    # Nowy proces serwera albo kursor klienta z poprzedniego
+                    cursor = current.first_seq
+                    yield f"event: reset\ndata: {json.dumps({'next': cursor})}\n\n"
+                elif cursor is None:
+                    cursor = max(current.next_seq - backlog, current.first_seq)
+                ended = False
+            buffer = current
+        
+        if buffer is None or (buffer.closed and ended):
+            time.sleep(1)
+            if time.monotonic() - last_activity >= keepalive:
+                last_activity = time.monotonic()
+                yield ': keepalive\n\n'
+            continue
+        
+        start, lines = buffer.read_since(cursor)
+        last_activity = time.monotonic()
+        if lines:
+            cursor = start + len(lines)
+            payload = {'seq': start, 'lines': lines, 'next': cursor}
+            yield f"id: {cursor}\nevent: lines\ndata: {json.dumps(payload)}\n\n"
+            continue
+        
+        if buffer.closed:
+            ended = True
+            yield f"event: end\ndata: {json.dumps({'next': cursor})}\n\n"
+            continue
+        
+        if not buffer.wait(cursor, timeout=keepalive):
+            yield ': keepalive\n\n'
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+CGROUP_CPU_PERIOD = 100000
+CGROUP_CONTROLLERS = ('cpu', 'memory', 'io', 'pids')
+
+_CGROUP_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+def parse_cgroup_bytes(value):
+    """'8G', '512M', '1073741824' -> bajty; puste/'max' -> None"""
+    if value is None:
+        return None
+    value = str(value).strip().lower().rstrip('b')
+    if not value or value == 'max':
+        return None
+    if value[-1] in _CGROUP_UNITS:
+        return int(float(value[:-1]) * _CGROUP_UNITS[value[-1]])
+    return int(value)
+
+def _read_cgroup_file(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_cgroup_file(path, value):
+    with open(path, 'w') as f:
+        f.write(value)
+
+def _cgroup_keyed(text):
+    """Plik 'klucz wartość' (cpu.stat, memory.stat) -> {klucz: int}"""
+    values = {}
+    for line in (text or '').splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            values[parts[0]] = int(parts[1])
+    return values
+
+def parse_cgroup_io_stat(text):
+    """Suma rbytes/wbytes/rios/wios ze wszystkich urządzeń w io.stat"""
+    totals = {'rbytes': 0, 'wbytes': 0, 'rios': 0, 'wios': 0}
+    for line in (text or '').splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition('=')
+            if key in totals and value.isdigit():
+                totals[key] += int(value)
+    return totals
+
+def parse_cgroup_pressure(text):
+    """{'some': avg10, 'full': avg10} z pliku *.pressure (PSI)"""
+    result = {}
+    for line in (text or '').splitlines():
+        parts = line.split()
+        if parts and parts[0] in ('some', 'full'):
+            for field in parts[1:]:
+                key, _, value = field.partition('=')
+                if key == 'avg10':
+                    result[parts[0]] = float(value)
+    return result
+
+class CgroupManager:
+    """Osobna grupa cgroup v2 dla każdego serwera uruchamianego przez panel.
+    
+    Tryb opcjonalny (AGENT_CGROUPS): przy pierwszym użyciu tworzony jest
+    katalog nadrzędny z włączonymi kontrolerami cpu/memory/io/pids, a każdy
+    serwer startuje w `<parent>/server-<nazwa>` z limitami cpu.max, memory.max
+    i io.weight. Panel dopisuje proces do grupy (`attach()`) zaraz po
+    Popen - bez preexec_fn, który nie jest bezpieczny przy wielu wątkach -
+    więc procesy potomne serwera też są liczone w grupie. Gdy cgroup v2 nie
+    jest zamontowany albo katalog nie jest zapisywalny, `prepare()` zwraca
+    None, a gdy dołączenie się nie uda, grupa jest usuwana - w obu
+    przypadkach serwer działa jak dotąd, bez limitów.
+    """
+    
+    def __init__(self, enabled=False, parent='mcpanel-agent.slice', cpu_max=None, memory_max=None, io_weight=None,
+                 root=CGROUP_ROOT):
+        self.enabled = enabled
+        self.root = root
+        self.parent = parent if os.path.isabs(parent) else os.path.join(root, parent)
+        self.cpu_max = float(cpu_max) if cpu_max else None
+        self.memory_max = parse_cgroup_bytes(memory_max)
+        self.io_weight = int(io_weight) if io_weight else None
+        self._usable = None
+        self._samples = {}
+    
+    def _setup(self):
+        """Sprawdź cgroup v2 i przygotuj katalog nadrzędny (raz)"""
+        if self._usable is not None:
+            return self._usable
+        self._usable = False
+        if not self.enabled:
+            return False
+        if not os.path.exists(os.path.join(self.root, 'cgroup.controllers')):
+            logger.warning("cgroup v2 is not mounted, server resource limits disabled")
+            return False
+        try:
+            os.makedirs(self.parent, exist_ok=True)
+            # Kontrolery muszą być włączone na każdym poziomie od korzenia
+            path = self.parent
+            chain = []
+            while os.path.realpath(path) != os.path.realpath(self.root):
+                path = os.path.dirname(path)
+                chain.append(path)
+            for directory in list(reversed(chain)) + [self.parent]:
+                available = (_read_cgroup_file(os.path.join(directory, 'cgroup.controllers')) or '').split()
+                wanted = ' '.join(f'+{name}' for name in CGROUP_CONTROLLERS if name in available)
+                if wanted:
+                    _write_cgroup_file(os.path.join(directory, 'cgroup.subtree_control'), wanted)
+        except OSError as e:
+            logger.warning(f"cgroup {self.parent} is not writable ({e}), server resource limits disabled")
+            return False
+        self._usable = True
+        return True
+    
+    @property
+    def active(self):
+        return self._setup()
+    
+    def path_for(self, server_name):
+        return os.path.join(self.parent, f'server-{server_name}')
+    
+    def prepare(self, server_name):
+        """Utwórz grupę serwera z limitami; ścieżka albo None (tryb bez cgroup)"""
+        if not self._setup():
+            return None
+        path = self.path_for(server_name)
+        try:
+            os.makedirs(path, exist_ok=True)
+            if self.cpu_max:
+                _write_cgroup_file(os.path.join(path, 'cpu.max'), f'{int(self.cpu_max * CGROUP_CPU_PERIOD)} {CGROUP_CPU_PERIOD}')
+            if self.memory_max:
+                _write_cgroup_file(os.path.join(path, 'memory.max'), str(self.memory_max))
+            if self.io_weight:
+                _write_cgroup_file(os.path.join(path, 'io.weight'), f'default {self.io_weight}')
+        except OSError as e:
+            logger.error(f"Could not configure cgroup {path}: {e}")
+            return None
+        self._samples.pop(path, None)
+        return path
+    
+    def attach(self, path, pid):
+        """Dopisz uruchomiony proces do grupy; False (grupa usunięta), gdy cgroup.procs odmówi"""
+        try:
+            _write_cgroup_file(os.path.join(path, 'cgroup.procs'), str(pid))
+        except OSError as e:
+            # EACCES (brak praw do wspólnego przodka), EBUSY/EINVAL (grupa threaded/domain invalid)
+            logger.warning(f"Could not move process {pid} to cgroup {path} ({e}), running without resource limits")
+            self.release(path)
+            return False
+        return True
+    
+    def release(self, path):
+        """Usuń pustą grupę po zakończeniu serwera"""
+        self._samples.pop(path, None)
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+    
+    def read_metrics(self, path):
+        """CPU, pamięć, I/O i PSI grupy; cpu_percent i tempo I/O liczone od poprzedniego odczytu"""
+        cpu = _cgroup_keyed(_read_cgroup_file(os.path.join(path, 'cpu.stat')))
+        if not cpu:
+            return None
+        memory = _cgroup_keyed(_read_cgroup_file(os.path.join(path, 'memory.stat')))
+        io = parse_cgroup_io_stat(_read_cgroup_file(os.path.join(path, 'io.stat')))
+        now = time.monotonic()
+        metrics = {
+            'cpu_usage_usec': cpu.get('usage_usec', 0),
+            'cpu_percent': None,
+            'cpu_throttled_usec': cpu.get('throttled_usec', 0),
+            'cpu_nr_throttled': cpu.get('nr_throttled', 0),
+            'memory_current': int((_read_cgroup_file(os.path.join(path, 'memory.current')) or '0').strip() or 0),
+            'memory_max': parse_cgroup_bytes(_read_cgroup_file(os.path.join(path, 'memory.max'))),
+            'memory_anon': memory.get('anon'),
+            'memory_file': memory.get('file'),
+            'oom_kills': _cgroup_keyed(_read_cgroup_file(os.path.join(path, 'memory.events'))).get('oom_kill', 0),
+            'pids': int((_read_cgroup_file(os.path.join(path, 'pids.current')) or '0').strip() or 0),
+            'io_read_bytes': io['rbytes'],
+            'io_write_bytes': io['wbytes'],
+            'io_read_rate': None,
+            'io_write_rate': None,
+            'pressure': {
+                'cpu': parse_cgroup_pressure(_read_cgroup_file(os.path.join(path, 'cpu.pressure'))),
+                'memory': parse_cgroup_pressure(_read_cgroup_file(os.path.join(path, 'memory.pressure'))),
+                'io': parse_cgroup_pressure(_read_cgroup_file(os.path.join(path, 'io.pressure')))
+            }
+        }
+        previous = self._samples.get(path)
+        if previous is not None:
+            elapsed = now - previous[0]
+            if elapsed > 0:
+                metrics['cpu_percent'] = round(
+                    max(0, metrics['cpu_usage_usec'] - previous[1]) / (elapsed * 1e6) * 100, 1)
+                metrics['io_read_rate'] = max(0, int((io['rbytes'] - previous[2]) / elapsed))
+                metrics['io_write_rate'] = max(0, int((io['wbytes'] - previous[3]) / elapsed))
+        self._samples[path] = (now, metrics['cpu_usage_usec'], io['rbytes'], io['wbytes'])
+        return metrics
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _prom_escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _prom_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_prom_escape(value)}"' for name, value in pairs) + '}'
+
+def prom_gauge(name, documentation, samples, labelnames=()):
+    """Rodzina gauge z próbek [(wartości etykiet, wartość)]; None pomijane"""
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} gauge']
+    for label_values, value in samples:
+        if value is not None:
+            lines.append(f'{name}{_prom_labels(list(zip(labelnames, label_values)))} {value}')
+    return lines
+
+class PromHistogram:
+    """Histogram Prometheusa (skumulowane kubełki liczone przy renderowaniu)"""
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=(0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                pairs = list(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else bound
+                    lines.append(f'{self.name}_bucket{_prom_labels(pairs + [("le", le)])} {cumulative}')
+                lines.append(f'{self.name}_sum{_prom_labels(pairs)} {round(total, 6)}')
+                lines.append(f'{self.name}_count{_prom_labels(pairs)} {count}')
+        return lines
+
+class _PumpEntry:
+    __slots__ = ('key', 'fd', 'on_line', 'on_close', 'decoder', 'partial')
+    
+    def __init__(self, key, fd, on_line, on_close):
+        self.key = key
+        self.fd = fd
+        self.on_line = on_line
+        self.on_close = on_close
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.partial = ''
+
+class OutputPump:
+    """Jeden wątek (selectors/epoll) czytający stdout wszystkich serwerów agenta"""
+    
+    def __init__(self, read_size=64 * 1024, on_round=None):
+        self.read_size = read_size
+        self.on_round = on_round
+        self._selector = selectors.DefaultSelector()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._thread = None
+    
+    @staticmethod
+    def is_supported():
+        return os.name != 'nt'
+    
+    def register(self, key, stream, on_line, on_close=None):
+        fd = stream.fileno()
+        os.set_blocking(fd, False)
+        with self._lock:
+            self._pending.append(_PumpEntry(key, fd, on_line, on_close))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='OutputPump', daemon=True)
+                self._thread.start()
+        os.write(self._wakeup_w, b'\0')
+    
+    def _apply_pending(self):
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for entry in pending:
+            self._selector.register(entry.fd, selectors.EVENT_READ, entry)
+    
+    def _run(self):
+        while True:
+            events = self._selector.select(timeout=5)
+            started = time.perf_counter()
+            for selector_key, _ in events:
+                entry = selector_key.data
+                if entry is None:
+                    self._apply_pending()
+                    continue
+                try:
+                    data = os.read(entry.fd, self.read_size)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b''
+                
+                if data:
+                    self._dispatch(entry, entry.decoder.decode(data))
+                else:
+                    self._finish(entry)
+            if events and self.on_round:
+                self.on_round(time.perf_counter() - started)
+    
+    def _dispatch(self, entry, text):
+        text = entry.partial + text
+        lines = text.split('\n')
+        entry.partial = lines.pop()
+        for line in lines:
+            try:
+                entry.on_line(line.rstrip('\r'))
+            except Exception as e:
+                logger.error(f"Output pump callback error ({entry.key}): {e}")
+    
+    def _finish(self, entry):
+        self._selector.unregister(entry.fd)
+        tail = entry.partial + entry.decoder.decode(b'', final=True)
+        entry.partial = ''
+        if tail:
+            self._dispatch(entry, tail + '\n')
+        if entry.on_close:
+            threading.Thread(target=entry.on_close, daemon=True).start()
+
+# ioctl(FICLONE) - kopia copy-on-write na btrfs/xfs/bcachefs
+FICLONE = 0x40049409
+ARTIFACT_LATEST_TTL = 6 * 3600
+
+
+def artifact_key(implementation, version, build=None):
+    return f"{implementation}/{version}/{build or 'latest'}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_build(url):
+    """Build artefaktu z URL: przypięte URL-e (hash Mojang, numer buildu Paper) się nie zmieniają"""
+    if 'latest' in url:
+        return 'latest'
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+
+def artifact_clone(source, target):
+    """Niezależna kopia: reflink, a gdy system plików go nie ma - zwykła kopia; zwraca metodę"""
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        method = 'reflink'
+    except OSError:
+        shutil.copyfile(source, target)
+        method = 'copy'
+    os.chmod(target, 0o644)
+    return method
+
+
+def artifact_detach(path):
+    """Zerwij twarde dowiązanie pliku serwera do magazynu (instalacje sprzed rezygnacji z hardlinków)"""
+    if os.stat(path).st_nlink <= 1:
+        return False
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        artifact_clone(path, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return True
+
+
+class ArtifactStore:
+    """Wspólny magazyn plików serwerów adresowany treścią (sha256).
+
+    Pliki leżą raz w `<root>/sha256/<ab>/<sha256>`, indeks JSON mapuje
+    klucz (implementacja, wersja, build) na hash. Instalacja dostaje kopię
+    reflink albo zwykłą kopię - nigdy twarde dowiązanie, bo zapis w miejscu
+    zmieniłby plik wszystkim serwerom tej wersji. Buildy 'latest' wygasają po `latest_ttl` sekundach; plik nadpisany
+    w miejscu przez serwer wypada z magazynu.
+    """
+
+    def __init__(self, root, latest_ttl=ARTIFACT_LATEST_TTL):
+        self.root = root
+        self.latest_ttl = latest_ttl
+        self._index_path = os.path.join(root, 'index.json')
+        self._index = None
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, 'sha256', sha256[:2], sha256)
+
+    def _load(self):
+        if self._index is None:
+            try:
+                with open(self._index_path, 'r') as f:
+                    self._index = json.load(f).get('artifacts', {})
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = f"{self._index_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'artifacts': self._index}, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self._index_path)
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                return None
+            if key.endswith('/latest') and time.time() - entry['stored_at'] > self.latest_ttl:
+                return None
+            try:
+                stat = os.stat(self.blob_path(entry['sha256']))
+            except OSError:
+                stat = None
+            if stat is None or stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+                logger.warning(f"Artifact {key} is missing or was modified in place, dropping it from the store")
+                del self._index[key]
+                if stat is not None:
+                    os.remove(self.blob_path(entry['sha256']))
+                self._save()
+                return None
+            return dict(entry)
+
+    def add(self, key, file_path, source=None, sha256=None, digests=None):
+        sha256 = sha256 or file_sha256(file_path)
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            os.remove(file_path)
+        else:
+            os.replace(file_path, blob)
+            os.chmod(blob, 0o444)
+        stat = os.stat(blob)
+        entry = {
+            'sha256': sha256,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'name': os.path.basename(source or file_path),
+            'source': source,
+            'digests': dict(digests or {}, sha256=sha256),
+            'stored_at': time.time()
+        }
+        with self._lock:
+            self._load()[key] = entry
+            self._save()
+        return entry
+
+    def provision(self, sha256, target):
+        """reflink -> kopia; zwraca użytą metodę"""
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        temp_path = f"{target}.{uuid.uuid4().hex}.part"
+        try:
+            method = artifact_clone(blob, temp_path)
+            os.replace(temp_path, target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return method
+
+    def fetch(self, key, target, download, source=None, checksums=None):
+        """(metoda, błąd) - plik pod `target`, pobrany przez `download(path)` tylko przy braku w magazynie.
+
+        Wpis niezgodny z opublikowanymi `checksums` jest pobierany od nowa.
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self.lookup(key)
+            if entry is not None and any(entry.get('digests', {}).get(name, value) != value
+                                         for name, value in (checksums or {}).items()):
+                logger.warning(f"Artifact {key} does not match the published checksum, downloading again")
+                entry = None
+            downloaded = False
+            if entry is None:
+                temp_dir = os.path.join(self.root, 'tmp')
+                os.makedirs(temp_dir, exist_ok=True)
+                # Stała nazwa per klucz - przerwane pobieranie (.part) zostanie wznowione
+                temp_path = os.path.join(temp_dir, hashlib.sha1(key.encode()).hexdigest())
+                try:
+                    result = download(temp_path)
+                    if not result:
+                        return None, f"Download of {key} failed"
+                    if not os.path.exists(temp_path) or os.path.getsize(temp_path) == 0:
+                        return None, f"Download of {key} produced an empty file"
+                    digests = result.get('digests', {}) if isinstance(result, dict) else {}
+                    entry = self.add(key, temp_path, source, digests.get('sha256'), digests)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                downloaded = True
+        try:
+            method = self.provision(entry['sha256'], target)
+        except OSError as e:
+            return None, f"Could not provision {key}: {e}"
+        return ('downloaded' if downloaded else method), None
+
+MANIFEST_TTL = 600
+FETCH_TIMEOUT = 5.0
+CONNECT_TIMEOUT = 3.0
+FAILURE_BACKOFF = 60
+VERSION_USER_AGENT = 'MCPanel-Agent/1.0'
+
+MOJANG_MANIFEST_URL = 'https://piston-meta.mojang.com/mc/game/version_manifest_v2.json'
+PAPER_BUILDS_URL = 'https://api.papermc.io/v2/projects/paper/versions/{version}/builds'
+PAPER_DOWNLOAD_URL = 'https://api.papermc.io/v2/projects/paper/versions/{version}/builds/{build}/downloads/{name}'
+PURPUR_VERSION_URL = 'https://api.purpurmc.org/v2/purpur/{version}'
+PURPUR_DOWNLOAD_URL = 'https://api.purpurmc.org/v2/purpur/{version}/{build}/download'
+FABRIC_VERSIONS_URL = 'https://meta.fabricmc.net/v2/versions'
+FABRIC_SERVER_URL = 'https://meta.fabricmc.net/v2/versions/loader/{version}/{loader}/{installer}/server/jar'
+
+
+class _Document:
+    __slots__ = ('data', 'etag', 'last_modified', 'fetched_at', 'immutable')
+
+    def __init__(self, data, etag=None, last_modified=None, fetched_at=0, immutable=False):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.immutable = immutable
+
+
+class ManifestCache:
+    """Dokumenty JSON z API wersji w pamięci i na dysku (jak w panelu).
+
+    Przeterminowany wpis jest zwracany od razu i odświeżany w tle zapytaniem
+    warunkowym (ETag / If-Modified-Since); sieć blokuje tylko przy pustej
+    pamięci podręcznej, z limitem czasu. Błąd zostawia ostatnie poprawne dane.
+    """
+
+    def __init__(self, cache_dir, ttl=MANIFEST_TTL, timeout=FETCH_TIMEOUT):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = VERSION_USER_AGENT
+        self._documents = {}
+        self._refreshing = set()
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest() + '.json')
+
+    def _load(self, url):
+        try:
+            with open(self._path(url), 'r') as f:
+                stored = json.load(f)
+            return _Document(stored['data'], stored.get('etag'), stored.get('last_modified'),
+                             stored.get('fetched_at', 0), stored.get('immutable', False))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, url, document):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(url)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'url': url, 'data': document.data, 'etag': document.etag,
+                           'last_modified': document.last_modified, 'fetched_at': document.fetched_at,
+                           'immutable': document.immutable}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write version cache for {url}: {e}")
+
+    def get(self, url, immutable=False):
+        """Dane JSON spod `url` albo None, gdy nie ma ich ani w sieci, ani w pamięci podręcznej"""
+        document = self._documents.get(url)
+        if document is None:
+            with self._lock:
+                document = self._documents.get(url)
+                if document is None:
+                    document = self._load(url)
+                    if document is not None:
+                        self._documents[url] = document
+        if document is None:
+            # Bez danych i z niedostępnym API - nie czekaj na limit czasu przy każdej instalacji
+            if time.time() - self._failed.get(url, 0) < FAILURE_BACKOFF:
+                return None
+            document = self._fetch(url, None, immutable)
+            return document.data if document else None
+        if not document.immutable and time.time() - document.fetched_at > self.ttl:
+            self._refresh_async(url)
+        return document.data
+
+    def revalidate(self, url):
+        """Synchroniczne odświeżenie (np. gdy brakuje świeżo wydanej wersji); None gdy nic nowego"""
+        previous = self._documents.get(url)
+        if previous is not None and time.time() - previous.fetched_at < FAILURE_BACKOFF:
+            return None
+        document = self._fetch(url, previous, False)
+        return document.data if document and document is not previous else None
+
+    def _refresh_async(self, url):
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+
+        def refresh():
+            try:
+                self._fetch(url, self._documents.get(url), False)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(url)
+        threading.Thread(target=refresh, name='ManifestRefresh', daemon=True).start()
+
+    def _fetch(self, url, previous, immutable):
+        headers = {}
+        if previous is not None:
+            if previous.etag:
+                headers['If-None-Match'] = previous.etag
+            if previous.last_modified:
+                headers['If-Modified-Since'] = previous.last_modified
+        try:
+            response = self.session.get(url, headers=headers, timeout=(CONNECT_TIMEOUT, self.timeout))
+            if response.status_code == 304 and previous is not None:
+                document = _Document(previous.data, previous.etag, previous.last_modified, time.time(),
+                                     previous.immutable)
+            else:
+                response.raise_for_status()
+                document = _Document(response.json(), response.headers.get('ETag'),
+                                     response.headers.get('Last-Modified'), time.time(), immutable)
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Version metadata fetch failed for {url}: {e}"
+                  + (" (using last known data)" if previous is not None else ""))
+            if previous is not None:
+                # Niedostępne API - następna próba dopiero po FAILURE_BACKOFF, nie przy każdym odczycie
+                previous.fetched_at = max(previous.fetched_at, time.time() - self.ttl + FAILURE_BACKOFF)
+            else:
+                self._failed[url] = time.time()
+            return None
+        self._failed.pop(url, None)
+        self._documents[url] = document
+        self._store(url, document)
+        return document
+
+    def prefetch(self, urls):
+        """Rozgrzej pamięć podręczną w tle (np. przy starcie panelu)"""
+        for url in urls:
+            if url not in self._documents and self._load(url) is None:
+                threading.Thread(target=self.get, args=(url,), name='ManifestPrefetch', daemon=True).start()
+
+
+class VersionResolver:
+    """(implementacja, wersja) -> {'url', 'build', 'name', 'checksums'} z ManifestCache albo None"""
+
+    def __init__(self, cache_dir, ttl=MANIFEST_TTL, timeout=FETCH_TIMEOUT):
+        self.cache = ManifestCache(cache_dir, ttl, timeout)
+
+    def start(self):
+        self.cache.prefetch([MOJANG_MANIFEST_URL, FABRIC_VERSIONS_URL])
+
+    def resolve(self, implementation, version):
+        resolver = getattr(self, f'_resolve_{implementation}', None)
+        if resolver is None:
+            return None
+        try:
+            return resolver(version)
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            logger.warning(f"Unexpected version metadata for {implementation} {version}: {e}")
+            return None
+
+    def _resolve_vanilla(self, version):
+        manifest = self.cache.get(MOJANG_MANIFEST_URL)
+        if not manifest:
+            return None
+        entry = self._find_release(manifest, version)
+        if entry is None:
+            # Wersja nowsza niż manifest w pamięci podręcznej
+            manifest = self.cache.revalidate(MOJANG_MANIFEST_URL)
+            entry = self._find_release(manifest, version) if manifest else None
+        if entry is None:
+            return None
+        # Dokument wersji ma w URL własny hash - nigdy się nie zmienia
+        version_info = self.cache.get(entry['url'], immutable=True)
+        if not version_info:
+            return None
+        server = version_info['downloads']['server']
+        return {'url': server['url'], 'build': server['sha1'], 'name': 'server.jar',
+                'checksums': {'sha1': server['sha1']}}
+
+    @staticmethod
+    def _find_release(manifest, version):
+        return next((entry for entry in manifest['versions']
+                     if entry['id'] == version and entry['type'] == 'release'), None)
+
+    def _resolve_paper(self, version):
+        data = self.cache.get(PAPER_BUILDS_URL.format(version=version))
+        builds = (data or {}).get('builds') or []
+        if not builds:
+            return None
+        # Najnowszy build z kanału default, a gdy go brak - najnowszy w ogóle
+        stable = [build for build in builds if build.get('channel', 'default') == 'default']
+        latest = max(stable or builds, key=lambda build: build['build'])
+        application = latest['downloads']['application']
+        return {
+            'url': PAPER_DOWNLOAD_URL.format(version=version, build=latest['build'], name=application['name']),
+            'build': str(latest['build']),
+            'name': application['name'],
+            'checksums': {'sha256': application['sha256']} if application.get('sha256') else {}
+        }
+
+    def _resolve_purpur(self, version):
+        data = self.cache.get(PURPUR_VERSION_URL.format(version=version))
+        build = ((data or {}).get('builds') or {}).get('latest')
+        if not build:
+            return None
+        return {'url': PURPUR_DOWNLOAD_URL.format(version=version, build=build), 'build': str(build),
+                'name': f'purpur-{version}-{build}.jar', 'checksums': {}}
+
+    def _resolve_fabric(self, version):
+        data = self.cache.get(FABRIC_VERSIONS_URL)
+        if not data:
+            return None
+        installer = next((item['version'] for item in data['installer'] if item['stable']), None)
+        if not installer:
+            return None
+        loader = next((item['version'] for item in data['loader']
+                       if item['version'] == version or item['version'].startswith(version)), None)
+        if not loader:
+            loader = next((item['version'] for item in data['loader'] if item.get('stable')),
+                          data['loader'][0]['version'])
+        return {'url': FABRIC_SERVER_URL.format(version=version, loader=loader, installer=installer),
+                'build': f'{loader}-{installer}', 'name': 'fabric-server.jar', 'checksums': {}}
+
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_CONNECT_TIMEOUT = 10.0
+DOWNLOAD_READ_TIMEOUT = 60.0
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_SEGMENTS = 4
+DOWNLOAD_SEGMENT_MIN_SIZE = 32 * 1024 * 1024
+DOWNLOAD_POOL_SIZE = 16
+DOWNLOAD_PROGRESS_INTERVAL = 0.25
+DOWNLOAD_HASH_CHUNK = 1024 * 1024
+DOWNLOAD_STATE_INTERVAL = 1.0
+DOWNLOAD_USER_AGENT = 'MCPanel-Agent/1.0'
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadCancelled(DownloadError):
+    pass
+
+
+class ChecksumMismatch(DownloadError):
+    pass
+
+
+class _Incomplete(Exception):
+    pass
+
+
+def _retryable(error):
+    """Zerwane połączenie, limit czasu, 429 i 5xx - warto ponowić; 4xx nie"""
+    if isinstance(error, requests.HTTPError):
+        status = getattr(error.response, 'status_code', 0)
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                              requests.exceptions.ChunkedEncodingError, _Incomplete))
+
+
+class _Segment:
+    """Zakres bajtów [start, end] (end None = do końca strumienia) i pozycja, do której jest zapisany"""
+
+    __slots__ = ('start', 'end', 'pos')
+
+    def __init__(self, start, end, pos=None):
+        self.start = start
+        self.end = end
+        self.pos = start if pos is None else pos
+
+    @property
+    def complete(self):
+        return self.end is not None and self.pos > self.end
+
+
+class _Transfer:
+    def __init__(self, url, part_path, meta, segments, progress, cancel, algorithms=()):
+        self.url = url
+        self.part_path = part_path
+        self.meta = meta
+        self.segments = segments
+        self.progress = progress
+        self.cancel = cancel
+        self.algorithms = algorithms
+        self.hashers = {name: hashlib.new(name) for name in algorithms} if algorithms else None
+        self.failed = threading.Event()
+        self.error = None
+        self.lock = threading.Lock()
+        self._last_progress = 0
+        self._last_state = time.monotonic()
+
+    @property
+    def total(self):
+        return self.meta.get('size')
+
+    @property
+    def done(self):
+        return sum(segment.pos - segment.start for segment in self.segments)
+
+    def reset_hashes(self):
+        if self.hashers is not None:
+            self.hashers = {name: hashlib.new(name) for name in self.algorithms}
+
+    def hash_prefix(self, fd, length):
+        """Wznowienie: dopisz do skrótów bajty pobrane przed przerwą (jedyny odczyt pliku)"""
+        offset = 0
+        while offset < length:
+            data = os.pread(fd, min(DOWNLOAD_HASH_CHUNK, length - offset), offset)
+            if not data:
+                break
+            for hasher in self.hashers.values():
+                hasher.update(data)
+            offset += len(data)
+
+    def check(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise DownloadCancelled('Download cancelled')
+        if self.failed.is_set():
+            raise DownloadError('Another segment failed')
+
+    def advanced(self):
+        now = time.monotonic()
+        if self.progress and now - self._last_progress >= DOWNLOAD_PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.progress(self.done, self.total)
+        if now - self._last_state >= DOWNLOAD_STATE_INTERVAL:
+            self._last_state = now
+            self.save_state()
+
+    def save_state(self):
+        """Stan segmentów obok pliku .part - wznowienie po restarcie panelu"""
+        state = dict(self.meta, url=self.url,
+                     segments=[[segment.start, segment.end, segment.pos] for segment in self.segments])
+        try:
+            with open(self.part_path + '.json', 'w') as f:
+                json.dump(state, f)
+        except OSError:
+            pass
+
+
+class Downloader:
+    """Pobieranie HTTP z wznawianiem (Range) i segmentami dla dużych plików (jak w panelu).
+
+    Plik powstaje jako `<ścieżka>.part` ze stanem segmentów w `.part.json`
+    i po pobraniu całości jest przenoszony na miejsce.
+    """
+
+    def __init__(self, connect_timeout=DOWNLOAD_CONNECT_TIMEOUT, read_timeout=DOWNLOAD_READ_TIMEOUT, retries=DOWNLOAD_RETRIES,
+                 segments=DOWNLOAD_SEGMENTS, segment_min_size=DOWNLOAD_SEGMENT_MIN_SIZE, pool_size=DOWNLOAD_POOL_SIZE):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.segments = max(1, int(segments))
+        self.segment_min_size = segment_min_size
+        # Wywoływane z liczbą bajtów po każdym kawałku (limit przepustowości DownloadScheduler)
+        self.throttle = None
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = DOWNLOAD_USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def _retry(self, attempt, error, url):
+        if attempt > self.retries:
+            raise DownloadError(f"Download of {url} failed after {self.retries} retries: {error}")
+        time.sleep(min(30.0, 0.5 * 2 ** attempt))
+
+    def probe(self, url):
+        """{'size', 'ranges', 'etag', 'last_modified'} - GET bytes=0-0, bo HEAD bywa źle obsługiwany"""
+        attempt = 0
+        while True:
+            try:
+                with self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True,
+                                      timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    meta = {'etag': response.headers.get('ETag'),
+                            'last_modified': response.headers.get('Last-Modified')}
+                    if response.status_code == 206:
+                        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+                        meta.update(size=int(total) if total.isdigit() else None, ranges=True)
+                    else:
+                        length = response.headers.get('Content-Length', '')
+                        meta.update(size=int(length) if length.isdigit() else None, ranges=False)
+                    return meta
+            except requests.RequestException as e:
+                if not _retryable(e):
+                    raise DownloadError(f"Download of {url} failed: {e}")
+                attempt += 1
+                self._retry(attempt, e, url)
+
+    def _plan(self, url, part_path, meta, segmented=True):
+        """Segmenty do pobrania - z zapisanego stanu, jeśli plik .part pasuje do tego samego zasobu"""
+        state = None
+        try:
+            with open(part_path + '.json', 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if (state and meta['ranges'] and os.path.exists(part_path) and state.get('url') == url
+                and state.get('size') == meta['size'] and state.get('etag') == meta['etag']
+                and (segmented or len(state['segments']) == 1)):
+            return [_Segment(*segment) for segment in state['segments']]
+
+        size = meta['size']
+        if not meta['ranges'] or not size:
+            return [_Segment(0, size - 1 if size else None)]
+        count = self.segments if segmented and size >= self.segment_min_size else 1
+        step = -(-size // count)
+        return [_Segment(start, min(size, start + step) - 1) for start in range(0, size, step)]
+
+    def download(self, url, path, progress=None, cancel=None, checksums=None):
+        """Pobierz `url` do `path`; progress(pobrane, całość|None).
+
+        `checksums` ({'sha1' | 'sha256' | 'sha512': hex}) są liczone w trakcie
+        odbierania strumienia - taki plik idzie jednym połączeniem, bo segmenty
+        przychodzą poza kolejnością. Niezgodność usuwa plik .part zanim
+        cokolwiek trafi pod `path`. Zwraca {'size', 'digests'}; przy pobieraniu
+        jednym strumieniem `digests` zawiera zawsze też sha256.
+        """
+        checksums = {name.lower(): value.lower() for name, value in (checksums or {}).items() if value}
+        unknown = set(checksums) - hashlib.algorithms_available
+        if unknown:
+            raise DownloadError(f"Unsupported checksum algorithm: {', '.join(sorted(unknown))}")
+        part_path = path + '.part'
+        meta = self.probe(url)
+        segments = self._plan(url, part_path, meta, segmented=not checksums)
+        algorithms = tuple(sorted(set(checksums) | {'sha256'})) if len(segments) == 1 else ()
+        transfer = _Transfer(url, part_path, meta, segments, progress, cancel, algorithms)
+
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if meta['size'] and os.fstat(fd).st_size > meta['size']:
+                os.ftruncate(fd, meta['size'])
+            if transfer.hashers is not None and segments[0].pos:
+                transfer.hash_prefix(fd, segments[0].pos)
+            pending = [segment for segment in segments if not segment.complete]
+            if len(pending) == 1:
+                self._fetch_segment(transfer, fd, pending[0])
+            elif pending:
+                threads = [threading.Thread(target=self._run_segment, args=(transfer, fd, segment),
+                                            name='DownloadSegment', daemon=True) for segment in pending]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                if transfer.error is not None:
+                    raise transfer.error
+            if meta['size'] is None:
+                meta['size'] = transfer.done
+                os.ftruncate(fd, transfer.done)
+            elif transfer.done != meta['size']:
+                raise DownloadError(f"Download of {url} is incomplete: {transfer.done}/{meta['size']} bytes")
+            digests = {name: hasher.hexdigest() for name, hasher in (transfer.hashers or {}).items()}
+            for name, expected in checksums.items():
+                if digests[name] != expected:
+                    self._discard(part_path)
+                    raise ChecksumMismatch(f"{name} mismatch for {url}: expected {expected}, got {digests[name]}")
+            os.fsync(fd)
+        except ChecksumMismatch:
+            raise
+        except BaseException:
+            transfer.save_state()
+            raise
+        finally:
+            os.close(fd)
+
+        os.replace(part_path, path)
+        self._discard(part_path)
+        if progress:
+            progress(transfer.done, transfer.total)
+        return {'size': transfer.done, 'digests': digests}
+
+    @staticmethod
+    def _discard(part_path):
+        for leftover in (part_path, part_path + '.json'):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+
+    def _run_segment(self, transfer, fd, segment):
+        try:
+            self._fetch_segment(transfer, fd, segment)
+        except BaseException as e:
+            with transfer.lock:
+                if transfer.error is None:
+                    transfer.error = e
+            transfer.failed.set()
+
+    def _fetch_segment(self, transfer, fd, segment):
+        attempt = 0
+        # Najdalsza osiągnięta pozycja - serwer bez Range zaczyna od zera przy każdej próbie,
+        # więc postępem są dopiero bajty za nią, nie ponownie pobrany początek
+        reached = segment.pos
+        while not segment.complete:
+            transfer.check()
+            headers = {}
+            if transfer.meta['ranges'] and (segment.pos > 0 or segment.end is not None):
+                headers['Range'] = f"bytes={segment.pos}-{'' if segment.end is None else segment.end}"
+            elif segment.pos:
+                # Serwer bez Range - od początku
+                segment.pos = segment.start
+                transfer.reset_hashes()
+            try:
+                with self.session.get(transfer.url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    if headers and response.status_code != 206:
+                        if len(transfer.segments) > 1:
+                            raise DownloadError(f"Server ignored Range request for {transfer.url}")
+                        segment.pos = 0
+                        transfer.reset_hashes()
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        transfer.check()
+                        if segment.end is not None:
+                            chunk = chunk[:segment.end + 1 - segment.pos]
+                        os.pwrite(fd, chunk, segment.pos)
+                        if transfer.hashers is not None:
+                            for hasher in transfer.hashers.values():
+                                hasher.update(chunk)
+                        segment.pos += len(chunk)
+                        transfer.advanced()
+                        if self.throttle is not None:
+                            self.throttle(len(chunk))
+                        if segment.complete:
+                            break
+                if segment.end is None:
+                    return
+                if not segment.complete:
+                    raise _Incomplete(f"connection closed at byte {segment.pos}")
+            except (requests.RequestException, _Incomplete) as e:
+                if not _retryable(e):
+                    raise DownloadError(f"Download of {transfer.url} failed: {e}")
+                # Licznik prób liczy się od ostatniego postępu, nie od początku pobierania
+                attempt = 1 if segment.pos > reached else attempt + 1
+                reached = max(reached, segment.pos)
+                transfer.save_state()
+                self._retry(attempt, e, transfer.url)
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BACKGROUND = 10
+DOWNLOAD_MAX_CONCURRENT = 3
+DOWNLOAD_WAIT_INTERVAL = 0.5
+
+
+class TokenBucket:
+    """Limit przepustowości w bajtach/s wspólny dla wszystkich połączeń"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _Job:
+    __slots__ = ('url', 'path', 'checksums', 'priority', 'seq', 'followers', 'progress', 'done',
+                 'result', 'error', 'started', 'queued_at', 'downloaded', 'total')
+
+    def __init__(self, url, path, checksums, priority, seq):
+        self.url = url
+        self.path = path
+        self.checksums = checksums
+        self.priority = priority
+        self.seq = seq
+        self.followers = []
+        self.progress = []
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.started = None
+        self.queued_at = time.time()
+        self.downloaded = 0
+        self.total = None
+
+
+class DownloadScheduler:
+    """Wspólna kolejka pobierań agenta (jak w panelu): współbieżność, przepustowość, priorytety, jeden URL raz"""
+
+    def __init__(self, downloader=None, max_concurrent=DOWNLOAD_MAX_CONCURRENT, bandwidth=0):
+        self.downloader = downloader or Downloader()
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.bucket = TokenBucket(bandwidth) if bandwidth else None
+        self.downloader.throttle = self.bucket.consume if self.bucket else None
+        self._seq = itertools.count()
+        self._waiting = []
+        self._active = []
+        self._in_flight = {}
+        self._cond = threading.Condition()
+
+    def download(self, url, path, progress=None, cancel=None, checksums=None, priority=PRIORITY_NORMAL):
+        """Pobierz `url` do `path` przez kolejkę; wynik i wyjątki jak w Downloader.download"""
+        while True:
+            with self._cond:
+                leader = self._in_flight.get(url)
+                if leader is None or leader.checksums != (checksums or {}):
+                    job = _Job(url, path, checksums or {}, priority, next(self._seq))
+                    if progress:
+                        job.progress.append(progress)
+                    self._in_flight.setdefault(url, job)
+                    self._waiting.append(job)
+                    break
+                leader.followers.append(path)
+                if progress:
+                    leader.progress.append(progress)
+                if leader in self._waiting and priority < leader.priority:
+                    leader.priority = priority
+                    self._cond.notify_all()
+            if self._follow(leader, path, progress, cancel):
+                return leader.result
+            # Prowadzący przerwał pobieranie - spróbuj od nowa, samodzielnie albo za kolejnym
+
+        try:
+            self._acquire(job, cancel)
+            job.result = self.downloader.download(url, path, progress=self._fan_out(job), cancel=cancel,
+                                                  checksums=checksums)
+            return job.result
+        except BaseException as e:
+            job.error = e
+            raise
+        finally:
+            with self._cond:
+                if self._in_flight.get(url) is job:
+                    del self._in_flight[url]
+                if job in self._waiting:
+                    self._waiting.remove(job)
+                if job in self._active:
+                    self._active.remove(job)
+                self._cond.notify_all()
+            if job.error is None:
+                self._serve_followers(job)
+            job.done.set()
+
+    def _follow(self, job, path, progress, cancel):
+        """Czekaj na cudze pobieranie tego samego URL; False, gdy trzeba pobrać samemu"""
+        while not job.done.wait(DOWNLOAD_WAIT_INTERVAL):
+            if cancel is not None and cancel.is_set():
+                with self._cond:
+                    if path in job.followers:
+                        job.followers.remove(path)
+                    if progress in job.progress:
+                        job.progress.remove(progress)
+                raise DownloadCancelled('Download cancelled')
+        if job.error is None:
+            if not os.path.exists(path):
+                return False
+            if progress:
+                progress(job.result['size'], job.result['size'])
+            return True
+        if isinstance(job.error, (DownloadCancelled, ChecksumMismatch)):
+            return False
+        raise job.error
+
+    def _serve_followers(self, job):
+        """Kopie pobranego pliku dla dołączonych - zanim wywołujący prowadzącego go przeniesie"""
+        with self._cond:
+            followers = [path for path in job.followers if path != job.path]
+            job.followers = []
+        for path in followers:
+            temp_path = f"{path}.{uuid.uuid4().hex}.part"
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                shutil.copyfile(job.path, temp_path)
+                os.replace(temp_path, path)
+            except OSError as e:
+                logger.warning(f"Could not share download of {job.url} with {path}: {e}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def _fan_out(self, job):
+        def report(downloaded, total):
+            job.downloaded = downloaded
+            job.total = total
+            for callback in list(job.progress):
+                callback(downloaded, total)
+        return report
+
+    def _acquire(self, job, cancel):
+        with self._cond:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise DownloadCancelled('Download cancelled')
+                if len(self._active) < self.max_concurrent and job is min(
+                        self._waiting, key=lambda waiting: (waiting.priority, waiting.seq)):
+                    self._waiting.remove(job)
+                    self._active.append(job)
+                    job.started = time.time()
+                    return
+                self._cond.wait(DOWNLOAD_WAIT_INTERVAL)
+
+    def snapshot(self):
+        """Pobierania w toku i oczekujące (do podglądu kolejki)"""
+        def describe(job):
+            return {'url': job.url, 'priority': job.priority, 'queued_at': job.queued_at,
+                    'started_at': job.started, 'downloaded': job.downloaded, 'total': job.total,
+                    'waiters': len(job.followers)}
+        with self._cond:
+            waiting = sorted(self._waiting, key=lambda job: (job.priority, job.seq))
+            return {
+                'max_concurrent': self.max_concurrent,
+                'bandwidth': int(self.bucket.rate) if self.bucket else 0,
+                'active': [describe(job) for job in self._active],
+                'queued': [describe(job) for job in waiting]
+            }
+
+
 class ServerManager:
     """Klasa do zarządzania serwerami Minecraft - zintegrowana z agentem"""
     
-    def __init__(self, base_path):
+    def __init__(self, base_path, console_buffer_lines=1000, log_flush_interval=1.0,
+                 log_rotate_bytes=0, log_rotate_daily=False, cgroups=None, artifacts=None, versions=None,
+                 downloader=None):
         self.base_path = base_path
+        self.artifacts = artifacts or ArtifactStore(os.path.join(base_path, '.artifacts'))
+        self.versions = versions or VersionResolver(os.path.join(base_path, '.versions'))
+        self.downloader = downloader or DownloadScheduler()
+        self.cgroups = cgroups or CgroupManager()
+        self.server_cgroups = {}
+        self.console_buffer_lines = console_buffer_lines
+        self.log_index = LogSearchIndex()
+        self.log_sinks = LogSinkRegistry(
+            flush_interval=log_flush_interval,
+            rotate_bytes=log_rotate_bytes,
+            rotate_daily=log_rotate_daily,
+            on_flush=self.log_index.enqueue
+        )
+        self.capture_lag = PromHistogram(
+            'mcpanel_agent_output_capture_round_seconds',
+            'Time the output pump spends dispatching one batch of console output.',
+            buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+        self.output_pump = OutputPump(on_round=self.capture_lag.observe) if OutputPump.is_supported() else None
+        self._metric_processes = {}
         self.processes = {}
         self.server_info = {}
         self.lock = threading.Lock()
@@ -207,10 +2295,12 @@ class ServerManager:
             
             jar_path = os.path.join(server_path, jar_filename)
             
-            # Pobierz plik JAR
-            success = self._download_file(jar_url, jar_path)
-            if not success:
-                return False, "Failed to download server JAR"
+            # Pobierz plik JAR (albo dowiąż z magazynu artefaktów), z weryfikacją sumy z API wersji
+            resolved = self.versions.resolve(implementation, version)
+            checksums = resolved['checksums'] if resolved and resolved['url'] == jar_url else None
+            method, error = self._fetch_artifact(implementation, version, jar_url, jar_path, checksums)
+            if error:
+                return False, f"Failed to download server JAR: {error}"
             
             # Utwórz eula.txt
             eula_path = os.path.join(server_path, 'eula.txt')
@@ -306,9 +2396,9 @@ class ServerManager:
             
             # Pobierz i wypakuj
             temp_zip = os.path.join(server_path, 'bedrock_temp.zip')
-            success = self._download_file(bedrock_url, temp_zip)
-            if not success:
-                return False, "Failed to download Bedrock server"
+            method, error = self._fetch_artifact('bedrock', f"{version}-{platform}", bedrock_url, temp_zip)
+            if error:
+                return False, f"Failed to download Bedrock server: {error}"
             
             # Wypakuj
             with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
@@ -330,10 +2420,16 @@ class ServerManager:
     
     def _get_java_server_url(self, implementation, version):
         """Pobierz URL serwera Java"""
+        if implementation in ('vanilla', 'paper', 'purpur', 'fabric'):
+            resolved = self.versions.resolve(implementation, version)
+            if resolved:
+                return resolved['url']
+        
         if implementation == 'vanilla':
             return f"https://piston-data.mojang.com/v1/objects/{self._get_vanilla_hash(version)}/server.jar"
         elif implementation == 'paper':
-            return f"https://api.papermc.io/v2/projects/paper/versions/{version}/builds/{self._get_latest_paper_build(version)}/downloads/paper-{version}-{self._get_latest_paper_build(version)}.jar"
+            build = self._get_latest_paper_build(version)
+            return f"https://api.papermc.io/v2/projects/paper/versions/{version}/builds/{build}/downloads/paper-{version}-{build}.jar"
         elif implementation == 'purpur':
             return f"https://api.purpurmc.org/v2/purpur/{version}/latest/download"
         elif implementation == 'forge':
@@ -347,9 +2443,8 @@ class ServerManager:
         try:
             # Pobierz listę wersji Forge z ich API
             forge_versions_url = "https://files.minecraftforge.net/net/minecraftforge/forge/maven-metadata.json"
-            response = requests.get(forge_versions_url)
-            if response.status_code == 200:
-                data = response.json()
+            data = self.versions.cache.get(forge_versions_url)
+            if data:
                 # Znajdź odpowiednią wersję Forge dla podanej wersji Minecraft
                 if version in data:
                     latest_forge = data[version][-1]  # Najnowsza wersja Forge
@@ -365,9 +2460,8 @@ class ServerManager:
         try:
             # NeoForge API - przykładowy URL (może wymagać aktualizacji)
             neoforge_versions_url = "https://maven.neoforged.net/net/neoforged/forge/maven-metadata.json"
-            response = requests.get(neoforge_versions_url)
-            if response.status_code == 200:
-                data = response.json()
+            data = self.versions.cache.get(neoforge_versions_url)
+            if data:
                 if version in data:
                     latest_neoforge = data[version][-1]
                     return f"https://maven.neoforged.net/net/neoforged/neoforge/{version}-{latest_neoforge}/neoforge-{version}-{latest_neoforge}-installer.jar"
@@ -395,18 +2489,20 @@ class ServerManager:
     
     def _get_latest_paper_build(self, version):
         """Pobierz najnowszy build Paper"""
-        # Dla uproszczenia - w pełnej implementacji zapytaj API
-        return 'latest'
+        resolved = self.versions.resolve('paper', version)
+        return resolved['build'] if resolved else 'latest'
     
     def _install_fabric_server(self, server_path, version):
         """Specjalna instalacja Fabric"""
         try:
-            fabric_url = f"https://meta.fabricmc.net/v2/versions/loader/{version}/latest/stable/server/jar"
+            resolved = self.versions.resolve('fabric', version)
+            fabric_url = resolved['url'] if resolved else \
+                f"https://meta.fabricmc.net/v2/versions/loader/{version}/latest/stable/server/jar"
             fabric_jar = os.path.join(server_path, 'fabric-server.jar')
             
-            success = self._download_file(fabric_url, fabric_jar)
-            if not success:
-                return False, "Failed to download Fabric installer"
+            method, error = self._fetch_artifact('fabric', version, fabric_url, fabric_jar)
+            if error:
+                return False, f"Failed to download Fabric installer: {error}"
             
             # Uruchom instalator
             process = subprocess.Popen(
@@ -439,20 +2535,23 @@ class ServerManager:
         except Exception as e:
             return False, f"Fabric installation error: {str(e)}"
     
-    def _download_file(self, url, file_path):
-        """Pobierz plik"""
+    def _fetch_artifact(self, implementation, version, url, file_path, checksums=None):
+        """Plik z magazynu artefaktów, pobierany tylko przy pierwszej instalacji danej wersji"""
+        key = artifact_key(implementation, version, artifact_build(url))
+        method, error = self.artifacts.fetch(key, file_path, lambda path: self._download_file(url, path, checksums),
+                                             source=url, checksums=checksums)
+        if method and method != 'downloaded':
+            logger.info(f"Provisioned {key} from artifact store ({method})")
+        return method, error
+    
+    def _download_file(self, url, file_path, checksums=None, priority=PRIORITY_INTERACTIVE):
+        """Pobierz plik przez kolejkę (wznawianie, sumy kontrolne liczone w locie); {'size', 'digests'} albo False"""
         try:
-            response = requests.get(url, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            
-            return os.path.exists(file_path) and os.path.getsize(file_path) > 0
+            result = self.downloader.download(url, file_path, checksums=checksums, priority=priority)
+            logger.info(f"Downloaded {url} ({result['size']} bytes)")
+            return result if result['size'] > 0 else False
             
-        except Exception as e:
+        except (DownloadError, OSError) as e:
             logger.error(f"Download error: {e}")
             return False
     
@@ -465,10 +2564,17 @@ class ServerManager:
         
         try:
             if server_data['type'] == 'java':
+                # Pliki JAR zainstalowane, gdy magazyn artefaktów dawał twarde dowiązania
+                for name in os.listdir(server_path):
+                    if name.endswith('.jar') and artifact_detach(os.path.join(server_path, name)):
+                        logger.info(f"Detached {name} of {server_name} from the shared artifact store")
                 cmd = self._get_java_start_command(server_path, server_data)
             else:  # bedrock
                 cmd = self._get_bedrock_start_command(server_path, server_data)
             
+            # Osobna grupa cgroup v2 z limitami (gdy włączone i dostępne)
+            cgroup_path = self.cgroups.prepare(server_name)
+            
             # Uruchom proces
             process = subprocess.Popen(
                 cmd,
@@ -480,25 +2586,24 @@ class ServerManager:
                 bufsize=1,
                 universal_newlines=True
             )
+            if cgroup_path and not self.cgroups.attach(cgroup_path, process.pid):
+                cgroup_path = None
             
             # Zapisz informacje o procesie
             with self.lock:
                 self.processes[server_name] = process
+                if cgroup_path:
+                    self.server_cgroups[server_name] = cgroup_path
                 self.server_info[server_name] = {
                     'process': process,
                     'status': 'running',
                     'type': server_data['type'],
                     'start_time': datetime.now(),
-                    'output_buffer': []
+                    'output_buffer': ConsoleBuffer(self.console_buffer_lines)
                 }
             
-            # Uruchom wątek do przechwytywania outputu
-            thread = threading.Thread(
-                target=self._capture_output, 
-                args=(server_name, process),
-                daemon=True
-            )
-            thread.start()
+            # Podłącz output do wspólnej pompy (na Windows - osobny wątek)
+            self._start_output_capture(server_name, process)
             
             return True, f"Server {server_name} started with PID: {process.pid}"
             
@@ -639,63 +2744,130 @@ class ServerManager:
         except Exception as e:
             return False, f"Error sending command: {str(e)}"
     
-    def _capture_output(self, server_name, process):
+    def _start_output_capture(self, server_name, process):
         """Przechwytuj output serwera"""
-        output_buffer = []
+        with self.lock:
+            output_buffer = self.server_info[server_name]['output_buffer']
+            # Grupa tego procesu - sprzątana przy jego zakończeniu niezależnie od stanu server_info
+            cgroup_path = self.server_cgroups.get(server_name)
+        log_sink = self.log_sinks.open(
+            server_name, console_log_path(self.get_server_path(server_name))
+        )
+        
+        def on_line(line):
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            formatted_line = f"[{timestamp}] {line.strip()}\n"
+            output_buffer.append(formatted_line)
+            
+            # Zapisz do pliku (paczkami, przez otwarty uchwyt)
+            log_sink.write(formatted_line)
+        
+        def on_close():
+            # Serwer się zakończył
+            self.log_sinks.close(server_name)
+            output_buffer.close()
+            with self.lock:
+                info = self.server_info.get(server_name)
+                if info and info.get('process') is process:
+                    info['status'] = 'stopped'
+                # Wpis zostaje tylko, gdy pod tą samą ścieżką działa już nowy proces
+                restarted = self.processes.get(server_name) not in (None, process)
+                if cgroup_path and self.server_cgroups.get(server_name) == cgroup_path and not restarted:
+                    del self.server_cgroups[server_name]
+            if cgroup_path:
+                self.cgroups.release(cgroup_path)
         
+        if self.output_pump is not None:
+            self.output_pump.register(server_name, process.stdout, on_line, on_close)
+        else:
+            threading.Thread(
+                target=self._capture_output,
+                args=(server_name, process, on_line, on_close),
+                daemon=True
+            ).start()
+    
+    def _capture_output(self, server_name, process, on_line, on_close):
+        """Odczyt wątek-na-serwer (gdy selectors nie obsługuje potoków)"""
         while True:
             try:
                 line = process.stdout.readline()
                 if not line and process.poll() is not None:
                     break
-                
                 if line:
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    formatted_line = f"[{timestamp}] {line.strip()}\n"
-                    output_buffer.append(formatted_line)
-                    
-                    # Ogranicz bufor do 1000 linii
-                    if len(output_buffer) > 1000:
-                        output_buffer.pop(0)
-                    
-                    # Zapisz w pamięci
-                    with self.lock:
-                        if server_name in self.server_info:
-                            self.server_info[server_name]['output_buffer'] = output_buffer
-                    
-                    # Zapisz do pliku
-                    self._write_to_log_file(server_name, formatted_line)
-                    
+                    on_line(line)
             except Exception as e:
                 logger.error(f"Error capturing output for {server_name}: {e}")
                 break
-        
-        # Serwer się zakończył
-        with self.lock:
-            if server_name in self.server_info:
-                self.server_info[server_name]['status'] = 'stopped'
+        on_close()
     
-    def _write_to_log_file(self, server_name, line):
-        """Zapisz linię do pliku logu"""
-        try:
-            server_path = self.get_server_path(server_name)
-            logs_dir = os.path.join(server_path, 'logs')
-            os.makedirs(logs_dir, exist_ok=True)
-            
-            log_file = os.path.join(logs_dir, 'latest.log')
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(line)
-        except Exception as e:
-            logger.error(f"Error writing to log file: {e}")
+    def get_output_buffer(self, server_name):
+        """Zwróć bufor konsoli serwera (lub None)"""
+        with self.lock:
+            info = self.server_info.get(server_name)
+            return info.get('output_buffer') if info else None
     
     def get_server_output(self, server_name, lines=100):
         """Pobierz output serwera"""
-        with self.lock:
-            if server_name in self.server_info:
-                output_buffer = self.server_info[server_name].get('output_buffer', [])
-                recent_lines = output_buffer[-lines:] if len(output_buffer) > lines else output_buffer
-                return ''.join(recent_lines)
-        return ""
+        output_buffer = self.get_output_buffer(server_name)
+        if output_buffer is None:
+            return ""
+        return ''.join(output_buffer.tail(lines))
+    
+    def get_server_output_since(self, server_name, since, limit=None):
+        """Pobierz tylko linie dopisane po kursorze `since`"""
+        output_buffer = self.get_output_buffer(server_name)
+        if output_buffer is None:
+            return {'lines': [], 'next': 0, 'gap': 0, 'reset': since > 0, 'running': False}
+        result = output_buffer.read_cursor(since, limit)
+        result['running'] = not output_buffer.closed
+        return result
+    
+    def _process_metrics(self, pid, server_name=None):
+        """CPU i pamięć procesu; obiekt psutil trzymany między odczytami, więc cpu_percent nie blokuje.
+
+        Serwer we własnej grupie cgroup - CPU, pamięć, I/O i PSI z plików grupy
+        (razem z procesami potomnymi).
+        """
+        cgroup_path = self.server_cgroups.get(server_name)
+        if cgroup_path:
+            cgroup = self.cgroups.read_metrics(cgroup_path)
+            if cgroup:
+                try:
+                    uptime = int(time.time() - psutil.Process(pid).create_time())
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    uptime = None
+                return {
+                    'cpu_percent': cgroup['cpu_percent'] or 0.0,
+                    'memory_rss': cgroup['memory_current'],
+                    'memory_mb': round(cgroup['memory_current'] / 1024 / 1024, 1),
+                    'uptime': uptime,
+                    'io_read_rate': cgroup['io_read_rate'],
+                    'io_write_rate': cgroup['io_write_rate'],
+                    'cgroup': {
+                        'memory_max': cgroup['memory_max'],
+                        'oom_kills': cgroup['oom_kills'],
+                        'pids': cgroup['pids'],
+                        'cpu_throttled_usec': cgroup['cpu_throttled_usec'],
+                        'pressure': cgroup['pressure']
+                    }
+                }
+        try:
+            process = self._metric_processes.get(pid)
+            if process is None or not process.is_running():
+                process = psutil.Process(pid)
+                process.cpu_percent(None)
+                self._metric_processes[pid] = process
+            with process.oneshot():
+                memory = process.memory_info()
+                return {
+                    'cpu_percent': round(process.cpu_percent(None), 1),
+                    'memory_rss': memory.rss,
+                    'memory_mb': round(memory.rss / 1024 / 1024, 1),
+                    'uptime': int(time.time() - process.create_time())
+                }
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            self._metric_processes.pop(pid, None)
+            return None
     
     def get_server_status(self, server_name):
         """Pobierz status serwera"""
@@ -708,7 +2880,8 @@ class ServerManager:
                     return {
                         'running': True,
                         'pid': process.pid,
-                        'status': 'running'
+                        'status': 'running',
+                        'metrics': self._process_metrics(process.pid, server_name)
                     }
                 else:
                     # Proces zakończony
@@ -878,7 +3051,7 @@ class ServerManager:
 
             plugin_path = os.path.join(plugins_path, secure_filename(filename))
 
-            success = self._download_file(plugin_url, plugin_path)
+            success = self._download_file(plugin_url, plugin_path, priority=PRIORITY_NORMAL)
             if not success:
                 return False, "Failed to download plugin"
 
@@ -901,7 +3074,10 @@ class ServerManager:
 
 
 class MCPanelAgent:
-    def __init__(self, panel_url, agent_token, agent_name, capacity=5, port=8080, base_path="./servers"):
+    def __init__(self, panel_url, agent_token, agent_name, capacity=5, port=8080, base_path="./servers",
+                 console_buffer_lines=1000, log_flush_interval=1.0,
+                 log_rotate_bytes=0, log_rotate_daily=False, metrics_interval=10, cgroups=None,
+                 artifacts=None, versions=None, downloader=None):
         self.panel_url = panel_url.rstrip('/')
         self.agent_token = agent_token
         self.agent_name = agent_name
@@ -911,7 +3087,17 @@ class MCPanelAgent:
         self.status = 'online'
         
         # Inicjalizuj menedżer serwerów
-        self.server_manager = ServerManager(base_path)
+        self.server_manager = ServerManager(
+            base_path,
+            console_buffer_lines=console_buffer_lines,
+            log_flush_interval=log_flush_interval,
+            log_rotate_bytes=log_rotate_bytes,
+            log_rotate_daily=log_rotate_daily,
+            cgroups=cgroups,
+            artifacts=artifacts,
+            versions=versions,
+            downloader=downloader
+        )
         
         self.headers = {
             'Authorization': f'Bearer {agent_token}',
@@ -921,8 +3107,17 @@ class MCPanelAgent:
         
         os.makedirs(self.base_path, exist_ok=True)
         
+        # Ostatni pomiar systemu i procesów - /metrics nie woła psutil przy scrapowaniu
+        self.metrics_interval = metrics_interval
+        self.system_snapshot = None
+        self.server_snapshots = {}
+        self.request_latency = PromHistogram(
+            'mcpanel_agent_http_request_duration_seconds', 'HTTP request latency per route.',
+            ('method', 'route', 'status'))
+        
         self.app = Flask(__name__)
         self.setup_cors()
+        self.setup_request_metrics()
         self.setup_routes()
         
     def setup_cors(self):
@@ -944,8 +3139,28 @@ class MCPanelAgent:
                 response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
                 return response
 
+    def setup_request_metrics(self):
+        """Czas obsługi żądań per reguła routingu"""
+        
+        @self.app.before_request
+        def start_request_timer():
+            request.environ['mcpanel.started'] = time.perf_counter()
+        
+        @self.app.after_request
+        def observe_request(response):
+            started = request.environ.get('mcpanel.started')
+            if started is not None:
+                route = request.url_rule.rule if request.url_rule else 'unmatched'
+                self.request_latency.observe(time.perf_counter() - started, method=request.method,
+                                             route=route, status=response.status_code)
+            return response
+
     def setup_routes(self):
         """Konfiguruje endpointy HTTP agenta"""
+        
+        @self.app.route('/metrics', methods=['GET'])
+        def prometheus_metrics():
+            return Response('\n'.join(self._render_metrics()) + '\n', mimetype=PROMETHEUS_CONTENT_TYPE)
 
         @self.app.route('/status', methods=['GET'])
         def agent_status():
@@ -1107,18 +3322,54 @@ class MCPanelAgent:
             """Endpoint do pobierania konsoli serwera"""
             try:
                 lines = request.args.get('lines', 100, type=int)
+                since = request.args.get('since', type=int)
+                
+                if since is not None:
+                    result = self.server_manager.get_server_output_since(server_name, since, lines)
+                    return jsonify({
+                        'server': server_name,
+                        'output': ''.join(result['lines']),
+                        'entries': result['lines'],
+                        'lines': len(result['lines']),
+                        'next': result['next'],
+                        'gap': result['gap'],
+                        'reset': result['reset'],
+                        'running': result['running']
+                    })
+                
                 output = self.server_manager.get_server_output(server_name, lines)
+                output_buffer = self.server_manager.get_output_buffer(server_name)
                 
                 return jsonify({
                     'server': server_name,
                     'output': output,
-                    'lines': len(output.split('\n')) if output else 0
+                    'lines': len(output.split('\n')) if output else 0,
+                    'next': output_buffer.next_seq if output_buffer is not None else 0
                 })
                 
             except Exception as e:
                 logger.error(f"Console error: {e}")
                 return jsonify({'error': str(e)}), 500
 
+        @self.app.route('/server/<server_name>/console/stream', methods=['GET'])
+        def stream_console(server_name):
+            """Strumień SSE konsoli serwera (panel przekazuje go dalej do przeglądarek)"""
+            since = request.args.get('since', type=int)
+            if since is None:
+                since = request.headers.get('Last-Event-ID', type=int)
+            lines = request.args.get('lines', 100, type=int)
+            
+            response = Response(
+                stream_console_sse(
+                    lambda: self.server_manager.get_output_buffer(server_name),
+                    since=since,
+                    backlog=lines
+                ),
+                mimetype='text/event-stream'
+            )
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
         @self.app.route('/server/<server_name>/status', methods=['GET'])
         def get_server_status(server_name):
             """Endpoint do pobierania statusu serwera"""
@@ -1133,6 +3384,22 @@ class MCPanelAgent:
                 logger.error(f"Status error: {e}")
                 return jsonify({'error': str(e)}), 500
 
+        @self.app.route('/servers/status', methods=['POST'])
+        def get_servers_status():
+            """Status wielu serwerów naraz (panel pyta każdego agenta raz na odświeżenie)"""
+            try:
+                data = request.get_json(silent=True) or {}
+                names = data.get('servers')
+                if not names:
+                    names = sorted(set(self.server_manager.processes) | set(self.server_manager.server_info))
+                return jsonify({
+                    'servers': {name: self.server_manager.get_server_status(name) for name in names}
+                })
+                
+            except Exception as e:
+                logger.error(f"Bulk status error: {e}")
+                return jsonify({'error': str(e)}), 500
+
         @self.app.route('/server/<server_name>/delete', methods=['POST'])
         def delete_server_files(server_name):
             """Endpoint do usuwania plików serwera na agencie"""
@@ -1163,18 +3430,67 @@ class MCPanelAgent:
                     return jsonify({'error': 'Log file not found'}), 404
                 
                 lines = request.args.get('lines', 100, type=int)
-                with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                    log_lines = f.readlines()[-lines:]
+                before = request.args.get('before', type=int)
+                result = tail_lines(log_file, lines, before)
                 
                 return jsonify({
-                    'logs': log_lines,
-                    'total_lines': len(log_lines),
-                    'file': log_file
+                    'logs': result['lines'],
+                    'total_lines': len(result['lines']),
+                    'file': log_file,
+                    'start': result['start'],
+                    'size': result['size'],
+                    'has_more': result['has_more']
                 })
             except Exception as e:
                 logger.error(f"Error reading agent logs: {e}")
                 return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/logs/server/<server_name>/window', methods=['GET'])
+        def get_server_logs_window(server_name):
+            """Logi panelu z okna czasowego ?from=&to= (epoch), łącznie z archiwum"""
+            try:
+                server_path = self.server_manager.get_server_path(server_name)
+                if not os.path.exists(server_path):
+                    return jsonify({'error': 'Server not found'}), 404
+                
+                start = request.args.get('from', type=float)
+                end = request.args.get('to', type=float)
+                limit = request.args.get('limit', 1000, type=int)
+                result = read_log_window(console_log_path(server_path), start, end, limit)
+                
+                return jsonify({
+                    'logs': result['lines'],
+                    'total_lines': len(result['lines']),
+                    'truncated': result['truncated'],
+                    'server': server_name
+                })
+            except Exception as e:
+                logger.error(f"Error reading server log window: {e}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/logs/server/<server_name>/search', methods=['GET'])
+        def search_server_logs(server_name):
+            """Wyszukiwanie w logach serwera (?q=, ?regex=, ?from=, ?to= w epoch)"""
+            try:
+                server_path = self.server_manager.get_server_path(server_name)
+                if not os.path.exists(server_path):
+                    return jsonify({'error': 'Server not found'}), 404
+                
+                result = self.server_manager.log_index.search(
+                    console_log_path(server_path),
+                    query=request.args.get('q') or None,
+                    regex=request.args.get('regex') or None,
+                    start=request.args.get('from', type=float),
+                    end=request.args.get('to', type=float),
+                    limit=min(request.args.get('limit', 200, type=int), 5000)
+                )
+                return jsonify(result)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except Exception as e:
+                logger.error(f"Error searching server logs: {e}")
+                return jsonify({'error': str(e)}), 500
+        
         @self.app.route('/logs/server/<server_name>', methods=['GET'])
         def get_server_logs(server_name):
             try:
@@ -1184,6 +3500,7 @@ class MCPanelAgent:
                 
                 log_files = []
                 possible_log_paths = [
+                    console_log_path(server_path),
                     os.path.join(server_path, 'logs', 'latest.log'),
                     os.path.join(server_path, 'server.log'),
                     os.path.join(server_path, 'logs', '*.log'),
@@ -1201,15 +3518,17 @@ class MCPanelAgent:
                 
                 latest_log = max(log_files, key=os.path.getmtime)
                 lines = request.args.get('lines', 100, type=int)
-                
-                with open(latest_log, 'r', encoding='utf-8', errors='ignore') as f:
-                    log_lines = f.readlines()[-lines:]
+                before = request.args.get('before', type=int)
+                result = tail_lines(latest_log, lines, before)
                 
                 return jsonify({
-                    'logs': log_lines,
-                    'total_lines': len(log_lines),
+                    'logs': result['lines'],
+                    'total_lines': len(result['lines']),
                     'file': latest_log,
-                    'server': server_name
+                    'server': server_name,
+                    'start': result['start'],
+                    'size': result['size'],
+                    'has_more': result['has_more']
                 })
                 
             except Exception as e:
@@ -1233,10 +3552,13 @@ class MCPanelAgent:
                     'delete_server': '/server/<name>/delete (POST)',
                     'send_command': '/server/<name>/command (POST)',
                     'get_console': '/server/<name>/console (GET)',
+                    'stream_console': '/server/<name>/console/stream (GET, SSE)',
                     'get_status': '/server/<name>/status (GET)',
                     'files_check': '/server/<name>/files/check (GET)',
                     'agent_logs': '/logs/agent (GET)',
                     'server_logs': '/logs/server/<name> (GET)',
+                    'server_logs_window': '/logs/server/<name>/window (GET)',
+                    'server_logs_search': '/logs/server/<name>/search (GET)',
                     'system_check': '/system/check (GET)',
                     'list_files': '/server/<name>/files (GET)',
                     'read_file': '/server/<name>/files/read (GET)',
@@ -1408,6 +3730,7 @@ class MCPanelAgent:
         logger.info(f"Base path: {self.base_path}")
         
         self.status = 'online'
+        self.server_manager.versions.start()
         
         report_thread = threading.Thread(target=self._report_status_loop, daemon=True)
         report_thread.start()
@@ -1415,6 +3738,9 @@ class MCPanelAgent:
         monitor_thread = threading.Thread(target=self._monitor_servers_loop, daemon=True)
         monitor_thread.start()
         
+        metrics_thread = threading.Thread(target=self._sample_metrics_loop, daemon=True)
+        metrics_thread.start()
+        
         logger.info(f"Starting agent HTTP server on port {self.port}")
         self.app.run(host='0.0.0.0', port=self.port, debug=False, use_reloader=False)
 
@@ -1451,6 +3777,55 @@ class MCPanelAgent:
                 logger.error(f"Error getting server list: {e}")
             time.sleep(15)
 
+    def _sample_metrics_loop(self):
+        psutil.cpu_percent(None)
+        while self.status == 'online':
+            time.sleep(self.metrics_interval)
+            try:
+                self.system_snapshot = {
+                    'cpu_percent': psutil.cpu_percent(None),
+                    'memory_percent': psutil.virtual_memory().percent,
+                    'disk_percent': psutil.disk_usage(self.base_path).percent
+                }
+                snapshots = {}
+                for server_name, process in list(self.server_manager.processes.items()):
+                    if process.poll() is None:
+                        metrics = self.server_manager._process_metrics(process.pid, server_name)
+                        if metrics:
+                            snapshots[server_name] = metrics
+                self.server_snapshots = snapshots
+            except Exception as e:
+                logger.error(f"Error sampling metrics: {e}")
+
+    def _render_metrics(self):
+        lines = self.request_latency.render() + self.server_manager.capture_lag.render()
+        system = self.system_snapshot or {}
+        for name, documentation, key in (
+                ('mcpanel_agent_cpu_percent', 'Host CPU usage.', 'cpu_percent'),
+                ('mcpanel_agent_memory_percent', 'Host memory usage.', 'memory_percent'),
+                ('mcpanel_agent_disk_percent', 'Usage of the filesystem holding the servers.', 'disk_percent')):
+            lines += prom_gauge(name, documentation, [((self.agent_name,), system.get(key))], ('agent',))
+        lines += prom_gauge('mcpanel_agent_running_servers', 'Servers running on the agent.',
+                            [((self.agent_name,), len(self.server_manager.processes))], ('agent',))
+        
+        snapshots = self.server_snapshots
+        for name, documentation, key in (
+                ('mcpanel_server_cpu_percent', 'CPU usage of the server process.', 'cpu_percent'),
+                ('mcpanel_server_memory_rss_bytes', 'Resident memory of the server process.', 'memory_rss'),
+                ('mcpanel_server_uptime_seconds', 'Uptime of the server process.', 'uptime')):
+            lines += prom_gauge(name, documentation,
+                                [((self.agent_name, server_name), metrics.get(key))
+                                 for server_name, metrics in sorted(snapshots.items())],
+                                ('agent', 'server'))
+        cgroups = {server_name: metrics['cgroup'] for server_name, metrics in snapshots.items() if metrics.get('cgroup')}
+        for resource in ('cpu', 'memory', 'io'):
+            lines += prom_gauge(f'mcpanel_server_{resource}_pressure_some',
+                                f'Share of time (avg10) tasks of the server cgroup stalled on {resource}.',
+                                [((self.agent_name, server_name), cgroup['pressure'][resource].get('some'))
+                                 for server_name, cgroup in sorted(cgroups.items())],
+                                ('agent', 'server'))
+        return lines
+
     def _get_system_status(self):
         try:
             cpu_percent = psutil.cpu_percent(interval=1)
@@ -1465,6 +3840,8 @@ class MCPanelAgent:
                 'disk_usage': round(disk_percent, 1),
                 'running_servers': len(self.server_manager.processes),
                 'max_servers': self.capacity,
+                'servers': {server_name: {'cpu_percent': metrics['cpu_percent'], 'memory_mb': metrics['memory_mb']}
+                            for server_name, metrics in self.server_snapshots.items()},
                 'timestamp': datetime.now().isoformat()
             }
         except Exception as e:
@@ -1508,6 +3885,38 @@ def main():
     capacity = int(os.environ.get('AGENT_CAPACITY', '5'))
     agent_port = int(os.environ.get('AGENT_PORT', '9292'))
     base_path = os.environ.get('AGENT_BASE_PATH', '/opt/mcpanel-agent/servers')
+    console_buffer_lines = int(os.environ.get('AGENT_CONSOLE_BUFFER_LINES', '1000'))
+    log_flush_interval = float(os.environ.get('AGENT_LOG_FLUSH_INTERVAL', '1.0'))
+    log_rotate_bytes = int(os.environ.get('AGENT_LOG_ROTATE_BYTES', str(32 * 1024 * 1024)))
+    log_rotate_daily = os.environ.get('AGENT_LOG_ROTATE_DAILY', 'true').lower() == 'true'
+    metrics_interval = float(os.environ.get('AGENT_METRICS_INTERVAL', '10'))
+    cgroups = CgroupManager(
+        enabled=os.environ.get('AGENT_CGROUPS', 'false').lower() == 'true',
+        parent=os.environ.get('AGENT_CGROUP_PARENT', 'mcpanel-agent.slice'),
+        cpu_max=os.environ.get('AGENT_CGROUP_CPU_MAX'),
+        memory_max=os.environ.get('AGENT_CGROUP_MEMORY_MAX'),
+        io_weight=os.environ.get('AGENT_CGROUP_IO_WEIGHT')
+    )
+    artifacts = ArtifactStore(
+        os.environ.get('AGENT_ARTIFACT_CACHE') or os.path.join(base_path, '.artifacts'),
+        latest_ttl=int(os.environ.get('AGENT_ARTIFACT_LATEST_TTL', str(6 * 3600)))
+    )
+    versions = VersionResolver(
+        os.environ.get('AGENT_VERSION_CACHE') or os.path.join(base_path, '.versions'),
+        ttl=int(os.environ.get('AGENT_VERSION_CACHE_TTL', '600')),
+        timeout=float(os.environ.get('AGENT_VERSION_FETCH_TIMEOUT', '5'))
+    )
+    downloader = DownloadScheduler(
+        Downloader(
+            connect_timeout=float(os.environ.get('AGENT_DOWNLOAD_CONNECT_TIMEOUT', '10')),
+            read_timeout=float(os.environ.get('AGENT_DOWNLOAD_READ_TIMEOUT', '60')),
+            retries=int(os.environ.get('AGENT_DOWNLOAD_RETRIES', '5')),
+            segments=int(os.environ.get('AGENT_DOWNLOAD_SEGMENTS', '4')),
+            segment_min_size=int(os.environ.get('AGENT_DOWNLOAD_SEGMENT_MIN_SIZE', str(32 * 1024 * 1024)))
+        ),
+        max_concurrent=int(os.environ.get('AGENT_DOWNLOAD_MAX_CONCURRENT', '3')),
+        bandwidth=int(os.environ.get('AGENT_DOWNLOAD_BANDWIDTH_LIMIT', '0'))
+    )
 
     if not panel_url or not agent_token:
         logger.critical("PANEL_URL and AGENT_TOKEN environment variables must be set.")
@@ -1521,7 +3930,16 @@ def main():
         agent_name=agent_name,
         capacity=capacity,
         port=agent_port,
-        base_path=base_path
+        base_path=base_path,
+        console_buffer_lines=console_buffer_lines,
+        log_flush_interval=log_flush_interval,
+        log_rotate_bytes=log_rotate_bytes,
+        log_rotate_daily=log_rotate_daily,
+        metrics_interval=metrics_interval,
+        cgroups=cgroups,
+        artifacts=artifacts,
+        versions=versions,
+        downloader=downloader
     )
     
     try:
@@ -113,6 +113,9 @@ def create_app():
             
             return response
     
+    from .middleware import init_request_metrics
+    init_request_metrics(app)
+    
     # Initialize managers
     from .managers import init_managers
     init_managers(app)
@@ -123,6 +126,10 @@ def create_app():
     from .routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
     
+    from .console_stream import console_sock
+    if console_sock is not None:
+        console_sock.init_app(app)
+    
     from .cli import register_commands
     register_commands(app)
     
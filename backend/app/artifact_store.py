@@ -0,0 +1,222 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# ioctl(FICLONE) - kopia copy-on-write na btrfs/xfs/bcachefs
+FICLONE = 0x40049409
+LATEST_TTL = 6 * 3600
+HASH_CHUNK = 1024 * 1024
+PARTIAL_MAX_AGE = 86400
+
+
+def artifact_key(implementation, version, build=None):
+    return f"{implementation}/{version}/{build or 'latest'}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(source, target):
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def _clone(source, target):
+    """Niezależna kopia `source` pod `target`: reflink, a gdy system plików go nie ma - zwykła kopia"""
+    try:
+        _reflink(source, target)
+        method = 'reflink'
+    except OSError:
+        shutil.copyfile(source, target)
+        method = 'copy'
+    os.chmod(target, 0o644)
+    return method
+
+
+def detach(path):
+    """Zerwij twarde dowiązanie pliku serwera (instalacje sprzed rezygnacji z hardlinków).
+
+    Plik z st_nlink > 1 dzieli i-węzeł z magazynem i innymi serwerami -
+    zapis w miejscu (przywracanie kopii, edytor plików) zmieniłby go
+    wszystkim. Zastępuje go własną kopią; zwraca True, gdy coś zmienił.
+    """
+    if os.stat(path).st_nlink <= 1:
+        return False
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        _clone(path, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return True
+
+
+class ArtifactStore:
+    """Wspólny magazyn plików serwerów (jar, instalatory, archiwa Bedrock) adresowany treścią.
+
+    Pliki leżą raz w `<root>/sha256/<ab>/<sha256>`, a indeks JSON mapuje
+    klucz (implementacja, wersja, build) na hash. Instalacja serwera dostaje
+    kopię reflink (copy-on-write - bez dodatkowego miejsca na btrfs/xfs),
+    a gdy system plików jej nie obsługuje - zwykłą kopię, więc kolejne
+    serwery tej samej wersji nie pobierają niczego. Twardych dowiązań nie
+    ma: plik serwera zapisany w miejscu (przywracanie kopii zapasowej,
+    edytor plików) zmieniłby wtedy magazyn i każdy serwer tej wersji.
+    Buildy 'latest' wygasają po `latest_ttl` sekundach. Plik magazynu
+    zmieniony mimo to (rozmiar lub mtime) wypada z indeksu zamiast trafić
+    do kolejnych serwerów.
+    """
+
+    def __init__(self, root, latest_ttl=LATEST_TTL):
+        self.root = root
+        self.latest_ttl = latest_ttl
+        self._index_path = os.path.join(root, 'index.json')
+        self._index = None
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, 'sha256', sha256[:2], sha256)
+
+    def _load(self):
+        if self._index is None:
+            try:
+                with open(self._index_path, 'r') as f:
+                    self._index = json.load(f).get('artifacts', {})
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = f"{self._index_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'artifacts': self._index}, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self._index_path)
+
+    def lookup(self, key):
+        """Wpis indeksu {'sha256', 'size', 'name', 'source', 'stored_at'} albo None"""
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                return None
+            if key.endswith('/latest') and time.time() - entry['stored_at'] > self.latest_ttl:
+                return None
+            try:
+                stat = os.stat(self.blob_path(entry['sha256']))
+            except OSError:
+                stat = None
+            if stat is None or stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+                print(f"Artifact {key} is missing or was modified in place, dropping it from the store")
+                del self._index[key]
+                if stat is not None:
+                    # Serwery mają własne kopie, magazyn pobierze czysty plik od nowa
+                    os.remove(self.blob_path(entry['sha256']))
+                self._save()
+                return None
+            return dict(entry)
+
+    def add(self, key, file_path, source=None, sha256=None, digests=None):
+        """Przenieś pobrany plik do magazynu (plik o tym samym hashu jest współdzielony); zwraca wpis"""
+        sha256 = sha256 or file_sha256(file_path)
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            os.remove(file_path)
+        else:
+            os.replace(file_path, blob)
+            os.chmod(blob, 0o444)
+        stat = os.stat(blob)
+        entry = {
+            'sha256': sha256,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'name': os.path.basename(source or file_path),
+            'source': source,
+            'digests': dict(digests or {}, sha256=sha256),
+            'stored_at': time.time()
+        }
+        with self._lock:
+            self._load()[key] = entry
+            self._save()
+        return entry
+
+    def provision(self, sha256, target):
+        """Umieść plik z magazynu pod `target`: reflink -> kopia; zwraca użytą metodę"""
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        temp_path = f"{target}.{uuid.uuid4().hex}.part"
+        try:
+            method = _clone(blob, temp_path)
+            os.replace(temp_path, target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return method
+
+    @staticmethod
+    def _sweep(temp_dir):
+        """Usuń porzucone częściowe pobrania starsze niż PARTIAL_MAX_AGE"""
+        cutoff = time.time() - PARTIAL_MAX_AGE
+        for entry in os.scandir(temp_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def fetch(self, key, target, download, source=None, checksums=None):
+        """Plik artefaktu pod `target`, pobierany tylko gdy nie ma go w magazynie.
+
+        `download(path)` zapisuje plik pod wskazaną ścieżką i zwraca wynik
+        Downloader.download ({'size', 'digests'}) albo False; sha256 policzony
+        w trakcie pobierania oszczędza ponowne czytanie pliku. Wpis, którego
+        zapisane skróty nie zgadzają się z `checksums`, jest pobierany od nowa.
+        Równoległe instalacje tej samej wersji czekają na jedno pobranie.
+        Zwraca (metoda, błąd): 'reflink'/'copy' z magazynu,
+        'downloaded' gdy plik został pobrany, albo (None, komunikat).
+        """
+        with self._key_lock(key):
+            entry = self.lookup(key)
+            if entry is not None and any(entry.get('digests', {}).get(name, value) != value
+                                         for name, value in (checksums or {}).items()):
+                print(f"Artifact {key} does not match the published checksum, downloading again")
+                entry = None
+            downloaded = False
+            if entry is None:
+                temp_dir = os.path.join(self.root, 'tmp')
+                os.makedirs(temp_dir, exist_ok=True)
+                self._sweep(temp_dir)
+                # Stała nazwa per klucz - przerwane pobieranie (.part) zostanie wznowione
+                temp_path = os.path.join(temp_dir, hashlib.sha1(key.encode()).hexdigest())
+                try:
+                    result = download(temp_path)
+                    if not result:
+                        return None, f"Download of {key} failed"
+                    if not os.path.exists(temp_path) or os.path.getsize(temp_path) == 0:
+                        return None, f"Download of {key} produced an empty file"
+                    digests = result.get('digests', {}) if isinstance(result, dict) else {}
+                    entry = self.add(key, temp_path, source, digests.get('sha256'), digests)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                downloaded = True
+        try:
+            method = self.provision(entry['sha256'], target)
+        except OSError as e:
+            return None, f"Could not provision {key}: {e}"
+        return ('downloaded' if downloaded else method), None
@@ -1,13 +1,25 @@
 import os
 import json
-import requests
 import zipfile
 import shutil
 from pathlib import Path
+from .downloader import DownloadError
+from .download_scheduler import DownloadScheduler, PRIORITY_NORMAL
 
 class BedrockAddonManager:
-    def __init__(self, server_base_path):
+    def __init__(self, server_base_path, downloader=None):
         self.server_base_path = server_base_path
+        # Wspólna kolejka z ServerManager - addony też liczą się do limitów pobierania
+        self.downloader = downloader or DownloadScheduler()
+    
+    def _download(self, url, file_path):
+        """Pobierz plik przez kolejkę pobierania; True/False"""
+        try:
+            self.downloader.download(url, file_path, priority=PRIORITY_NORMAL)
+            return True
+        except (DownloadError, OSError) as e:
+            print(f"Download of {url} failed: {e}")
+            return False
     
     def install_addon(self, addon, server_name, world_name=None):
         """Instaluje addon na serwerze z obsługą różnych typów pakietów"""
@@ -106,14 +118,9 @@ class BedrockAddonManager:
             os.makedirs(temp_dir, exist_ok=True)
         
             # Pobierz plik .mcaddon
-            response = requests.get(addon.download_url, stream=True)
-            if response.status_code != 200:
-                return False, "Failed to download combined addon"
-        
             temp_mcaddon = os.path.join(temp_dir, f"{addon.name}.mcaddon")
-            with open(temp_mcaddon, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            if not self._download(addon.download_url, temp_mcaddon):
+                return False, "Failed to download combined addon"
         
             print(f"Extracting .mcaddon file: {temp_mcaddon}")
         
@@ -305,16 +312,10 @@ class BedrockAddonManager:
             
             print(f"Downloading pack from: {url}")
             
-            # Pobierz plik
-            response = requests.get(url, stream=True)
-            if response.status_code != 200:
-                return False, f"Failed to download {pack_type} pack"
-            
-            # Zapisz plik tymczasowy
+            # Pobierz plik tymczasowy
             temp_file = os.path.join(temp_dir, "downloaded_pack.mcpack")
-            with open(temp_file, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            if not self._download(url, temp_file):
+                return False, f"Failed to download {pack_type} pack"
             
             print(f"File downloaded to: {temp_file}")
             
@@ -869,16 +870,10 @@ class BedrockAddonManager:
             # Utwórz katalog jeśli nie istnieje
             os.makedirs(world_path, exist_ok=True)
         
-            # Pobierz plik
-            response = requests.get(url, stream=True)
-            if response.status_code != 200:
-                return False, f"Failed to download world"
-        
-            # Zapisz plik tymczasowy
+            # Pobierz plik tymczasowy
             temp_zip = os.path.join(world_path, 'temp_world.mcworld')
-            with open(temp_zip, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            if not self._download(url, temp_zip):
+                return False, f"Failed to download world"
         
             # Rozpakuj (mcworld to zip)
             with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
@@ -0,0 +1,208 @@
+import os
+import time
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+DEFAULT_PARENT = 'mcpanel.slice'
+CPU_PERIOD = 100000
+CONTROLLERS = ('cpu', 'memory', 'io', 'pids')
+
+_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_bytes(value):
+    """'8G', '512M', '1073741824' -> bajty; puste/'max' -> None"""
+    if value is None:
+        return None
+    value = str(value).strip().lower().rstrip('b')
+    if not value or value == 'max':
+        return None
+    if value[-1] in _UNITS:
+        return int(float(value[:-1]) * _UNITS[value[-1]])
+    return int(value)
+
+
+def _read(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write(path, value):
+    with open(path, 'w') as f:
+        f.write(value)
+
+
+def _keyed(text):
+    """Plik 'klucz wartość' (cpu.stat, memory.stat) -> {klucz: int}"""
+    values = {}
+    for line in (text or '').splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            values[parts[0]] = int(parts[1])
+    return values
+
+
+def parse_io_stat(text):
+    """Suma rbytes/wbytes/rios/wios ze wszystkich urządzeń w io.stat"""
+    totals = {'rbytes': 0, 'wbytes': 0, 'rios': 0, 'wios': 0}
+    for line in (text or '').splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition('=')
+            if key in totals and value.isdigit():
+                totals[key] += int(value)
+    return totals
+
+
+def parse_pressure(text):
+    """{'some': avg10, 'full': avg10} z pliku *.pressure (PSI)"""
+    result = {}
+    for line in (text or '').splitlines():
+        parts = line.split()
+        if parts and parts[0] in ('some', 'full'):
+            for field in parts[1:]:
+                key, _, value = field.partition('=')
+                if key == 'avg10':
+                    result[parts[0]] = float(value)
+    return result
+
+
+class CgroupManager:
+    """Osobna grupa cgroup v2 dla każdego serwera uruchamianego przez panel.
+
+    Tryb opcjonalny (CGROUPS_ENABLED): przy pierwszym użyciu tworzony jest
+    katalog nadrzędny z włączonymi kontrolerami cpu/memory/io/pids, a każdy
+    serwer startuje w `<parent>/server-<id>` z limitami cpu.max, memory.max
+    i io.weight. Panel dopisuje proces do grupy (`attach()`) zaraz po
+    Popen - bez preexec_fn, który nie jest bezpieczny przy wielu wątkach -
+    więc procesy potomne serwera też są liczone w grupie. Gdy cgroup v2 nie
+    jest zamontowany albo katalog nie jest zapisywalny, `prepare()` zwraca
+    None, a gdy dołączenie się nie uda, grupa jest usuwana - w obu
+    przypadkach serwer działa jak dotąd, bez limitów.
+    """
+
+    def __init__(self, enabled=False, parent=DEFAULT_PARENT, cpu_max=None, memory_max=None, io_weight=None,
+                 root=CGROUP_ROOT):
+        self.enabled = enabled
+        self.root = root
+        self.parent = parent if os.path.isabs(parent) else os.path.join(root, parent)
+        self.cpu_max = float(cpu_max) if cpu_max else None
+        self.memory_max = parse_bytes(memory_max)
+        self.io_weight = int(io_weight) if io_weight else None
+        self._usable = None
+        self._samples = {}
+
+    def _setup(self):
+        """Sprawdź cgroup v2 i przygotuj katalog nadrzędny (raz)"""
+        if self._usable is not None:
+            return self._usable
+        self._usable = False
+        if not self.enabled:
+            return False
+        if not os.path.exists(os.path.join(self.root, 'cgroup.controllers')):
+            print("cgroup v2 is not mounted, server resource limits disabled")
+            return False
+        try:
+            os.makedirs(self.parent, exist_ok=True)
+            # Kontrolery muszą być włączone na każdym poziomie od korzenia
+            path = self.parent
+            chain = []
+            while os.path.realpath(path) != os.path.realpath(self.root):
+                path = os.path.dirname(path)
+                chain.append(path)
+            for directory in list(reversed(chain)) + [self.parent]:
+                available = (_read(os.path.join(directory, 'cgroup.controllers')) or '').split()
+                wanted = ' '.join(f'+{name}' for name in CONTROLLERS if name in available)
+                if wanted:
+                    _write(os.path.join(directory, 'cgroup.subtree_control'), wanted)
+        except OSError as e:
+            print(f"cgroup {self.parent} is not writable ({e}), server resource limits disabled")
+            return False
+        self._usable = True
+        return True
+
+    @property
+    def active(self):
+        return self._setup()
+
+    def path_for(self, server_id):
+        return os.path.join(self.parent, f'server-{server_id}')
+
+    def prepare(self, server_id):
+        """Utwórz grupę serwera z limitami; ścieżka albo None (tryb bez cgroup)"""
+        if not self._setup():
+            return None
+        path = self.path_for(server_id)
+        try:
+            os.makedirs(path, exist_ok=True)
+            if self.cpu_max:
+                _write(os.path.join(path, 'cpu.max'), f'{int(self.cpu_max * CPU_PERIOD)} {CPU_PERIOD}')
+            if self.memory_max:
+                _write(os.path.join(path, 'memory.max'), str(self.memory_max))
+            if self.io_weight:
+                _write(os.path.join(path, 'io.weight'), f'default {self.io_weight}')
+        except OSError as e:
+            print(f"Could not configure cgroup {path}: {e}")
+            return None
+        self._samples.pop(path, None)
+        return path
+
+    def attach(self, path, pid):
+        """Dopisz uruchomiony proces do grupy; False (grupa usunięta), gdy cgroup.procs odmówi"""
+        try:
+            _write(os.path.join(path, 'cgroup.procs'), str(pid))
+        except OSError as e:
+            # EACCES (brak praw do wspólnego przodka), EBUSY/EINVAL (grupa threaded/domain invalid)
+            print(f"Could not move process {pid} to cgroup {path} ({e}), running without resource limits")
+            self.release(path)
+            return False
+        return True
+
+    def release(self, path):
+        """Usuń pustą grupę po zakończeniu serwera"""
+        self._samples.pop(path, None)
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+
+    def read_metrics(self, path):
+        """CPU, pamięć, I/O i PSI grupy; cpu_percent i tempo I/O liczone od poprzedniego odczytu"""
+        cpu = _keyed(_read(os.path.join(path, 'cpu.stat')))
+        if not cpu:
+            return None
+        memory = _keyed(_read(os.path.join(path, 'memory.stat')))
+        io = parse_io_stat(_read(os.path.join(path, 'io.stat')))
+        now = time.monotonic()
+        metrics = {
+            'cpu_usage_usec': cpu.get('usage_usec', 0),
+            'cpu_percent': None,
+            'cpu_throttled_usec': cpu.get('throttled_usec', 0),
+            'cpu_nr_throttled': cpu.get('nr_throttled', 0),
+            'memory_current': int((_read(os.path.join(path, 'memory.current')) or '0').strip() or 0),
+            'memory_max': parse_bytes(_read(os.path.join(path, 'memory.max'))),
+            'memory_anon': memory.get('anon'),
+            'memory_file': memory.get('file'),
+            'oom_kills': _keyed(_read(os.path.join(path, 'memory.events'))).get('oom_kill', 0),
+            'pids': int((_read(os.path.join(path, 'pids.current')) or '0').strip() or 0),
+            'io_read_bytes': io['rbytes'],
+            'io_write_bytes': io['wbytes'],
+            'io_read_rate': None,
+            'io_write_rate': None,
+            'pressure': {
+                'cpu': parse_pressure(_read(os.path.join(path, 'cpu.pressure'))),
+                'memory': parse_pressure(_read(os.path.join(path, 'memory.pressure'))),
+                'io': parse_pressure(_read(os.path.join(path, 'io.pressure')))
+            }
+        }
+        previous = self._samples.get(path)
+        if previous is not None:
+            elapsed = now - previous[0]
+            if elapsed > 0:
+                metrics['cpu_percent'] = round(
+                    max(0, metrics['cpu_usage_usec'] - previous[1]) / (elapsed * 1e6) * 100, 1)
+                metrics['io_read_rate'] = max(0, int((io['rbytes'] - previous[2]) / elapsed))
+                metrics['io_write_rate'] = max(0, int((io['wbytes'] - previous[3]) / elapsed))
+        self._samples[path] = (now, metrics['cpu_usage_usec'], io['rbytes'], io['wbytes'])
+        return metrics
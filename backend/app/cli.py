@@ -1,3 +1,4 @@
+import click
 from .models import db, User
 
 def register_commands(app):
@@ -38,4 +39,27 @@ def register_commands(app):
             db.session.add(user)
             db.session.commit()
             
-            print(f"User {username} created successfully!")
\ No newline at end of file
+            print(f"User {username} created successfully!")
+    
+    @app.cli.command("bench-output-pump")
+    @click.option('--servers', default=20, help='Number of synthetic servers.')
+    @click.option('--lines', default=20000, help='Lines written by each server.')
+    def bench_output_pump(servers, lines):
+        """Benchmark console capture: thread-per-server vs one selector pump."""
+        from .output_pump import benchmark_output_capture
+        
+        results = benchmark_output_capture(servers=servers, lines=lines)
+        print(f"Expected lines: {results.pop('expected_lines')}")
+        for mode, result in results.items():
+            print(f"{mode:>8}: {result['seconds']}s, {result['lines']} lines, "
+                  f"{result['lines_per_sec']} lines/s, {result['threads']} reader thread(s)")
+    
+    @app.cli.command("bench-log-parser")
+    @click.option('--lines', default=200000, help='Number of console lines to parse.')
+    def bench_log_parser(lines):
+        """Benchmark the structured console line parser."""
+        from .log_parser import benchmark_parser
+        
+        result = benchmark_parser(lines=lines)
+        print(f"{result['lines']} lines, {result['events']} events in {result['seconds']}s "
+              f"({result['lines_per_sec']} lines/s)")
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+EPOCH_SHIFT = 20
+
+_epoch_lock = threading.Lock()
+_last_epoch = 0
+
+
+def _new_epoch():
+    """Pierwszy numer sekwencyjny nowego bufora: sekunda utworzenia << EPOCH_SHIFT.
+
+    Numery kolejnych buforów (procesów serwera, także po restarcie panelu)
+    nie zachodzą na siebie, a kursor niesie epokę swojego bufora. Wartości
+    mieszczą się w 2^53, więc przechodzą bez straty przez JSON i JavaScript.
+    """
+    global _last_epoch
+    with _epoch_lock:
+        _last_epoch = max(int(time.time()) << EPOCH_SHIFT, _last_epoch + (1 << EPOCH_SHIFT))
+        return _last_epoch
+
+
+class ConsoleBuffer:
+    """Bufor pierścieniowy konsoli jednego serwera.
+
+    Każda linia dostaje rosnący numer sekwencyjny (seq). Dopisywanie jest O(1),
+    a odczyt ostatnich N linii kosztuje O(N) - bez kopiowania całego bufora
+    i bez globalnej blokady menedżera. Czytelnicy strumieni czekają na nowe
+    linie przez `wait()` i pobierają tylko przyrost przez `read_since()`.
+    Numeracja zaczyna się od `base` (epoki bufora), więc kursor z innego
+    procesu serwera da się rozpoznać (`owns()`).
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = max(1, int(capacity))
+        self._lines = deque(maxlen=self.capacity)
+        self.base = _new_epoch()
+        self._next_seq = self.base
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self.closed = False
+
+    def __len__(self):
+        return len(self._lines)
+
+    @property
+    def next_seq(self):
+        """Numer sekwencyjny, który dostanie następna linia"""
+        return self._next_seq
+
+    @property
+    def first_seq(self):
+        """Numer sekwencyjny najstarszej linii w buforze"""
+        with self._lock:
+            return self._next_seq - len(self._lines)
+
+    def owns(self, seq):
+        """Czy kursor `seq` pochodzi z tego bufora (a nie z poprzedniego procesu)"""
+        return self.base <= seq <= self._next_seq
+
+    def append(self, line):
+        """Dopisz linię i zwróć jej numer sekwencyjny"""
+        with self._lock:
+            seq = self._next_seq
+            self._lines.append(line)
+            self._next_seq = seq + 1
+            self._cond.notify_all()
+        return seq
+
+    def tail(self, count):
+        """Zwróć ostatnie `count` linii (najstarsza pierwsza)"""
+        if count <= 0:
+            return []
+        with self._lock:
+            recent = list(islice(reversed(self._lines), count))
+        recent.reverse()
+        return recent
+
+    def read_since(self, seq):
+        """Zwróć (start_seq, linie) dopisane od numeru `seq` włącznie.
+
+        Jeśli część linii wypadła już z bufora, start_seq jest większy od `seq`.
+        """
+        with self._lock:
+            start = max(seq, self._next_seq - len(self._lines))
+            count = self._next_seq - start
+            if count <= 0:
+                return self._next_seq, []
+            lines = list(islice(reversed(self._lines), count))
+        lines.reverse()
+        return start, lines
+
+    def read_cursor(self, since, limit=None):
+        """Odczyt przyrostowy dla klientów odpytujących z kursorem `since`.
+
+        Zwraca linie dopisane od `since`, nowy kursor `next`, liczbę linii
+        utraconych przez zawinięcie bufora (`gap`) oraz flagę `reset`, gdy
+        kursor pochodzi z poprzedniego procesu serwera.
+        """
+        reset = not self.owns(since)
+        if reset:
+            since = self.base
+        start, lines = self.read_since(since)
+        if limit is not None and len(lines) > limit:
+            lines = lines[:limit]
+        return {
+            'lines': lines,
+            'next': start + len(lines),
+            'gap': start - since,
+            'reset': reset
+        }
+
+    def wait(self, seq, timeout=None):
+        """Czekaj aż pojawi się linia o numerze `seq` (lub bufor zostanie zamknięty)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._next_seq > seq or self.closed, timeout)
+
+    def close(self):
+        """Oznacz bufor jako zakończony i obudź oczekujących czytelników"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._lock:
+            self._lines.clear()
@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+import requests
+from .console_buffer import ConsoleBuffer
+from .event_bus import event_bus
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+# Opcjonalny kanał WebSocket (tylko gdy zainstalowano flask-sock)
+console_sock = Sock() if Sock else None
+
+KEEPALIVE_INTERVAL = 15
+
+
+def format_sse(data, event=None, event_id=None):
+    """Sformatuj pojedynczą wiadomość Server-Sent Events"""
+    message = ''
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    if event:
+        message += f'event: {event}\n'
+    message += f'data: {json.dumps(data)}\n\n'
+    return message
+
+
+def iter_console_batches(get_buffer, since=None, backlog=100, keepalive=KEEPALIVE_INTERVAL):
+    """Generator paczek nowych linii konsoli.
+
+    `get_buffer` zwraca aktualny ConsoleBuffer serwera (albo None, gdy serwer
+    nie działa). Każdy czytelnik trzyma tylko własny kursor, więc wielu widzów
+    obsługuje jeden producent bez kopiowania całego bufora. Zwraca słowniki
+    z kluczem 'event' albo None jako sygnał keepalive.
+    """
+    buffer = None
+    cursor = since
+    ended = False
+    last_activity = time.monotonic()
+
+    while True:
+        current = get_buffer()
+        if current is not buffer:
+            if current is not None:
+                if buffer is not None or (cursor is not None and not current.owns(cursor)):
+                    # Nowy proces serwera (albo kursor klienta z poprzedniego) - od początku jego outputu
+                    cursor = current.first_seq
+                    yield {'event': 'reset', 'next': cursor}
+                elif cursor is None:
+                    cursor = max(current.next_seq - backlog, current.first_seq)
+                ended = False
+            buffer = current
+
+        if buffer is None or (buffer.closed and ended):
+            # Serwer nie działa - czekaj na nowy bufor, podtrzymując połączenie
+            time.sleep(1)
+            if time.monotonic() - last_activity >= keepalive:
+                last_activity = time.monotonic()
+                yield None
+            continue
+
+        start, lines = buffer.read_since(cursor)
+        last_activity = time.monotonic()
+        if lines:
+            cursor = start + len(lines)
+            yield {'event': 'lines', 'seq': start, 'lines': lines, 'next': cursor}
+            continue
+
+        if buffer.closed:
+            ended = True
+            yield {'event': 'end', 'next': cursor}
+            continue
+
+        if not buffer.wait(cursor, timeout=keepalive):
+            yield None
+
+
+def stream_console_sse(open_source, since=None, backlog=100):
+    """Owiń paczki konsoli w format SSE.
+
+    `open_source()` zwraca parę (get_buffer, on_close) i jest wołane dopiero
+    przy pierwszym odczycie strumienia, więc zerwane zapytanie nie zostawia
+    zarejestrowanego widza.
+    """
+    get_buffer, on_close = open_source()
+    try:
+        yield 'retry: 3000\n\n'
+        for batch in iter_console_batches(get_buffer, since=since, backlog=backlog):
+            if batch is None:
+                yield ': keepalive\n\n'
+                continue
+            event = batch.pop('event')
+            yield format_sse(batch, event=event, event_id=batch.get('next'))
+    finally:
+        if on_close:
+            on_close()
+
+
+class AgentConsoleRelay:
+    """Jedno połączenie SSE z agentem na serwer, rozsyłane lokalnie do wszystkich widzów"""
+
+    def __init__(self, url, headers, capacity=1000, idle_timeout=30, key=None):
+        self.key = key
+        self.url = url
+        self.headers = headers
+        self.buffer = ConsoleBuffer(capacity)
+        self.idle_timeout = idle_timeout
+        self.subscribers = 0
+        self.idle_since = None
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive() and not self.stopped
+
+    def _should_stop(self):
+        if self.subscribers > 0:
+            self.idle_since = None
+            return False
+        if self.idle_since is None:
+            self.idle_since = time.monotonic()
+        return time.monotonic() - self.idle_since > self.idle_timeout
+
+    def _run(self):
+        cursor = None
+        while not self.stopped:
+            try:
+                params = {'since': cursor} if cursor is not None else {}
+                with requests.get(self.url, headers=self.headers, params=params,
+                                  stream=True, timeout=(10, KEEPALIVE_INTERVAL * 3)) as response:
+                    response.raise_for_status()
+                    for raw in response.iter_lines(decode_unicode=True):
+                        if self._should_stop():
+                            self.stopped = True
+                            break
+                        if not raw or not raw.startswith('data:'):
+                            continue
+                        payload = json.loads(raw[5:].strip())
+                        for line in payload.get('lines', []):
+                            self.buffer.append(line)
+                            if self.key is not None:
+                                event_bus.publish(self.key, 'console', line)
+                        cursor = payload.get('next', cursor)
+            except Exception as e:
+                print(f"Agent console relay error ({self.url}): {e}")
+                if self._should_stop():
+                    self.stopped = True
+                    break
+                time.sleep(3)
+        self.buffer.close()
+
+
+class ConsoleRelayRegistry:
+    """Rejestr przekaźników konsoli agentów (jeden przekaźnik na serwer)"""
+
+    def __init__(self):
+        self._relays = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, url, headers, capacity=1000):
+        with self._lock:
+            relay = self._relays.get(key)
+            if relay is None or not relay.is_alive():
+                relay = AgentConsoleRelay(url, headers, capacity, key=key)
+                self._relays[key] = relay
+                relay.start()
+            relay.subscribers += 1
+            relay.idle_since = None
+            return relay
+
+    def release(self, relay):
+        with self._lock:
+            relay.subscribers = max(0, relay.subscribers - 1)
+
+
+agent_console_relays = ConsoleRelayRegistry()
@@ -0,0 +1,128 @@
+import threading
+import time
+import psutil
+from .console_stream import KEEPALIVE_INTERVAL, format_sse
+from .event_bus import event_bus
+
+MONITOR_INTERVAL = 5
+
+_process_cache = {}
+
+
+def process_metrics(pid):
+    """CPU i pamięć procesu serwera; obiekty psutil są trzymane między próbkami,
+    więc cpu_percent() nie musi blokować na interwale pomiarowym."""
+    if not pid:
+        return None
+    try:
+        process = _process_cache.get(pid)
+        if process is None or not process.is_running():
+            process = psutil.Process(pid)
+            process.cpu_percent(None)
+            _process_cache[pid] = process
+        with process.oneshot():
+            memory = process.memory_info()
+            return {
+                'cpu_percent': round(process.cpu_percent(None), 1),
+                'memory_rss': memory.rss,
+                'memory_mb': round(memory.rss / 1024 / 1024, 1)
+            }
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        _process_cache.pop(pid, None)
+        return None
+
+
+class ServerStateMonitor:
+    """Jeden wątek próbkujący stan serwerów, na które ktoś jest zapisany.
+
+    `probe(server_ids)` zwraca {server_id: stan}; stan może zawierać klucz
+    'metrics'. Zmiana `is_running` publikowana jest jako zdarzenie 'status',
+    a każda próbka metryk jako 'metrics'. Nowy subskrybent od razu dostaje
+    ostatni znany stan swoich serwerów.
+    """
+
+    def __init__(self, bus, probe, interval=MONITOR_INTERVAL):
+        self.bus = bus
+        self.probe = probe
+        self.interval = interval
+        self._app = None
+        self._last = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        bus.on_subscribe(self._on_subscribe)
+
+    def start(self, app):
+        with self._lock:
+            self._app = app
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ServerStateMonitor', daemon=True)
+                self._thread.start()
+
+    def _on_subscribe(self, subscription):
+        for server_id in subscription.server_ids:
+            state = self._last.get(server_id)
+            if state is not None:
+                subscription.push({'event': 'status', 'server_id': server_id,
+                                   'time': time.time(), 'data': state})
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            server_ids = self.bus.subscribed_ids()
+            if not server_ids:
+                continue
+            try:
+                with self._app.app_context():
+                    states = self.probe(server_ids)
+            except Exception as e:
+                print(f"Error probing server states: {e}")
+                continue
+
+            for server_id, state in states.items():
+                metrics = state.pop('metrics', None)
+                previous = self._last.get(server_id)
+                self._last[server_id] = state
+                if previous is None or previous.get('is_running') != state.get('is_running'):
+                    self.bus.publish(server_id, 'status', state)
+                if metrics:
+                    self.bus.publish(server_id, 'metrics', metrics)
+
+
+def stream_dashboard_sse(open_subscription, keepalive=KEEPALIVE_INTERVAL):
+    """Strumień SSE z multipleksowanymi zdarzeniami wielu serwerów.
+
+    `open_subscription()` zwraca (subscription, on_close) i - jak w strumieniu
+    konsoli - wołane jest dopiero przy pierwszym odczycie. Linie konsoli
+    z jednej porcji są łączone w jedno zdarzenie na serwer.
+    """
+    subscription, on_close = open_subscription()
+    try:
+        yield 'retry: 3000\n\n'
+        yield format_sse({'servers': sorted(subscription.server_ids)}, event='subscribed')
+        dropped = 0
+        while not subscription.closed:
+            events = subscription.drain(timeout=keepalive)
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+
+            if subscription.dropped != dropped:
+                yield format_sse({'dropped': subscription.dropped - dropped}, event='overflow')
+                dropped = subscription.dropped
+
+            console = {}
+            for message in events:
+                if message['event'] == 'console':
+                    console.setdefault(message['server_id'], []).append(message['data'])
+                    continue
+                yield format_sse({'server_id': message['server_id'], 'time': message['time'],
+                                  **message['data']}, event=message['event'])
+            for server_id, lines in console.items():
+                yield format_sse({'server_id': server_id, 'lines': lines}, event='console')
+    finally:
+        event_bus.unsubscribe(subscription)
+        if on_close:
+            on_close()
@@ -0,0 +1,339 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import threading
+import time
+
+REVALIDATE_INTERVAL = 5
+FULL_RESCAN_INTERVAL = 3600
+
+# Podkatalogi serwera w podziale zajętości (świat wykrywany osobno z level-name)
+CATEGORY_DIRS = {
+    'plugins': ('plugins', 'mods', 'config'),
+    'logs': ('logs', 'crash-reports', 'debug'),
+    'backups': ('backups',),
+}
+
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_IGNORED = 0x8000
+_IN_Q_OVERFLOW = 0x4000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO |
+               _IN_CREATE | _IN_DELETE | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class Inotify:
+    """Cienka nakładka na inotify(7) przez ctypes (tylko Linux)"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    @staticmethod
+    def is_supported():
+        return hasattr(os, 'uname') and os.uname().sysname == 'Linux'
+
+    def add_watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        return wd
+
+    def rm_watch(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """Wszystkie oczekujące zdarzenia jako (wd, maska) - bez blokowania"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                events.append((wd, mask))
+                offset += _EVENT_HEADER.size + length
+
+
+class DirNode:
+    """Katalog w drzewie zajętości: suma plików bezpośrednio w nim i podkatalogi"""
+
+    __slots__ = ('path', 'parent', 'mtime_ns', 'files_size', 'files', 'children', 'total', 'wd')
+
+    def __init__(self, path, parent=None):
+        self.path = path
+        self.parent = parent
+        self.mtime_ns = 0
+        self.files_size = 0
+        self.files = 0
+        self.children = {}
+        self.total = 0
+        self.wd = None
+
+
+class _Root:
+    __slots__ = ('node', 'scanned_at', 'lock', 'dirty', 'watched', 'overflowed')
+
+    def __init__(self, node):
+        self.node = node
+        self.scanned_at = 0
+        self.lock = threading.Lock()
+        self.dirty = set()
+        self.watched = False
+        self.overflowed = False
+
+
+class DiskUsageAccountant:
+    """Zajętość katalogów serwerów liczona raz (os.scandir) i utrzymywana na bieżąco.
+
+    Pierwsze zapytanie o katalog buduje drzewo DirNode z sumami plików na
+    każdym poziomie. Potem wątek w tle co `interval` sekund przelicza tylko
+    zmienione katalogi - wskazane przez inotify, a bez niego te, których
+    mtime się zmienił - i przenosi różnicę w górę drzewa. Pliki
+    nadpisywane w miejscu (regiony, logi) nie zmieniają mtime katalogu,
+    więc bez inotify drzewo jest dodatkowo przeliczane w całości co
+    `full_rescan` sekund. Endpointy czytają wyłącznie sumy z pamięci.
+    """
+
+    def __init__(self, interval=REVALIDATE_INTERVAL, full_rescan=FULL_RESCAN_INTERVAL):
+        self.interval = interval
+        self.full_rescan = full_rescan
+        self._roots = {}
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._inotify = None
+        if Inotify.is_supported():
+            try:
+                self._inotify = Inotify()
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable, falling back to mtime revalidation: {e}")
+
+    @property
+    def mode(self):
+        return 'inotify' if self._inotify else 'mtime'
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='DiskUsageAccountant', daemon=True)
+                self._thread.start()
+
+    def usage(self, path):
+        """{'total', 'files_size', 'directories': {nazwa: bajty}, 'scanned_at'} katalogu albo None"""
+        path = os.path.realpath(path)
+        if not os.path.isdir(path):
+            self.forget(path)
+            return None
+        with self._lock:
+            root = self._roots.get(path)
+            if root is None:
+                root = self._roots[path] = _Root(DirNode(path))
+        with root.lock:
+            if not root.scanned_at:
+                self._scan(root, root.node)
+                root.scanned_at = time.time()
+            self.start()
+            node = root.node
+            return {
+                'total': node.total,
+                'files_size': node.files_size,
+                'directories': {name: child.total for name, child in node.children.items()},
+                'scanned_at': root.scanned_at
+            }
+
+    def forget(self, path):
+        path = os.path.realpath(path)
+        with self._lock:
+            root = self._roots.pop(path, None)
+        if root is not None:
+            with root.lock:
+                self._unwatch(root.node)
+
+    def invalidate(self, path):
+        """Wymuś pełne przeliczenie przy następnym odczycie (np. po przywróceniu kopii)"""
+        with self._lock:
+            root = self._roots.get(os.path.realpath(path))
+        if root is not None:
+            with root.lock:
+                self._unwatch(root.node)
+                root.node = DirNode(root.node.path)
+                root.scanned_at = 0
+
+    def _scan(self, root, node):
+        """Pełne przeliczenie poddrzewa `node`; zwraca nową sumę"""
+        self._watch(root, node)
+        self._scan_entries(root, node, full=True)
+        node.total = node.files_size + sum(child.total for child in node.children.values())
+        return node.total
+
+    def _scan_entries(self, root, node, full):
+        """Jedno scandir katalogu: suma plików i lista podkatalogów.
+
+        Przy `full=False` istniejące podkatalogi zostają, nowe są skanowane,
+        zniknięte usuwane.
+        """
+        files_size = 0
+        files = 0
+        names = set()
+        try:
+            node.mtime_ns = os.stat(node.path, follow_symlinks=False).st_mtime_ns
+            with os.scandir(node.path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            names.add(entry.name)
+                        else:
+                            files_size += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            node.mtime_ns = 0
+        node.files_size = files_size
+        node.files = files
+
+        for name in list(node.children):
+            if name not in names:
+                self._unwatch(node.children.pop(name))
+        for name in names:
+            child = node.children.get(name)
+            if full or child is None:
+                child = node.children[name] = DirNode(os.path.join(node.path, name), node)
+                self._scan(root, child)
+
+    def _refresh(self, root, node):
+        """Przelicz jeden katalog i przenieś różnicę sumy do przodków"""
+        before = node.total
+        self._scan_entries(root, node, full=False)
+        node.total = node.files_size + sum(child.total for child in node.children.values())
+        delta = node.total - before
+        parent = node.parent
+        while parent is not None and delta:
+            parent.total += delta
+            parent = parent.parent
+
+    def _watch(self, root, node):
+        if self._inotify is None:
+            return
+        try:
+            node.wd = self._inotify.add_watch(node.path)
+            self._watches[node.wd] = (root, node)
+        except OSError as e:
+            # Limit fs.inotify.max_user_watches - ten korzeń przechodzi na mtime
+            if root.watched is not False:
+                print(f"inotify watch failed ({e}), revalidating {root.node.path} by mtime")
+            root.watched = False
+            return
+        if node is root.node:
+            root.watched = True
+
+    def _unwatch(self, node):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.wd is not None and self._inotify is not None:
+                self._watches.pop(current.wd, None)
+                self._inotify.rm_watch(current.wd)
+                current.wd = None
+            stack.extend(current.children.values())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.revalidate()
+            except Exception as e:
+                print(f"Error revalidating disk usage: {e}")
+
+    def revalidate(self):
+        if self._inotify is not None:
+            for wd, mask in self._inotify.read_events():
+                if mask & _IN_Q_OVERFLOW:
+                    for root in list(self._roots.values()):
+                        root.overflowed = True
+                    continue
+                if mask & _IN_IGNORED:
+                    continue
+                watched = self._watches.get(wd)
+                if watched is not None:
+                    watched[0].dirty.add(watched[1])
+
+        now = time.time()
+        for root in list(self._roots.values()):
+            with root.lock:
+                if not root.scanned_at:
+                    continue
+                if now - root.scanned_at >= self.full_rescan and (not root.watched or root.overflowed):
+                    self._unwatch(root.node)
+                    root.node = DirNode(root.node.path)
+                    self._scan(root, root.node)
+                    root.scanned_at = now
+                    root.dirty.clear()
+                    root.overflowed = False
+                    continue
+                if root.watched and not root.overflowed:
+                    dirty, root.dirty = root.dirty, set()
+                else:
+                    dirty = self._changed_dirs(root.node)
+                # Najpierw najgłębsze - przodkowie dostają już poprawione sumy dzieci
+                for node in sorted(dirty, key=lambda n: n.path.count(os.sep), reverse=True):
+                    if self._attached(root, node):
+                        self._refresh(root, node)
+
+    @staticmethod
+    def _attached(root, node):
+        while node.parent is not None:
+            if node.parent.children.get(os.path.basename(node.path)) is not node:
+                return False
+            node = node.parent
+        return node is root.node
+
+    @staticmethod
+    def _changed_dirs(node):
+        """Katalogi, których mtime się zmienił (dodanie/usunięcie/zmiana nazwy wpisu)"""
+        changed = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            try:
+                mtime_ns = os.stat(current.path, follow_symlinks=False).st_mtime_ns
+            except OSError:
+                mtime_ns = 0
+            if mtime_ns != current.mtime_ns:
+                changed.append(current)
+            stack.extend(current.children.values())
+        return changed
+
+
+def usage_breakdown(usage, level_name='world'):
+    """Podział zajętości katalogu serwera na world/plugins/logs/backups/other"""
+    breakdown = {'world': 0, 'plugins': 0, 'logs': 0, 'backups': 0, 'other': usage['files_size']}
+    for name, size in usage['directories'].items():
+        if name in ('worlds', level_name) or name.startswith(level_name + '_'):
+            breakdown['world'] += size
+            continue
+        for category, names in CATEGORY_DIRS.items():
+            if name in names:
+                breakdown[category] += size
+                break
+        else:
+            breakdown['other'] += size
+    return breakdown
@@ -0,0 +1,204 @@
+import itertools
+import os
+import shutil
+import threading
+import time
+import uuid
+from .downloader import ChecksumMismatch, DownloadCancelled, Downloader
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BACKGROUND = 10
+MAX_CONCURRENT = 3
+WAIT_INTERVAL = 0.5
+
+
+class TokenBucket:
+    """Limit przepustowości w bajtach/s wspólny dla wszystkich połączeń.
+
+    `consume(n)` zabiera n żetonów i - gdy ich brakuje - śpi tyle, ile
+    potrzeba na ich dolanie. Saldo może zejść poniżej zera (dług), więc
+    kolejni pobierający czekają w kolejności, a średnie tempo nie
+    przekracza `rate` niezależnie od liczby połączeń. `burst` to ile bajtów
+    może przejść od razu po chwili bezczynności.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _Job:
+    __slots__ = ('url', 'path', 'checksums', 'priority', 'seq', 'followers', 'progress', 'done',
+                 'result', 'error', 'started', 'queued_at', 'downloaded', 'total')
+
+    def __init__(self, url, path, checksums, priority, seq):
+        self.url = url
+        self.path = path
+        self.checksums = checksums
+        self.priority = priority
+        self.seq = seq
+        self.followers = []
+        self.progress = []
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.started = None
+        self.queued_at = time.time()
+        self.downloaded = 0
+        self.total = None
+
+
+class DownloadScheduler:
+    """Wspólna kolejka pobierań panelu (serwery, addony Bedrock, modpacki).
+
+    Ten sam interfejs co Downloader.download, plus `priority`. Naraz
+    pobiera się najwyżej `max_concurrent` plików; reszta czeka, a wolny
+    slot dostaje zadanie o najniższej wartości priorytetu (start serwera
+    przed paczkami modów), w ramach priorytetu - najstarsze. Wszystkie
+    połączenia dzielą jeden TokenBucket (`bandwidth` B/s, 0 = bez limitu),
+    więc masowa instalacja nie zapycha łącza działającym serwerom.
+    Identyczny URL pobierany już przez kogoś innego nie jest pobierany
+    drugi raz: dołączający czeka na wynik, dostaje postęp na bieżąco,
+    a plik - kopię pod swoją ścieżką. Dołączenie z wyższym priorytetem
+    podnosi priorytet czekającego zadania.
+    """
+
+    def __init__(self, downloader=None, max_concurrent=MAX_CONCURRENT, bandwidth=0):
+        self.downloader = downloader or Downloader()
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.bucket = TokenBucket(bandwidth) if bandwidth else None
+        self.downloader.throttle = self.bucket.consume if self.bucket else None
+        self._seq = itertools.count()
+        self._waiting = []
+        self._active = []
+        self._in_flight = {}
+        self._cond = threading.Condition()
+
+    def download(self, url, path, progress=None, cancel=None, checksums=None, priority=PRIORITY_NORMAL):
+        """Pobierz `url` do `path` przez kolejkę; wynik i wyjątki jak w Downloader.download"""
+        while True:
+            with self._cond:
+                leader = self._in_flight.get(url)
+                if leader is None or leader.checksums != (checksums or {}):
+                    job = _Job(url, path, checksums or {}, priority, next(self._seq))
+                    if progress:
+                        job.progress.append(progress)
+                    self._in_flight.setdefault(url, job)
+                    self._waiting.append(job)
+                    break
+                leader.followers.append(path)
+                if progress:
+                    leader.progress.append(progress)
+                if leader in self._waiting and priority < leader.priority:
+                    leader.priority = priority
+                    self._cond.notify_all()
+            if self._follow(leader, path, progress, cancel):
+                return leader.result
+            # Prowadzący przerwał pobieranie - spróbuj od nowa, samodzielnie albo za kolejnym
+
+        try:
+            self._acquire(job, cancel)
+            job.result = self.downloader.download(url, path, progress=self._fan_out(job), cancel=cancel,
+                                                  checksums=checksums)
+            return job.result
+        except BaseException as e:
+            job.error = e
+            raise
+        finally:
+            with self._cond:
+                if self._in_flight.get(url) is job:
+                    del self._in_flight[url]
+                if job in self._waiting:
+                    self._waiting.remove(job)
+                if job in self._active:
+                    self._active.remove(job)
+                self._cond.notify_all()
+            if job.error is None:
+                self._serve_followers(job)
+            job.done.set()
+
+    def _follow(self, job, path, progress, cancel):
+        """Czekaj na cudze pobieranie tego samego URL; False, gdy trzeba pobrać samemu"""
+        while not job.done.wait(WAIT_INTERVAL):
+            if cancel is not None and cancel.is_set():
+                with self._cond:
+                    if path in job.followers:
+                        job.followers.remove(path)
+                    if progress in job.progress:
+                        job.progress.remove(progress)
+                raise DownloadCancelled('Download cancelled')
+        if job.error is None:
+            if not os.path.exists(path):
+                return False
+            if progress:
+                progress(job.result['size'], job.result['size'])
+            return True
+        if isinstance(job.error, (DownloadCancelled, ChecksumMismatch)):
+            return False
+        raise job.error
+
+    def _serve_followers(self, job):
+        """Kopie pobranego pliku dla dołączonych - zanim wywołujący prowadzącego go przeniesie"""
+        with self._cond:
+            followers = [path for path in job.followers if path != job.path]
+            job.followers = []
+        for path in followers:
+            temp_path = f"{path}.{uuid.uuid4().hex}.part"
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                shutil.copyfile(job.path, temp_path)
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"Could not share download of {job.url} with {path}: {e}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def _fan_out(self, job):
+        def report(downloaded, total):
+            job.downloaded = downloaded
+            job.total = total
+            for callback in list(job.progress):
+                callback(downloaded, total)
+        return report
+
+    def _acquire(self, job, cancel):
+        with self._cond:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise DownloadCancelled('Download cancelled')
+                if len(self._active) < self.max_concurrent and job is min(
+                        self._waiting, key=lambda waiting: (waiting.priority, waiting.seq)):
+                    self._waiting.remove(job)
+                    self._active.append(job)
+                    job.started = time.time()
+                    return
+                self._cond.wait(WAIT_INTERVAL)
+
+    def snapshot(self):
+        """Pobierania w toku i oczekujące (do podglądu kolejki)"""
+        def describe(job):
+            return {'url': job.url, 'priority': job.priority, 'queued_at': job.queued_at,
+                    'started_at': job.started, 'downloaded': job.downloaded, 'total': job.total,
+                    'waiters': len(job.followers)}
+        with self._cond:
+            waiting = sorted(self._waiting, key=lambda job: (job.priority, job.seq))
+            return {
+                'max_concurrent': self.max_concurrent,
+                'bandwidth': int(self.bucket.rate) if self.bucket else 0,
+                'active': [describe(job) for job in self._active],
+                'queued': [describe(job) for job in waiting]
+            }
@@ -0,0 +1,333 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 256 * 1024
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 60.0
+RETRIES = 5
+SEGMENTS = 4
+SEGMENT_MIN_SIZE = 32 * 1024 * 1024
+POOL_SIZE = 16
+PROGRESS_INTERVAL = 0.25
+HASH_CHUNK = 1024 * 1024
+STATE_INTERVAL = 1.0
+USER_AGENT = 'MCPanel/1.0 (+https://github.com/gekomod/mcpanel)'
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadCancelled(DownloadError):
+    pass
+
+
+class ChecksumMismatch(DownloadError):
+    pass
+
+
+class _Incomplete(Exception):
+    pass
+
+
+def _retryable(error):
+    """Zerwane połączenie, limit czasu, 429 i 5xx - warto ponowić; 4xx nie"""
+    if isinstance(error, requests.HTTPError):
+        status = getattr(error.response, 'status_code', 0)
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                              requests.exceptions.ChunkedEncodingError, _Incomplete))
+
+
+class _Segment:
+    """Zakres bajtów [start, end] (end None = do końca strumienia) i pozycja, do której jest zapisany"""
+
+    __slots__ = ('start', 'end', 'pos')
+
+    def __init__(self, start, end, pos=None):
+        self.start = start
+        self.end = end
+        self.pos = start if pos is None else pos
+
+    @property
+    def complete(self):
+        return self.end is not None and self.pos > self.end
+
+
+class _Transfer:
+    def __init__(self, url, part_path, meta, segments, progress, cancel, algorithms=()):
+        self.url = url
+        self.part_path = part_path
+        self.meta = meta
+        self.segments = segments
+        self.progress = progress
+        self.cancel = cancel
+        self.algorithms = algorithms
+        self.hashers = {name: hashlib.new(name) for name in algorithms} if algorithms else None
+        self.failed = threading.Event()
+        self.error = None
+        self.lock = threading.Lock()
+        self._last_progress = 0
+        self._last_state = time.monotonic()
+
+    @property
+    def total(self):
+        return self.meta.get('size')
+
+    @property
+    def done(self):
+        return sum(segment.pos - segment.start for segment in self.segments)
+
+    def reset_hashes(self):
+        if self.hashers is not None:
+            self.hashers = {name: hashlib.new(name) for name in self.algorithms}
+
+    def hash_prefix(self, fd, length):
+        """Wznowienie: dopisz do skrótów bajty pobrane przed przerwą (jedyny odczyt pliku)"""
+        offset = 0
+        while offset < length:
+            data = os.pread(fd, min(HASH_CHUNK, length - offset), offset)
+            if not data:
+                break
+            for hasher in self.hashers.values():
+                hasher.update(data)
+            offset += len(data)
+
+    def check(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise DownloadCancelled('Download cancelled')
+        if self.failed.is_set():
+            raise DownloadError('Another segment failed')
+
+    def advanced(self):
+        now = time.monotonic()
+        if self.progress and now - self._last_progress >= PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.progress(self.done, self.total)
+        if now - self._last_state >= STATE_INTERVAL:
+            self._last_state = now
+            self.save_state()
+
+    def save_state(self):
+        """Stan segmentów obok pliku .part - wznowienie po restarcie panelu"""
+        state = dict(self.meta, url=self.url,
+                     segments=[[segment.start, segment.end, segment.pos] for segment in self.segments])
+        try:
+            with open(self.part_path + '.json', 'w') as f:
+                json.dump(state, f)
+        except OSError:
+            pass
+
+
+class Downloader:
+    """Pobieranie HTTP bez zewnętrznych narzędzi: wznawianie, segmenty, dokładny postęp.
+
+    Plik powstaje jako `<ścieżka>.part` (obok stan segmentów w `.part.json`)
+    i dopiero po pobraniu całości jest przenoszony na miejsce. Przerwane
+    połączenie jest wznawiane nagłówkiem Range od ostatniego zapisanego
+    bajtu (do `retries` prób z rosnącym odstępem), także po restarcie, jeśli
+    serwer zwraca ten sam rozmiar i ETag. Duże pliki (>= `segment_min_size`)
+    z serwerów obsługujących Range są pobierane `segments` połączeniami
+    naraz, każde pisze swój zakres przez os.pwrite. Połączenia pochodzą
+    z jednej puli requests.Session.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, retries=RETRIES,
+                 segments=SEGMENTS, segment_min_size=SEGMENT_MIN_SIZE, pool_size=POOL_SIZE):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.segments = max(1, int(segments))
+        self.segment_min_size = segment_min_size
+        # Wywoływane z liczbą bajtów po każdym kawałku (limit przepustowości DownloadScheduler)
+        self.throttle = None
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def _retry(self, attempt, error, url):
+        if attempt > self.retries:
+            raise DownloadError(f"Download of {url} failed after {self.retries} retries: {error}")
+        time.sleep(min(30.0, 0.5 * 2 ** attempt))
+
+    def probe(self, url):
+        """{'size', 'ranges', 'etag', 'last_modified'} - GET bytes=0-0, bo HEAD bywa źle obsługiwany"""
+        attempt = 0
+        while True:
+            try:
+                with self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True,
+                                      timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    meta = {'etag': response.headers.get('ETag'),
+                            'last_modified': response.headers.get('Last-Modified')}
+                    if response.status_code == 206:
+                        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+                        meta.update(size=int(total) if total.isdigit() else None, ranges=True)
+                    else:
+                        length = response.headers.get('Content-Length', '')
+                        meta.update(size=int(length) if length.isdigit() else None, ranges=False)
+                    return meta
+            except requests.RequestException as e:
+                if not _retryable(e):
+                    raise DownloadError(f"Download of {url} failed: {e}")
+                attempt += 1
+                self._retry(attempt, e, url)
+
+    def _plan(self, url, part_path, meta, segmented=True):
+        """Segmenty do pobrania - z zapisanego stanu, jeśli plik .part pasuje do tego samego zasobu"""
+        state = None
+        try:
+            with open(part_path + '.json', 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if (state and meta['ranges'] and os.path.exists(part_path) and state.get('url') == url
+                and state.get('size') == meta['size'] and state.get('etag') == meta['etag']
+                and (segmented or len(state['segments']) == 1)):
+            return [_Segment(*segment) for segment in state['segments']]
+
+        size = meta['size']
+        if not meta['ranges'] or not size:
+            return [_Segment(0, size - 1 if size else None)]
+        count = self.segments if segmented and size >= self.segment_min_size else 1
+        step = -(-size // count)
+        return [_Segment(start, min(size, start + step) - 1) for start in range(0, size, step)]
+
+    def download(self, url, path, progress=None, cancel=None, checksums=None):
+        """Pobierz `url` do `path`; progress(pobrane, całość|None).
+
+        `checksums` ({'sha1' | 'sha256' | 'sha512': hex}) są liczone w trakcie
+        odbierania strumienia - taki plik idzie jednym połączeniem, bo segmenty
+        przychodzą poza kolejnością. Niezgodność usuwa plik .part zanim
+        cokolwiek trafi pod `path`. Zwraca {'size', 'digests'}; przy pobieraniu
+        jednym strumieniem `digests` zawiera zawsze też sha256.
+        """
+        checksums = {name.lower(): value.lower() for name, value in (checksums or {}).items() if value}
+        unknown = set(checksums) - hashlib.algorithms_available
+        if unknown:
+            raise DownloadError(f"Unsupported checksum algorithm: {', '.join(sorted(unknown))}")
+        part_path = path + '.part'
+        meta = self.probe(url)
+        segments = self._plan(url, part_path, meta, segmented=not checksums)
+        algorithms = tuple(sorted(set(checksums) | {'sha256'})) if len(segments) == 1 else ()
+        transfer = _Transfer(url, part_path, meta, segments, progress, cancel, algorithms)
+
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if meta['size'] and os.fstat(fd).st_size > meta['size']:
+                os.ftruncate(fd, meta['size'])
+            if transfer.hashers is not None and segments[0].pos:
+                transfer.hash_prefix(fd, segments[0].pos)
+            pending = [segment for segment in segments if not segment.complete]
+            if len(pending) == 1:
+                self._fetch_segment(transfer, fd, pending[0])
+            elif pending:
+                threads = [threading.Thread(target=self._run_segment, args=(transfer, fd, segment),
+                                            name='DownloadSegment', daemon=True) for segment in pending]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                if transfer.error is not None:
+                    raise transfer.error
+            if meta['size'] is None:
+                meta['size'] = transfer.done
+                os.ftruncate(fd, transfer.done)
+            elif transfer.done != meta['size']:
+                raise DownloadError(f"Download of {url} is incomplete: {transfer.done}/{meta['size']} bytes")
+            digests = {name: hasher.hexdigest() for name, hasher in (transfer.hashers or {}).items()}
+            for name, expected in checksums.items():
+                if digests[name] != expected:
+                    self._discard(part_path)
+                    raise ChecksumMismatch(f"{name} mismatch for {url}: expected {expected}, got {digests[name]}")
+            os.fsync(fd)
+        except ChecksumMismatch:
+            raise
+        except BaseException:
+            transfer.save_state()
+            raise
+        finally:
+            os.close(fd)
+
+        os.replace(part_path, path)
+        self._discard(part_path)
+        if progress:
+            progress(transfer.done, transfer.total)
+        return {'size': transfer.done, 'digests': digests}
+
+    @staticmethod
+    def _discard(part_path):
+        for leftover in (part_path, part_path + '.json'):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+
+    def _run_segment(self, transfer, fd, segment):
+        try:
+            self._fetch_segment(transfer, fd, segment)
+        except BaseException as e:
+            with transfer.lock:
+                if transfer.error is None:
+                    transfer.error = e
+            transfer.failed.set()
+
+    def _fetch_segment(self, transfer, fd, segment):
+        attempt = 0
+        # Najdalsza osiągnięta pozycja - serwer bez Range zaczyna od zera przy każdej próbie,
+        # więc postępem są dopiero bajty za nią, nie ponownie pobrany początek
+        reached = segment.pos
+        while not segment.complete:
+            transfer.check()
+            headers = {}
+            if transfer.meta['ranges'] and (segment.pos > 0 or segment.end is not None):
+                headers['Range'] = f"bytes={segment.pos}-{'' if segment.end is None else segment.end}"
+            elif segment.pos:
+                # Serwer bez Range - od początku
+                segment.pos = segment.start
+                transfer.reset_hashes()
+            try:
+                with self.session.get(transfer.url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    if headers and response.status_code != 206:
+                        if len(transfer.segments) > 1:
+                            raise DownloadError(f"Server ignored Range request for {transfer.url}")
+                        segment.pos = 0
+                        transfer.reset_hashes()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        transfer.check()
+                        if segment.end is not None:
+                            chunk = chunk[:segment.end + 1 - segment.pos]
+                        os.pwrite(fd, chunk, segment.pos)
+                        if transfer.hashers is not None:
+                            for hasher in transfer.hashers.values():
+                                hasher.update(chunk)
+                        segment.pos += len(chunk)
+                        transfer.advanced()
+                        if self.throttle is not None:
+                            self.throttle(len(chunk))
+                        if segment.complete:
+                            break
+                if segment.end is None:
+                    return
+                if not segment.complete:
+                    raise _Incomplete(f"connection closed at byte {segment.pos}")
+            except (requests.RequestException, _Incomplete) as e:
+                if not _retryable(e):
+                    raise DownloadError(f"Download of {transfer.url} failed: {e}")
+                # Licznik prób liczy się od ostatniego postępu, nie od początku pobierania
+                attempt = 1 if segment.pos > reached else attempt + 1
+                reached = max(reached, segment.pos)
+                transfer.save_state()
+                self._retry(attempt, e, transfer.url)
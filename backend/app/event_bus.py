@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import deque
+
+
+class Subscription:
+    """Kolejka zdarzeń jednego klienta zasubskrybowanego na zbiór serwerów"""
+
+    def __init__(self, server_ids, console_ids=(), maxlen=2000):
+        self.server_ids = frozenset(server_ids)
+        self.console_ids = frozenset(console_ids) & self.server_ids
+        self._events = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, event):
+        with self._cond:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            self._cond.notify()
+
+    def drain(self, timeout=None):
+        """Zwróć wszystkie oczekujące zdarzenia (czekając na pierwsze do `timeout` s)"""
+        with self._cond:
+            if not self._events and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+
+class EventBus:
+    """Szyna zdarzeń serwerów (linie konsoli, zmiany statusu, próbki metryk).
+
+    Publikacja do serwera bez subskrybentów kosztuje jedno sprawdzenie słownika,
+    więc producenci (przechwytywanie outputu, monitor) mogą publikować zawsze.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def subscribe(self, server_ids, console_ids=()):
+        """Zapisz klienta na zdarzenia serwerów; konsola tylko dla `console_ids`"""
+        subscription = Subscription(server_ids, console_ids)
+        with self._lock:
+            for server_id in subscription.server_ids:
+                self._subscribers.setdefault(server_id, set()).add(subscription)
+        for listener in list(self._listeners):
+            listener(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for server_id in subscription.server_ids:
+                subscribers = self._subscribers.get(server_id)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[server_id]
+        with subscription._cond:
+            subscription.closed = True
+            subscription._cond.notify_all()
+
+    def on_subscribe(self, listener):
+        """Zarejestruj callback wołany przy każdej nowej subskrypcji"""
+        self._listeners.append(listener)
+
+    def has_subscribers(self, server_id):
+        return server_id in self._subscribers
+
+    def subscribed_ids(self):
+        with self._lock:
+            return set(self._subscribers)
+
+    def publish(self, server_id, event, data):
+        subscribers = self._subscribers.get(server_id)
+        if not subscribers:
+            return
+        message = {'event': event, 'server_id': server_id, 'time': time.time(), 'data': data}
+        with self._lock:
+            subscribers = list(self._subscribers.get(server_id, ()))
+        for subscription in subscribers:
+            if event == 'console' and server_id not in subscription.console_ids:
+                continue
+            subscription.push(message)
+
+
+event_bus = EventBus()
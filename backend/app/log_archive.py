@@ -0,0 +1,255 @@
+import glob
+import gzip
+import json
+import os
+import threading
+import zlib
+from datetime import datetime
+
+ARCHIVE_DIR_NAME = 'panel'
+CONSOLE_LOG_NAME = 'console.log'
+INDEX_FILE_NAME = 'index.json'
+PENDING_PREFIX = 'rotating-'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+ARCHIVE_BLOCK_BYTES = 256 * 1024
+
+
+def parse_line_timestamp(line):
+    """Znacznik czasu '[YYYY-mm-dd HH:MM:SS]' z początku linii jako epoch (albo None)"""
+    if isinstance(line, bytes):
+        line = line[:21].decode('ascii', errors='ignore')
+    if len(line) < 21 or line[0] != '[' or line[20] != ']':
+        return None
+    try:
+        return datetime.strptime(line[1:20], TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+def console_log_path(server_path):
+    """Log konsoli zapisywany przez panel - logs/panel/console.log.
+
+    latest.log należy do log4j serwera, który przy starcie i o północy
+    przenosi go i kompresuje; panel pisze do własnego pliku obok archiwum.
+    """
+    return os.path.join(server_path, 'logs', ARCHIVE_DIR_NAME, CONSOLE_LOG_NAME)
+
+
+def _in_window(ts, start, end):
+    return (start is None or ts >= start) and (end is None or ts <= end)
+
+
+class LogArchive:
+    """Skompresowane segmenty logu panelu jednego serwera (logs/panel/).
+
+    Każdy segment to plik gzip złożony z wielu niezależnych członów (bloków
+    ~256 KiB tekstu), więc nadal otwiera go zwykłe `zcat`. Plik index.json
+    przechowuje dla każdego bloku zakres czasu i offset w pliku - odczyt
+    okna czasowego rozpakowuje tylko bloki, które na nie zachodzą.
+    """
+
+    def __init__(self, log_dir, keep_segments=30, block_bytes=ARCHIVE_BLOCK_BYTES):
+        self.log_dir = log_dir
+        self.archive_dir = os.path.join(log_dir, ARCHIVE_DIR_NAME)
+        self.index_path = os.path.join(self.archive_dir, INDEX_FILE_NAME)
+        self.keep_segments = keep_segments
+        self.block_bytes = block_bytes
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_log(cls, log_file, **kwargs):
+        """Archiwum logu konsoli panelu (plik leży w katalogu archiwum)"""
+        return cls(os.path.dirname(os.path.dirname(log_file)), **kwargs)
+
+    def pending_path(self, stamp):
+        """Ścieżka, pod którą LogSink odkłada plik przed kompresją"""
+        return os.path.join(self.archive_dir, f'{PENDING_PREFIX}{stamp}.log')
+
+    def pending_segments(self):
+        """Pliki odłożone do kompresji (np. po przerwanym działaniu panelu)"""
+        return sorted(glob.glob(os.path.join(self.archive_dir, f'{PENDING_PREFIX}*.log')))
+
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'segments': []}
+
+    def _save_index(self, index):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _segment_name(self, start):
+        day = datetime.fromtimestamp(start).strftime('%Y-%m-%d') if start else \
+            datetime.now().strftime('%Y-%m-%d')
+        n = 1
+        while os.path.exists(os.path.join(self.archive_dir, f'{day}-{n}.log.gz')):
+            n += 1
+        return f'{day}-{n}.log.gz'
+
+    def compress_segment(self, raw_path):
+        """Skompresuj odłożony plik logu do segmentu gzip i dopisz go do indeksu"""
+        if not os.path.exists(raw_path):
+            return None
+
+        blocks = []
+        block = []
+        block_size = 0
+        block_start = block_end = None
+        last_ts = None
+        raw_bytes = 0
+
+        tmp_path = raw_path + '.gz.tmp'
+        with open(raw_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            def write_block():
+                offset = dst.tell()
+                dst.write(gzip.compress(b''.join(block)))
+                blocks.append([block_start, block_end, offset, dst.tell() - offset])
+
+            for line in src:
+                ts = parse_line_timestamp(line)
+                if ts is not None:
+                    last_ts = ts
+                if block_start is None:
+                    block_start = last_ts
+                block_end = last_ts
+                block.append(line)
+                block_size += len(line)
+                raw_bytes += len(line)
+                if block_size >= self.block_bytes:
+                    write_block()
+                    block, block_size, block_start = [], 0, None
+            if block:
+                write_block()
+
+        if not blocks:
+            os.remove(tmp_path)
+            os.remove(raw_path)
+            return None
+
+        with self._lock:
+            start = next((b[0] for b in blocks if b[0] is not None), None)
+            name = self._segment_name(start)
+            os.replace(tmp_path, os.path.join(self.archive_dir, name))
+            os.remove(raw_path)
+
+            index = self.load_index()
+            index['segments'].append({
+                'file': name,
+                'start': start,
+                'end': blocks[-1][1],
+                'bytes': raw_bytes,
+                'blocks': blocks
+            })
+            self._prune(index)
+            self._save_index(index)
+        return name
+
+    def _prune(self, index):
+        segments = index['segments']
+        if self.keep_segments and len(segments) > self.keep_segments:
+            for segment in segments[:-self.keep_segments]:
+                try:
+                    os.remove(os.path.join(self.archive_dir, segment['file']))
+                except OSError:
+                    pass
+            index['segments'] = segments[-self.keep_segments:]
+
+    def read_window(self, start=None, end=None, limit=None):
+        """Linie z segmentów archiwum z zakresu [start, end] (epoch; None = bez granicy)"""
+        result = []
+        for segment in self.load_index()['segments']:
+            if not self._overlaps(segment['start'], segment['end'], start, end):
+                continue
+            path = os.path.join(self.archive_dir, segment['file'])
+            try:
+                f = open(path, 'rb')
+            except OSError:
+                continue
+            with f:
+                for block_start, block_end, offset, length in segment['blocks']:
+                    if not self._overlaps(block_start, block_end, start, end):
+                        continue
+                    f.seek(offset)
+                    data = zlib.decompress(f.read(length), 16 + zlib.MAX_WBITS)
+                    last_ts = block_start
+                    for line in data.decode('utf-8', errors='ignore').splitlines(keepends=True):
+                        ts = parse_line_timestamp(line)
+                        if ts is not None:
+                            last_ts = ts
+                        if last_ts is not None and _in_window(last_ts, start, end):
+                            result.append(line)
+                            if limit is not None and len(result) >= limit:
+                                return result
+        return result
+
+    @staticmethod
+    def _overlaps(range_start, range_end, start, end):
+        if range_start is None or range_end is None:
+            return True
+        return (end is None or range_start <= end) and (start is None or range_end >= start)
+
+
+def _seek_time(f, size, start):
+    """Offset początku linii, od której warto zacząć szukać czasu `start` (bisekcja)"""
+    lo, hi = 0, size
+    while hi - lo > 4096:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()
+        ts = None
+        while ts is None and f.tell() < hi:
+            line = f.readline()
+            if not line:
+                break
+            ts = parse_line_timestamp(line)
+        if ts is not None and ts < start:
+            lo = mid
+        else:
+            hi = mid
+    f.seek(lo)
+    if lo > 0:
+        f.readline()
+    return f.tell()
+
+
+def read_live_window(path, start=None, end=None, limit=None):
+    """Linie z bieżącego (nieskompresowanego) pliku logu z zakresu [start, end]"""
+    result = []
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if start is not None:
+            _seek_time(f, size, start)
+        last_ts = None
+        for line in f:
+            ts = parse_line_timestamp(line)
+            if ts is not None:
+                last_ts = ts
+            if last_ts is None:
+                continue
+            if end is not None and last_ts > end:
+                break
+            if _in_window(last_ts, start, end):
+                result.append(line.decode('utf-8', errors='ignore'))
+                if limit is not None and len(result) >= limit:
+                    break
+    return result
+
+
+def read_log_window(log_file, start=None, end=None, limit=1000):
+    """Odczytaj okno czasowe logu panelu: najpierw archiwum, potem bieżący plik.
+
+    Zwraca {'lines', 'truncated'}; `truncated` oznacza, że osiągnięto `limit`.
+    """
+    archive = LogArchive.for_log(log_file)
+    lines = archive.read_window(start, end, limit)
+    if (limit is None or len(lines) < limit) and os.path.exists(log_file):
+        remaining = None if limit is None else limit - len(lines)
+        lines.extend(read_live_window(log_file, start, end, remaining))
+    return {
+        'lines': lines,
+        'truncated': limit is not None and len(lines) >= limit
+    }
@@ -0,0 +1,253 @@
+import gzip
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from .log_archive import LogArchive, parse_line_timestamp
+
+SEARCH_DB_NAME = 'search.db'
+MIN_FTS_QUERY = 3
+PRUNE_INTERVAL = 3600
+
+
+def _detect_trigram():
+    try:
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')")
+        conn.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+# Tokenizer trigram (SQLite >= 3.34) pozwala szukać dowolnych podciągów przez FTS5
+HAS_TRIGRAM = _detect_trigram()
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS lines (id INTEGER PRIMARY KEY, ts REAL NOT NULL, line TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS lines_ts ON lines (ts)',
+]
+_FTS_SCHEMA = [
+    # detail=none: indeks o połowę mniejszy, a wyszukiwanie LIKE nadal idzie przez trigramy
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5("
+    "line, content='lines', content_rowid='id', tokenize='trigram', detail=none)",
+    'CREATE TRIGGER IF NOT EXISTS lines_ai AFTER INSERT ON lines BEGIN '
+    'INSERT INTO lines_fts (rowid, line) VALUES (new.id, new.line); END',
+    'CREATE TRIGGER IF NOT EXISTS lines_ad AFTER DELETE ON lines BEGIN '
+    "INSERT INTO lines_fts (lines_fts, rowid, line) VALUES ('delete', old.id, old.line); END",
+]
+
+
+def search_db_path(log_file):
+    return os.path.join(os.path.dirname(log_file), SEARCH_DB_NAME)
+
+
+def _rows(lines, last_ts=None):
+    """Pary (ts, linia); linie bez znacznika czasu dziedziczą czas poprzedniej"""
+    rows = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        ts = parse_line_timestamp(line)
+        if ts is not None:
+            last_ts = ts
+        rows.append((last_ts if last_ts is not None else time.time(), line))
+    return rows, last_ts
+
+
+class LogSearchIndex:
+    """Przyrostowy indeks pełnotekstowy logów serwerów (SQLite FTS5).
+
+    Każdy serwer ma własną bazę logs/panel/search.db. Linie trafiają do
+    kolejki z LogSink po każdym zapisie paczki i są wstawiane w transakcjach
+    przez jeden wątek indeksujący. Pierwsze otwarcie bazy uzupełnia ją
+    o istniejące archiwum i bieżący plik logu.
+    """
+
+    def __init__(self, retention_days=30):
+        self.retention = retention_days * 86400 if retention_days else None
+        self._queue = queue.Queue()
+        self._connections = {}
+        self._last_prune = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enqueue(self, log_file, data, offset=None):
+        """Dodaj zapisaną paczkę linii (`offset` - pozycja w pliku przed zapisem)"""
+        self._put(('lines', log_file, data, offset))
+
+    def request_backfill(self, log_file):
+        self._put(('backfill', log_file, None, None))
+
+    def _put(self, item):
+        self._queue.put(item)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='LogSearchIndex', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            try:
+                while True:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            touched = set()
+            for kind, log_file, data, offset in items:
+                try:
+                    conn = self._connection(log_file, offset)
+                    if kind == 'lines':
+                        rows, _ = _rows(data.splitlines())
+                        conn.executemany('INSERT INTO lines (ts, line) VALUES (?, ?)', rows)
+                    touched.add(log_file)
+                except Exception as e:
+                    print(f"Error indexing log {log_file}: {e}")
+
+            for log_file in touched:
+                try:
+                    conn = self._connections[log_file]
+                    conn.commit()
+                    self._prune(log_file, conn)
+                except Exception as e:
+                    print(f"Error committing log index {log_file}: {e}")
+
+    def _connection(self, log_file, offset=None):
+        conn = self._connections.get(log_file)
+        if conn is not None:
+            return conn
+        path = search_db_path(log_file)
+        created = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA + (_FTS_SCHEMA if HAS_TRIGRAM else []):
+            conn.execute(statement)
+        self._connections[log_file] = conn
+        if created:
+            self._backfill(conn, log_file, offset)
+        return conn
+
+    def _backfill(self, conn, log_file, live_limit=None):
+        """Zaindeksuj archiwum, pliki czekające na kompresję i bieżący log"""
+        archive = LogArchive.for_log(log_file)
+        last_ts = None
+
+        def insert(lines):
+            nonlocal last_ts
+            rows, last_ts = _rows(lines, last_ts)
+            conn.executemany('INSERT INTO lines (ts, line) VALUES (?, ?)', rows)
+
+        for segment in archive.load_index()['segments']:
+            try:
+                with gzip.open(os.path.join(archive.archive_dir, segment['file']), 'rt',
+                               encoding='utf-8', errors='ignore') as f:
+                    insert(f)
+            except OSError:
+                continue
+        for pending in archive.pending_segments():
+            try:
+                with open(pending, 'r', encoding='utf-8', errors='ignore') as f:
+                    insert(f)
+            except OSError:
+                continue
+        if os.path.exists(log_file):
+            with open(log_file, 'rb') as f:
+                # Linie zapisane od `live_limit` przyjdą z kolejki - nie dubluj ich
+                data = f.read(live_limit) if live_limit is not None else f.read()
+            insert(data.decode('utf-8', errors='ignore').splitlines())
+        conn.commit()
+
+    def _prune(self, log_file, conn):
+        if not self.retention:
+            return
+        now = time.time()
+        if now - self._last_prune.get(log_file, 0) < PRUNE_INTERVAL:
+            return
+        self._last_prune[log_file] = now
+        conn.execute('DELETE FROM lines WHERE ts < ?', (now - self.retention,))
+        conn.commit()
+
+    def search(self, log_file, query=None, regex=None, start=None, end=None, limit=200):
+        """Szukaj linii po podciągu (bez rozróżniania wielkości liter), regexie i czasie.
+
+        Zwraca {'results': [{'time', 'line'}], 'indexing', 'took_ms'} - najnowsze
+        linie pierwsze. Nieprawidłowy regex zgłasza ValueError.
+        """
+        started = time.perf_counter()
+        path = search_db_path(log_file)
+        if not os.path.exists(path):
+            self.request_backfill(log_file)
+            return {'results': [], 'indexing': True, 'took_ms': 0}
+
+        pattern = None
+        if regex:
+            try:
+                pattern = re.compile(regex)
+            except re.error as e:
+                raise ValueError(f'Invalid regex: {e}')
+
+        use_fts = bool(query) and HAS_TRIGRAM and len(query) >= MIN_FTS_QUERY
+        clauses = []
+        params = []
+        if start is not None:
+            clauses.append('l.ts >= ?')
+            params.append(start)
+        if end is not None:
+            clauses.append('l.ts <= ?')
+            params.append(end)
+        if use_fts:
+            escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("f.line LIKE ? ESCAPE '\\'")
+            params.append(f'%{escaped}%')
+        elif query:
+            clauses.append('instr(lower(l.line), lower(?)) > 0')
+            params.append(query)
+        if pattern is not None:
+            clauses.append('l.line REGEXP ?')
+            params.append(regex)
+
+        conn = sqlite3.connect(path, timeout=5)
+        try:
+            # Zakres czasu zamieniony na zakres id (indeks po ts), żeby FTS
+            # i skan regexu nie przeglądały linii spoza okna
+            id_column = 'f.rowid' if use_fts else 'l.id'
+            if start is not None:
+                row = conn.execute('SELECT id FROM lines WHERE ts >= ? ORDER BY ts LIMIT 1', (start,)).fetchone()
+                if row is None:
+                    return {'results': [], 'indexing': False, 'took_ms': 0}
+                clauses.append(f'{id_column} >= {int(row[0])}')
+            if end is not None:
+                row = conn.execute('SELECT id FROM lines WHERE ts <= ? ORDER BY ts DESC LIMIT 1', (end,)).fetchone()
+                if row is None:
+                    return {'results': [], 'indexing': False, 'took_ms': 0}
+                clauses.append(f'{id_column} <= {int(row[0])}')
+
+            if use_fts:
+                sql = 'SELECT l.ts, l.line FROM lines_fts f JOIN lines l ON l.id = f.rowid'
+            else:
+                sql = 'SELECT l.ts, l.line FROM lines l'
+            if clauses:
+                sql += ' WHERE ' + ' AND '.join(clauses)
+            sql += f' ORDER BY {id_column} DESC LIMIT ?'
+            params.append(limit)
+
+            if pattern is not None:
+                conn.create_function('regexp', 2,
+                                     lambda _expr, value: pattern.search(value) is not None,
+                                     deterministic=True)
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        return {
+            'results': [{'time': ts, 'line': line} for ts, line in rows],
+            'indexing': False,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
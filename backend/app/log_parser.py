@@ -0,0 +1,267 @@
+import re
+import threading
+import time
+from collections import deque
+
+RECENT_EVENTS = 200
+
+_ANSI = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+_FORMATTING = re.compile(r'\x1b\[[0-9;]*[A-Za-z]|§.')
+
+# Formaty nagłówków linii; `message` to treść po nagłówku
+LINE_FORMATS = (
+    # Vanilla / Fabric: [12:34:56] [Server thread/INFO]: msg
+    ('java', re.compile(r'\[(?P<time>\d\d:\d\d:\d\d)\] \[(?P<thread>[^\]/]+)/(?P<level>[A-Z]+)\]: (?P<message>.*)')),
+    # Paper / Spigot: [12:34:56 INFO]: msg
+    ('paper', re.compile(r'\[(?P<time>\d\d:\d\d:\d\d) (?P<level>[A-Z]+)\]: (?P<message>.*)')),
+    # Forge: [18Oct2026 12:34:56.789] [Server thread/INFO] [net.minecraft.server.MinecraftServer/]: msg
+    ('forge', re.compile(r'\[\d{1,2}\w{3}\d{4} (?P<time>\d\d:\d\d:\d\d)\.\d+\] '
+                         r'\[(?P<thread>[^\]/]+)/(?P<level>[A-Z]+)\] \[[^\]]*\]: (?P<message>.*)')),
+    # Bedrock: [2026-10-18 12:34:56:789 INFO] msg
+    ('bedrock', re.compile(r'\[\d{4}-\d\d-\d\d (?P<time>\d\d:\d\d:\d\d):\d+ (?P<level>[A-Z]+)\] (?P<message>.*)')),
+)
+
+_JOIN = re.compile(r'^(?P<player>[\w.]{1,32}) joined the game')
+_LEAVE = re.compile(r'^(?P<player>[\w.]{1,32}) left the game')
+_BEDROCK_PLAYER = re.compile(r'^Player (?P<action>connected|disconnected): (?P<player>[^,]+), xuid: ?(?P<xuid>\d*)')
+_READY = re.compile(r'^Done \((?P<seconds>[\d.,]+)s\)! For help')
+_LAG = re.compile(r"Can't keep up!.*Running (?P<ms>\d+)ms or (?P<ticks>\d+) ticks behind")
+_EXCEPTION = re.compile(r'^(?:Caused by: )?[\w$.]+(?:Exception|Error)(?::|$)')
+
+# Odpowiedzi na komendy pomiaru ticków (Paper/Purpur `tps`, `mspt`; Forge `forge tps`)
+_PAPER_TPS = re.compile(r'TPS from last 1m, 5m, 15m: \*?([\d.]+)')
+_MSPT_TRIPLET = re.compile(r'([\d.]+)/([\d.]+)/([\d.]+)')
+_FORGE_TPS = re.compile(r'Overall\s*: Mean tick time: ([\d.]+) ms\. Mean TPS: ([\d.]+)')
+
+ERROR_LEVELS = frozenset(('ERROR', 'SEVERE', 'FATAL'))
+
+
+def _plain(text):
+    return _FORMATTING.sub('', text)
+
+
+def parse_tps_reply(text):
+    """TPS z ostatniej minuty z odpowiedzi Paper/Purpur na `tps`"""
+    match = _PAPER_TPS.search(_plain(text))
+    return min(float(match.group(1)), 20.0) if match else None
+
+
+def parse_mspt_reply(text):
+    """(średni, maksymalny) czas ticka z ostatnich 5 s z odpowiedzi na `mspt`"""
+    match = _MSPT_TRIPLET.search(_plain(text))
+    return (float(match.group(1)), float(match.group(3))) if match else None
+
+
+def parse_forge_tps_reply(text):
+    """(mspt, tps) z podsumowania 'Overall' odpowiedzi Forge na `forge tps`"""
+    match = _FORGE_TPS.search(_plain(text))
+    return (float(match.group(1)), min(float(match.group(2)), 20.0)) if match else None
+
+
+class LogLineParser:
+    """Parser linii konsoli serwera Java (vanilla/Paper/Forge) i Bedrock.
+
+    Serwer pisze wciąż w jednym formacie, więc parser zapamiętuje ostatnio
+    dopasowany wzorzec i próbuje go jako pierwszego. Zdarzenia rozpoznawane
+    są dopiero po tanim sprawdzeniu podciągu - większość linii kończy się
+    na jednym dopasowaniu nagłówka.
+    """
+
+    def __init__(self):
+        self._formats = list(LINE_FORMATS)
+        self._in_exception = False
+        self._expect_mspt = False
+        self.format = None
+
+    def parse(self, line):
+        """Zwraca {'format', 'time', 'level', 'thread', 'message', 'event'}"""
+        line = line.rstrip('\r\n')
+        if '\x1b' in line:
+            line = _ANSI.sub('', line)
+
+        record = None
+        for i, (name, pattern) in enumerate(self._formats):
+            match = pattern.match(line)
+            if match:
+                if i:
+                    self._formats.insert(0, self._formats.pop(i))
+                self.format = name
+                groups = match.groupdict()
+                record = {
+                    'format': name,
+                    'time': groups['time'],
+                    'level': groups['level'],
+                    'thread': groups.get('thread'),
+                    'message': groups['message'],
+                    'event': None
+                }
+                break
+
+        if record is None:
+            record = {'format': None, 'time': None, 'level': None, 'thread': None,
+                      'message': line, 'event': None}
+            # Linie stack trace należą do wyjątku z poprzedniego wpisu
+            if self._in_exception and line.startswith(('\tat ', '\t...', '    at ', 'Caused by: ')):
+                return record
+
+        record['event'] = self._detect_event(record['message'], record['level'])
+        return record
+
+    def _detect_event(self, message, level):
+        self._in_exception = False
+
+        if self._expect_mspt:
+            # Wartości `mspt` przychodzą w linii po nagłówku
+            self._expect_mspt = False
+            reply = parse_mspt_reply(message)
+            if reply:
+                return {'type': 'mspt', 'mspt': reply[0], 'mspt_max': reply[1]}
+
+        if 'the game' in message:
+            match = _JOIN.match(message)
+            if match:
+                return {'type': 'join', 'player': match.group('player')}
+            match = _LEAVE.match(message)
+            if match:
+                return {'type': 'leave', 'player': match.group('player')}
+        elif message.startswith('Player ') and 'connected: ' in message:
+            match = _BEDROCK_PLAYER.match(message)
+            if match:
+                return {'type': 'join' if match.group('action') == 'connected' else 'leave',
+                        'player': match.group('player').strip(), 'xuid': match.group('xuid') or None}
+        elif message.startswith('Done ('):
+            match = _READY.match(message)
+            if match:
+                return {'type': 'ready', 'startup_seconds': float(match.group('seconds').replace(',', '.'))}
+        elif message.startswith('Server started.'):
+            return {'type': 'ready', 'startup_seconds': None}
+        elif "Can't keep up!" in message:
+            match = _LAG.search(message)
+            if match:
+                return {'type': 'lag', 'behind_ms': int(match.group('ms')),
+                        'ticks_behind': int(match.group('ticks'))}
+        elif message.startswith(('Stopping server', 'Stopping the server')):
+            return {'type': 'stopping'}
+        elif 'TPS from last' in message:
+            tps = parse_tps_reply(message)
+            if tps is not None:
+                return {'type': 'tps', 'tps': tps}
+        elif 'Server tick times' in message:
+            self._expect_mspt = True
+            return None
+        elif 'Mean TPS' in message and 'Overall' in message:
+            reply = parse_forge_tps_reply(message)
+            if reply:
+                return {'type': 'tps', 'tps': reply[1], 'mspt': reply[0]}
+        elif 'Applying patches' in message:
+            return {'type': 'patching'}
+        elif 'Downloading mojang' in message:
+            return {'type': 'downloading'}
+
+        if level in ERROR_LEVELS or (('Exception' in message or 'Error' in message) and
+                                     _EXCEPTION.match(message)):
+            self._in_exception = True
+            return {'type': 'exception', 'level': level, 'message': message[:500]}
+        return None
+
+
+class ServerEventState:
+    """Zwięzły stan serwera wyliczany ze zdarzeń konsoli: gracze online,
+    gotowość, ostatnie opóźnienie i liczniki - oraz krótka historia zdarzeń."""
+
+    def __init__(self, max_events=RECENT_EVENTS):
+        self.parser = LogLineParser()
+        self.players = {}
+        self.ready = False
+        self.ready_at = None
+        self.startup_seconds = None
+        self.last_lag = None
+        self.lag_count = 0
+        self.exception_count = 0
+        self.events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def feed(self, line):
+        """Przetwórz linię; zwraca zdarzenie (z polem 'time') albo None"""
+        event = self.parser.parse(line)['event']
+        if event is None:
+            return None
+        event['time'] = time.time()
+
+        with self._lock:
+            kind = event['type']
+            if kind == 'join':
+                self.players[event['player'].lower()] = event['player']
+            elif kind == 'leave':
+                self.players.pop(event['player'].lower(), None)
+            elif kind == 'ready':
+                self.ready = True
+                self.ready_at = event['time']
+                self.startup_seconds = event['startup_seconds']
+            elif kind == 'stopping':
+                self.ready = False
+                self.players.clear()
+            elif kind == 'lag':
+                self.lag_count += 1
+                self.last_lag = event
+            elif kind == 'exception':
+                self.exception_count += 1
+            if kind not in ('tps', 'mspt'):
+                # Odpowiedzi na cykliczne pomiary ticków zapisuje TickHealthCollector
+                self.events.append(event)
+        return event
+
+    @property
+    def log_format(self):
+        """Format konsoli serwera ('java', 'paper', 'forge', 'bedrock') albo None"""
+        return self.parser.format
+
+    def snapshot(self, events=0):
+        with self._lock:
+            data = {
+                'ready': self.ready,
+                'ready_at': self.ready_at,
+                'startup_seconds': self.startup_seconds,
+                'players_online': len(self.players),
+                'players': sorted(self.players.values(), key=str.lower),
+                'last_lag': self.last_lag,
+                'lag_count': self.lag_count,
+                'exception_count': self.exception_count
+            }
+            if events:
+                data['events'] = list(self.events)[-events:]
+            return data
+
+
+def _sample_lines():
+    return [
+        '[12:34:56] [Server thread/INFO]: Steve joined the game\n',
+        '[12:34:56 INFO]: <Alex> hello there, how is everyone doing today?\n',
+        "[12:34:57] [Server thread/WARN]: Can't keep up! Is the server overloaded? Running 2034ms or 40 ticks behind\n",
+        '[18Oct2026 12:34:56.789] [Server thread/INFO] [net.minecraft.server.MinecraftServer/]: Steve left the game\n',
+        '[2026-10-18 12:34:56:789 INFO] Player connected: Alex, xuid: 2535412345678901\n',
+        '[12:34:58] [Server thread/INFO]: Saving chunks for level \'ServerLevel[world]\'/minecraft:overworld\n',
+        '[12:34:58 ERROR]: Could not pass event PlayerMoveEvent to SomePlugin v1.0\n',
+        '\tat org.bukkit.plugin.SimplePluginManager.callEvent(SimplePluginManager.java:589)\n',
+    ]
+
+
+def benchmark_parser(lines=200000):
+    """Zmierz przepustowość parsera (linie/s) na mieszance typowych linii"""
+    sample = _sample_lines()
+    data = [sample[i % len(sample)] for i in range(lines)]
+    state = ServerEventState()
+    events = 0
+
+    started = time.perf_counter()
+    for line in data:
+        if state.feed(line) is not None:
+            events += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'lines': lines,
+        'events': events,
+        'seconds': round(elapsed, 3),
+        'lines_per_sec': int(lines / elapsed) if elapsed else None
+    }
@@ -0,0 +1,216 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import date
+from .log_archive import ARCHIVE_DIR_NAME, LogArchive
+
+
+class LogSink:
+    """Buforowany zapis logu jednego serwera.
+
+    Pisze do pliku należącego wyłącznie do panelu (console_log_path) - nikt
+    inny go nie przenosi ani nie obcina, więc jeden otwarty uchwyt i licznik
+    rozmiaru zawsze odpowiadają plikowi. Linie zapisywane są paczkami - gdy
+    uzbiera się `flush_bytes` danych albo minie `flush_interval` sekund.
+    Po przekroczeniu `rotate_bytes` albo zmianie dnia (`rotate_daily`) plik
+    jest odkładany do kompresji w tym samym katalogu, a `on_rotate` dostaje
+    jego ścieżkę (kompresja odbywa się poza wątkiem zapisu). `on_flush` dostaje każdą
+    zapisaną paczkę razem z offsetem, pod którym trafiła do pliku.
+    """
+
+    def __init__(self, path, flush_interval=1.0, flush_bytes=64 * 1024,
+                 rotate_bytes=0, rotate_daily=False, on_rotate=None, on_flush=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.on_rotate = on_rotate
+        self.on_flush = on_flush
+        self._pending = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._opened_day = None
+        self.closed = False
+        # Rotacja przenosi plik - wolno tylko dla pliku panelu w katalogu archiwum,
+        # nigdy dla pliku, do którego pisze też serwer (latest.log log4j)
+        self.rotatable = os.path.basename(os.path.dirname(path)) == ARCHIVE_DIR_NAME
+        if (rotate_bytes or rotate_daily) and not self.rotatable:
+            print(f"Log {path} is not a panel console log, rotation disabled for it")
+
+    def _ensure_open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._size = self._file.tell()
+            if self._size:
+                self._opened_day = date.fromtimestamp(os.path.getmtime(self.path))
+            else:
+                self._opened_day = date.today()
+
+    def _should_rotate(self, incoming):
+        if not self._size or not self.rotatable:
+            return False
+        if self.rotate_bytes and self._size + incoming > self.rotate_bytes:
+            return True
+        return self.rotate_daily and self._opened_day != date.today()
+
+    def _rotate_locked(self):
+        """Odłóż bieżący plik do kompresji i zacznij nowy"""
+        self._file.close()
+        self._file = None
+        archive = LogArchive.for_log(self.path)
+        target = archive.pending_path(time.time_ns())
+        try:
+            os.makedirs(archive.archive_dir, exist_ok=True)
+            os.replace(self.path, target)
+        except OSError as e:
+            # Nie blokuj zapisu logu - spróbuj ponownie przy następnym zapisie
+            print(f"Error rotating log file {self.path}: {e}")
+            self._ensure_open()
+            # Stary plik nadal ma swoje dane - offsety indeksu liczone od jego rozmiaru
+            self._size = os.fstat(self._file.fileno()).st_size
+            self._opened_day = date.today()
+            return
+        if self.on_rotate:
+            self.on_rotate(target)
+
+    def write(self, line):
+        with self._lock:
+            if self.closed:
+                return
+            self._pending.append(line)
+            self._pending_bytes += len(line.encode('utf-8'))
+            if (self._pending_bytes >= self.flush_bytes or
+                    time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self, force=False):
+        """Zapisz oczekujące linie (gdy force=False - tylko po upływie flush_interval)"""
+        with self._lock:
+            if force or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        try:
+            data = ''.join(self._pending)
+            size = len(data.encode('utf-8'))
+            self._ensure_open()
+            if self._should_rotate(size):
+                self._rotate_locked()
+                self._ensure_open()
+            offset = self._size
+            self._file.write(data)
+            self._file.flush()
+            self._size += size
+            if self.on_flush:
+                self.on_flush(self.path, data, offset)
+        except Exception as e:
+            print(f"Error writing to log file {self.path}: {e}")
+        finally:
+            self._pending = []
+            self._pending_bytes = 0
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self._flush_locked()
+            self.closed = True
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except Exception:
+                    pass
+                self._file = None
+
+
+class LogSinkRegistry:
+    """Rejestr otwartych logów serwerów z jednym wątkiem dopisującym zaległe paczki.
+
+    Wszystkie logi są domykane przy zakończeniu procesu panelu (atexit).
+    Odłożone przy rotacji pliki kompresuje osobny wątek archiwizujący.
+    """
+
+    def __init__(self, flush_interval=1.0, flush_bytes=64 * 1024,
+                 rotate_bytes=0, rotate_daily=False, archive_keep=30, on_flush=None):
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.archive_keep = archive_keep
+        self.on_flush = on_flush
+        self._sinks = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._archive_queue = queue.Queue()
+        self._archive_lock = threading.Lock()
+        self._archiver = None
+        atexit.register(self.close_all)
+
+    def open(self, key, path):
+        with self._lock:
+            sink = self._sinks.get(key)
+            if sink is not None and (sink.closed or sink.path != path):
+                sink.close()
+                sink = None
+            if sink is None:
+                sink = LogSink(path, self.flush_interval, self.flush_bytes,
+                               self.rotate_bytes, self.rotate_daily, self._queue_archive,
+                               self.on_flush)
+                self._sinks[key] = sink
+                # Dokończ kompresję plików odłożonych przed restartem panelu
+                for pending in LogArchive.for_log(path).pending_segments():
+                    self._queue_archive(pending)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+            return sink
+
+    def _queue_archive(self, raw_path):
+        self._archive_queue.put(raw_path)
+        with self._archive_lock:
+            if self._archiver is None:
+                self._archiver = threading.Thread(target=self._archive_loop, daemon=True)
+                self._archiver.start()
+
+    def _archive_loop(self):
+        while True:
+            raw_path = self._archive_queue.get()
+            log_dir = os.path.dirname(os.path.dirname(raw_path))
+            try:
+                LogArchive(log_dir, keep_segments=self.archive_keep).compress_segment(raw_path)
+            except Exception as e:
+                print(f"Error archiving log segment {raw_path}: {e}")
+
+    def get(self, key):
+        return self._sinks.get(key)
+
+    def close(self, key):
+        with self._lock:
+            sink = self._sinks.pop(key, None)
+        if sink is not None:
+            sink.close()
+
+    def close_all(self):
+        with self._lock:
+            sinks = list(self._sinks.values())
+            self._sinks.clear()
+        for sink in sinks:
+            sink.close()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                sinks = list(self._sinks.values())
+            for sink in sinks:
+                sink.flush()
@@ -0,0 +1,57 @@
+import os
+
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+def tail_lines(path, lines=100, before=None, block_size=TAIL_BLOCK_SIZE):
+    """Zwróć ostatnie `lines` linii pliku, czytając go blokami od końca.
+
+    Koszt zależy od liczby zwracanych linii, a nie od rozmiaru pliku.
+    `before` to offset bajtowy (zwykle `start` z poprzedniej strony) -
+    pozwala przewijać log dalej wstecz. Zwraca słownik:
+    {'lines', 'start', 'end', 'size', 'has_more'}, gdzie `start` to offset
+    pierwszej zwróconej linii.
+    """
+    lines = max(0, int(lines))
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if before is None else max(0, min(int(before), size))
+        if lines == 0 or end == 0:
+            return {'lines': [], 'start': end, 'end': end, 'size': size, 'has_more': end > 0}
+
+        pos = end
+        chunks = []
+        newlines = 0
+        # Potrzebujemy o jeden znak nowej linii więcej niż linii, żeby mieć
+        # pewność, że pierwsza zwrócona linia jest kompletna
+        while pos > 0 and newlines <= lines:
+            read_size = min(block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            chunk = f.read(read_size)
+            chunks.append(chunk)
+            newlines += chunk.count(b'\n')
+
+    chunks.reverse()
+    data = b''.join(chunks)
+    trailing = data.endswith(b'\n')
+    parts = data.split(b'\n')
+    if trailing:
+        parts.pop()
+    if pos > 0:
+        # Pierwszy fragment zaczyna się w środku linii
+        parts.pop(0)
+
+    keep = parts[-lines:]
+    start = end - len(b'\n'.join(keep)) - (1 if trailing else 0)
+    result = [part.decode('utf-8', errors='ignore') + '\n' for part in keep]
+    if result and not trailing:
+        result[-1] = result[-1][:-1]
+
+    return {
+        'lines': result,
+        'start': start,
+        'end': end,
+        'size': size,
+        'has_more': start > 0
+    }
@@ -1,5 +1,10 @@
 import os
 from .server_manager import ServerManager
+from .cgroups import CgroupManager
+from .artifact_store import ArtifactStore
+from .version_resolver import VersionResolver
+from .downloader import Downloader
+from .download_scheduler import DownloadScheduler
 from .file_manager import FileManager
 
 server_manager = None
@@ -7,7 +12,50 @@ file_manager = None
 
 def init_managers(app):
     global server_manager, file_manager
-    server_manager = ServerManager(app.config['SERVER_BASE_PATH'])
+    server_manager = ServerManager(
+        app.config['SERVER_BASE_PATH'],
+        console_buffer_lines=app.config.get('CONSOLE_BUFFER_LINES', 1000),
+        echo_output=app.config.get('CONSOLE_ECHO_STDOUT', False),
+        log_flush_interval=app.config.get('LOG_FLUSH_INTERVAL', 1.0),
+        log_flush_bytes=app.config.get('LOG_FLUSH_BYTES', 64 * 1024),
+        log_rotate_bytes=app.config.get('LOG_ROTATE_BYTES', 0),
+        log_rotate_daily=app.config.get('LOG_ROTATE_DAILY', False),
+        log_archive_keep=app.config.get('LOG_ARCHIVE_KEEP', 30),
+        log_search_retention_days=app.config.get('LOG_SEARCH_RETENTION_DAYS', 30),
+        metrics_interval=app.config.get('METRICS_SAMPLE_INTERVAL', 2),
+        metrics_retention=app.config.get('METRICS_RETENTION', 3600),
+        tick_interval=app.config.get('TICK_HEALTH_INTERVAL', 30),
+        disk_usage_interval=app.config.get('DISK_USAGE_INTERVAL', 5),
+        disk_usage_rescan=app.config.get('DISK_USAGE_RESCAN', 3600),
+        cgroups=CgroupManager(
+            enabled=app.config.get('CGROUPS_ENABLED', False),
+            parent=app.config.get('CGROUP_PARENT', 'mcpanel.slice'),
+            cpu_max=app.config.get('CGROUP_CPU_MAX'),
+            memory_max=app.config.get('CGROUP_MEMORY_MAX'),
+            io_weight=app.config.get('CGROUP_IO_WEIGHT')
+        ),
+        artifacts=ArtifactStore(
+            app.config.get('ARTIFACT_CACHE_PATH') or os.path.join(app.config['SERVER_BASE_PATH'], '.artifacts'),
+            latest_ttl=app.config.get('ARTIFACT_LATEST_TTL', 6 * 3600)
+        ),
+        versions=VersionResolver(
+            app.config.get('VERSION_CACHE_PATH') or os.path.join(app.config['SERVER_BASE_PATH'], '.versions'),
+            ttl=app.config.get('VERSION_CACHE_TTL', 600),
+            timeout=app.config.get('VERSION_FETCH_TIMEOUT', 5.0)
+        ),
+        downloader=DownloadScheduler(
+            Downloader(
+                connect_timeout=app.config.get('DOWNLOAD_CONNECT_TIMEOUT', 10.0),
+                read_timeout=app.config.get('DOWNLOAD_READ_TIMEOUT', 60.0),
+                retries=app.config.get('DOWNLOAD_RETRIES', 5),
+                segments=app.config.get('DOWNLOAD_SEGMENTS', 4),
+                segment_min_size=app.config.get('DOWNLOAD_SEGMENT_MIN_SIZE', 32 * 1024 * 1024)
+            ),
+            max_concurrent=app.config.get('DOWNLOAD_MAX_CONCURRENT', 3),
+            bandwidth=app.config.get('DOWNLOAD_BANDWIDTH_LIMIT', 0)
+        )
+    )
+    server_manager.versions.start()
     file_manager = FileManager(app.config['SERVER_BASE_PATH'])
     
     # Create servers directory if it doesn't exist
@@ -0,0 +1,288 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from .models import db, AgentHeartbeat, ServerMetricSample, MetricRollup
+
+HISTORY_INTERVAL = 10
+RAW_RETENTION = 6 * 3600
+MINUTE_RETENTION = 14 * 86400
+HOUR_RETENTION = 400 * 86400
+MAX_PENDING = 20000
+MAX_POINTS = 500
+
+AGENT_METRICS = ('cpu_usage', 'memory_usage', 'disk_usage', 'running_servers')
+SERVER_METRICS = ('cpu_usage', 'memory_mb', 'tps', 'players_online')
+
+# scope -> (model surowych próbek, kolumna encji, metryki)
+SOURCES = {
+    'agent': (AgentHeartbeat, 'agent_id', AGENT_METRICS),
+    'server': (ServerMetricSample, 'server_id', SERVER_METRICS),
+}
+
+# Zakresy dla ?range= w endpointach historii
+HISTORY_RANGES = {
+    '15m': 15 * 60, '1h': 3600, '6h': 6 * 3600, '24h': 86400,
+    '7d': 7 * 86400, '30d': 30 * 86400, '90d': 90 * 86400, '365d': 365 * 86400
+}
+
+
+def _floor(moment, seconds):
+    epoch = datetime(1970, 1, 1)
+    return epoch + timedelta(seconds=int((moment - epoch).total_seconds()) // seconds * seconds)
+
+
+def merge_points(points, limit=MAX_POINTS):
+    """Scal sąsiednie kubełki tak, żeby było ich najwyżej `limit` (min z min, max z max, średnia ważona)"""
+    if len(points) <= limit:
+        return points
+    step = -(-len(points) // limit)
+    merged = []
+    for i in range(0, len(points), step):
+        group = points[i:i + step]
+        total = sum(p['sum'] for p in group)
+        count = sum(p['samples'] for p in group)
+        merged.append({
+            'time': group[0]['time'],
+            'min': min(p['min'] for p in group),
+            'max': max(p['max'] for p in group),
+            'sum': total,
+            'samples': count
+        })
+    return merged
+
+
+class MetricsHistory:
+    """Historia metryk agentów i serwerów z przeliczaniem do kubełków 1 min / 1 h.
+
+    Próbki trafiają do bufora w pamięci i są zapisywane paczką (jedno
+    executemany na tabelę) co `interval` sekund. Ten sam wątek zwija
+    zakończone minuty surowych próbek do MetricRollup (GROUP BY po jednej
+    minucie), pełne godziny z kubełków minutowych i usuwa dane starsze niż
+    retencja. Zapytania o wykresy czytają surowe próbki tylko dla krótkich
+    zakresów, dłuższe - wyłącznie kubełki.
+    `collect()` zwraca {server_id: {metryka: wartość}} serwerów lokalnych.
+    """
+
+    def __init__(self, collect=None, interval=HISTORY_INTERVAL, raw_retention=RAW_RETENTION,
+                 minute_retention=MINUTE_RETENTION, hour_retention=HOUR_RETENTION):
+        self.collect = collect
+        self.interval = interval
+        self.raw_retention = raw_retention
+        self.minute_retention = minute_retention
+        self.hour_retention = hour_retention
+        self._pending = {scope: deque(maxlen=MAX_PENDING) for scope in SOURCES}
+        self._next_minute = None
+        self._next_hour = None
+        self._last_prune = 0
+        self._app = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        with self._lock:
+            self._app = app
+            if self._thread is None:
+                self.interval = app.config.get('METRICS_HISTORY_INTERVAL', self.interval)
+                self.raw_retention = app.config.get('METRICS_RAW_RETENTION', self.raw_retention)
+                self.minute_retention = app.config.get('METRICS_MINUTE_RETENTION', self.minute_retention)
+                self.hour_retention = app.config.get('METRICS_HOUR_RETENTION', self.hour_retention)
+                self._thread = threading.Thread(target=self._run, name='MetricsHistory', daemon=True)
+                self._thread.start()
+
+    def record(self, scope, entity_id, metrics, timestamp=None):
+        model, entity_column, names = SOURCES[scope]
+        row = {name: metrics.get(name) for name in names}
+        if all(value is None for value in row.values()):
+            return
+        row[entity_column] = entity_id
+        row['timestamp'] = timestamp or datetime.utcnow()
+        self._pending[scope].append(row)
+
+    def forget(self, scope, entity_id):
+        """Usuń historię agenta/serwera (przed usunięciem go z bazy, bez commita)"""
+        model, entity_column, _ = SOURCES[scope]
+        pending = self._pending[scope]
+        for row in [row for row in pending if row[entity_column] == entity_id]:
+            pending.remove(row)
+        model.query.filter(getattr(model, entity_column) == entity_id).delete(synchronize_session=False)
+        MetricRollup.query.filter_by(scope=scope, entity_id=entity_id).delete(synchronize_session=False)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._app.app_context():
+                try:
+                    if self.collect:
+                        for server_id, metrics in self.collect().items():
+                            self.record('server', server_id, metrics)
+                    self.flush()
+                    self.rollup()
+                    if time.monotonic() - self._last_prune > 3600:
+                        self.prune()
+                        self._last_prune = time.monotonic()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error writing metrics history: {e}")
+
+    def flush(self):
+        """Zapisz zbuforowane próbki - jedno executemany na tabelę, jeden commit"""
+        written = 0
+        for scope, pending in self._pending.items():
+            rows = []
+            while pending:
+                rows.append(pending.popleft())
+            if rows:
+                db.session.execute(SOURCES[scope][0].__table__.insert(), rows)
+                written += len(rows)
+        if written:
+            db.session.commit()
+        return written
+
+    def _watermarks(self, now):
+        """Pierwsza minuta/godzina do zwinięcia - z bazy, więc restart panelu niczego nie gubi"""
+        if self._next_minute is None:
+            last = db.session.query(func.max(MetricRollup.bucket_start)).filter(
+                MetricRollup.resolution == 60).scalar()
+            if last is not None:
+                self._next_minute = last + timedelta(minutes=1)
+            else:
+                oldest = [db.session.query(func.min(model.timestamp)).scalar() for model, _, _ in SOURCES.values()]
+                oldest = [moment for moment in oldest if moment is not None]
+                self._next_minute = _floor(min(oldest) if oldest else now, 60)
+            # Surowe próbki starsze niż retencja i tak zostały usunięte
+            self._next_minute = max(self._next_minute, _floor(now - timedelta(seconds=self.raw_retention), 60))
+        if self._next_hour is None:
+            last = db.session.query(func.max(MetricRollup.bucket_start)).filter(
+                MetricRollup.resolution == 3600).scalar()
+            if last is not None:
+                self._next_hour = last + timedelta(hours=1)
+            else:
+                first = db.session.query(func.min(MetricRollup.bucket_start)).filter(
+                    MetricRollup.resolution == 60).scalar()
+                # Bez minut w bazie - od pierwszej minuty, którą zwinie ten przebieg
+                self._next_hour = _floor(first if first is not None else self._next_minute, 3600)
+
+    def rollup(self, now=None):
+        """Zwiń zakończone minuty i godziny; zwraca liczbę zapisanych kubełków"""
+        now = now or datetime.utcnow()
+        self._watermarks(now)
+        # Margines na próbki zarejestrowane tuż przed końcem minuty, a zapisane w następnej paczce
+        horizon = now - timedelta(seconds=self.interval * 2)
+        written = 0
+        while self._next_minute + timedelta(minutes=1) <= horizon:
+            written += self._rollup_minute(self._next_minute)
+            self._next_minute += timedelta(minutes=1)
+            db.session.commit()
+        while self._next_hour + timedelta(hours=1) <= self._next_minute:
+            written += self._rollup_hour(self._next_hour)
+            self._next_hour += timedelta(hours=1)
+            db.session.commit()
+        return written
+
+    def _rollup_minute(self, start):
+        end = start + timedelta(minutes=1)
+        rows = []
+        for scope, (model, entity_column, names) in SOURCES.items():
+            entity = getattr(model, entity_column)
+            columns = []
+            for name in names:
+                column = getattr(model, name)
+                columns += [func.min(column), func.max(column), func.sum(column), func.count(column)]
+            query = db.session.query(entity, *columns).filter(
+                model.timestamp >= start, model.timestamp < end).group_by(entity)
+            for result in query:
+                for i, name in enumerate(names):
+                    low, high, total, count = result[1 + i * 4:5 + i * 4]
+                    if count:
+                        rows.append({'scope': scope, 'entity_id': result[0], 'metric': name, 'resolution': 60,
+                                     'bucket_start': start, 'min_value': low, 'max_value': high,
+                                     'sum_value': total, 'sample_count': count})
+        if rows:
+            db.session.execute(MetricRollup.__table__.insert(), rows)
+        return len(rows)
+
+    def _rollup_hour(self, start):
+        end = start + timedelta(hours=1)
+        query = db.session.query(
+            MetricRollup.scope, MetricRollup.entity_id, MetricRollup.metric,
+            func.min(MetricRollup.min_value), func.max(MetricRollup.max_value),
+            func.sum(MetricRollup.sum_value), func.sum(MetricRollup.sample_count)
+        ).filter(
+            MetricRollup.resolution == 60,
+            MetricRollup.bucket_start >= start,
+            MetricRollup.bucket_start < end
+        ).group_by(MetricRollup.scope, MetricRollup.entity_id, MetricRollup.metric)
+        rows = [{'scope': scope, 'entity_id': entity_id, 'metric': metric, 'resolution': 3600,
+                 'bucket_start': start, 'min_value': low, 'max_value': high,
+                 'sum_value': total, 'sample_count': count}
+                for scope, entity_id, metric, low, high, total, count in query]
+        if rows:
+            db.session.execute(MetricRollup.__table__.insert(), rows)
+        return len(rows)
+
+    def prune(self, now=None):
+        now = now or datetime.utcnow()
+        deleted = 0
+        for model, _, _ in SOURCES.values():
+            deleted += model.query.filter(
+                model.timestamp < now - timedelta(seconds=self.raw_retention)).delete(synchronize_session=False)
+        for resolution, retention in ((60, self.minute_retention), (3600, self.hour_retention)):
+            deleted += MetricRollup.query.filter(
+                MetricRollup.resolution == resolution,
+                MetricRollup.bucket_start < now - timedelta(seconds=retention)
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def resolution_for(self, start, end, now=None):
+        """Najdrobniejsza rozdzielczość, która ma jeszcze dane dla całego zakresu"""
+        now = now or datetime.utcnow()
+        span = (end - start).total_seconds()
+        if span <= 3600 and start >= now - timedelta(seconds=self.raw_retention):
+            return 'raw'
+        if span <= 2 * 86400 and start >= now - timedelta(seconds=self.minute_retention):
+            return 60
+        return 3600
+
+    def query(self, scope, entity_id, metrics, start, end, points=MAX_POINTS):
+        """{'resolution', 'series': {metryka: [{'time', 'min', 'avg', 'max'}]}} dla wykresu"""
+        model, entity_column, names = SOURCES[scope]
+        metrics = [name for name in metrics if name in names]
+        resolution = self.resolution_for(start, end)
+        series = {}
+
+        if resolution == 'raw':
+            columns = [getattr(model, name) for name in metrics]
+            rows = db.session.query(model.timestamp, *columns).filter(
+                getattr(model, entity_column) == entity_id,
+                model.timestamp >= start, model.timestamp < end
+            ).order_by(model.timestamp).all()
+            for i, name in enumerate(metrics):
+                series[name] = [{'time': row[0], 'min': row[1 + i], 'max': row[1 + i],
+                                 'sum': row[1 + i], 'samples': 1}
+                                for row in rows if row[1 + i] is not None]
+        else:
+            rows = MetricRollup.query.filter(
+                MetricRollup.scope == scope,
+                MetricRollup.entity_id == entity_id,
+                MetricRollup.metric.in_(metrics),
+                MetricRollup.resolution == resolution,
+                MetricRollup.bucket_start >= _floor(start, resolution),
+                MetricRollup.bucket_start < end
+            ).order_by(MetricRollup.bucket_start).all()
+            for name in metrics:
+                series[name] = []
+            for row in rows:
+                series[row.metric].append({'time': row.bucket_start, 'min': row.min_value, 'max': row.max_value,
+                                           'sum': row.sum_value, 'samples': row.sample_count})
+
+        for name, values in series.items():
+            series[name] = [{
+                'time': point['time'].isoformat(),
+                'min': point['min'],
+                'avg': round(point['sum'] / point['samples'], 2) if point['samples'] else None,
+                'max': point['max']
+            } for point in merge_points(values, points)]
+        return {'resolution': resolution, 'series': series}
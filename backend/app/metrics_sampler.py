@@ -0,0 +1,236 @@
+import threading
+import time
+from array import array
+import psutil
+
+SAMPLE_INTERVAL = 2
+RETENTION = 3600
+HISTORY_POINTS = 120
+
+# Okna historii dostępne w /servers/<id>/performance?window=
+HISTORY_WINDOWS = {'1m': 60, '15m': 15 * 60, '1h': 60 * 60}
+
+SERIES_FIELDS = ('cpu_percent', 'memory_rss', 'threads', 'open_fds', 'io_read_rate', 'io_write_rate')
+
+
+class MetricRing:
+    """Bufor cykliczny próbek jednego serwera trzymany kolumnami w array('d').
+
+    Godzina próbek co 2 s to ~100 KiB na serwer niezależnie od liczby
+    odczytów, więc setki serwerów mieszczą się w kilkudziesięciu MiB.
+    """
+
+    def __init__(self, capacity, fields=SERIES_FIELDS, missing=0.0):
+        self.capacity = capacity
+        self.fields = fields
+        self.missing = missing
+        self.times = array('d', bytes(8 * capacity))
+        self.columns = [array('d', bytes(8 * capacity)) for _ in fields]
+        self.head = 0
+        self.count = 0
+
+    def append(self, ts, values):
+        i = self.head
+        self.times[i] = ts
+        for column, field in zip(self.columns, self.fields):
+            value = values.get(field)
+            column[i] = self.missing if value is None else value
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def indexes_since(self, since):
+        """Indeksy próbek nowszych niż `since`, od najstarszej"""
+        start = (self.head - self.count) % self.capacity
+        result = []
+        for n in range(self.count - 1, -1, -1):
+            i = (start + n) % self.capacity
+            if self.times[i] < since:
+                break
+            result.append(i)
+        result.reverse()
+        return result
+
+    def downsample(self, since, points=HISTORY_POINTS):
+        """Średnie próbek z okna w co najwyżej `points` kubełkach"""
+        indexes = self.indexes_since(since)
+        if not indexes:
+            return []
+        step = max(1, -(-len(indexes) // points))
+        samples = []
+        for b in range(0, len(indexes), step):
+            bucket = indexes[b:b + step]
+            sample = {'time': round(self.times[bucket[-1]], 3)}
+            for column, field in zip(self.columns, self.fields):
+                sample[field] = round(sum(column[i] for i in bucket) / len(bucket), 2)
+            samples.append(sample)
+        return samples
+
+
+class _Target:
+    __slots__ = ('pid', 'process', 'ring', 'latest', 'io')
+
+    def __init__(self, pid, process, capacity):
+        self.pid = pid
+        self.process = process
+        self.ring = MetricRing(capacity)
+        self.latest = None
+        self.io = None
+
+
+class MetricsSampler:
+    """Wątek próbkujący procesy serwerów w stałym interwale.
+
+    `targets()` zwraca {server_id: pid} procesów do obserwowania; cpu_percent
+    liczone jest między kolejnymi próbkami, więc żadne żądanie HTTP nie
+    czeka na interwał pomiarowy - endpointy czytają tylko ostatnią próbkę
+    i historię z bufora. `cgroup_metrics(server_id)` (opcjonalnie) zwraca
+    liczniki grupy cgroup serwera - obejmują też procesy potomne, więc
+    zastępują CPU, pamięć i I/O odczytane z pojedynczego PID.
+    """
+
+    def __init__(self, targets, interval=SAMPLE_INTERVAL, retention=RETENTION, cgroup_metrics=None):
+        self.targets = targets
+        self.cgroup_metrics = cgroup_metrics
+        self.interval = interval
+        self.capacity = max(1, int(retention / interval))
+        self.last_round_ms = None
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='MetricsSampler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.sample_once()
+            except Exception as e:
+                print(f"Error sampling server metrics: {e}")
+            elapsed = time.monotonic() - started
+            self.last_round_ms = round(elapsed * 1000, 2)
+            time.sleep(max(0.0, self.interval - elapsed))
+
+    def sample_once(self):
+        targets = self.targets()
+        memory_total = psutil.virtual_memory().total
+        now = time.time()
+
+        with self._lock:
+            for server_id in list(self._targets):
+                if server_id not in targets:
+                    del self._targets[server_id]
+
+        for server_id, pid in targets.items():
+            target = self._targets.get(server_id)
+            if target is None or target.pid != pid:
+                try:
+                    process = psutil.Process(pid)
+                    process.cpu_percent(None)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+                # Nowy proces - nowa historia, pierwsza próbka CPU w następnej rundzie
+                with self._lock:
+                    self._targets[server_id] = _Target(pid, process, self.capacity)
+                continue
+
+            sample = self._sample(target, now, memory_total)
+            if sample is not None and self.cgroup_metrics is not None:
+                self._apply_cgroup(sample, self.cgroup_metrics(server_id), memory_total)
+            with self._lock:
+                if sample is None:
+                    self._targets.pop(server_id, None)
+                    continue
+                target.latest = sample
+                target.ring.append(now, sample)
+
+    def _sample(self, target, now, memory_total):
+        process = target.process
+        try:
+            with process.oneshot():
+                memory = process.memory_info()
+                sample = {
+                    'time': now,
+                    'cpu_percent': round(process.cpu_percent(None), 1),
+                    'memory_rss': memory.rss,
+                    'memory_mb': round(memory.rss / 1024 / 1024, 1),
+                    'memory_percent': round(memory.rss / memory_total * 100, 1) if memory_total else 0.0,
+                    'threads': process.num_threads(),
+                    'open_fds': None,
+                    'io_read_bytes': None,
+                    'io_write_bytes': None,
+                    'io_read_rate': None,
+                    'io_write_rate': None,
+                    'uptime': int(now - process.create_time())
+                }
+                try:
+                    sample['open_fds'] = process.num_fds() if hasattr(process, 'num_fds') \
+                        else process.num_handles()
+                except psutil.AccessDenied:
+                    pass
+                try:
+                    io = process.io_counters()
+                except (AttributeError, psutil.AccessDenied):
+                    io = None
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+        if io is not None:
+            sample['io_read_bytes'] = io.read_bytes
+            sample['io_write_bytes'] = io.write_bytes
+            if target.io is not None:
+                last_time, last_read, last_write = target.io
+                elapsed = now - last_time
+                if elapsed > 0:
+                    sample['io_read_rate'] = max(0, int((io.read_bytes - last_read) / elapsed))
+                    sample['io_write_rate'] = max(0, int((io.write_bytes - last_write) / elapsed))
+            target.io = (now, io.read_bytes, io.write_bytes)
+        return sample
+
+    @staticmethod
+    def _apply_cgroup(sample, cgroup, memory_total):
+        if not cgroup:
+            return
+        if cgroup['cpu_percent'] is not None:
+            sample['cpu_percent'] = cgroup['cpu_percent']
+        memory = cgroup['memory_current']
+        sample['memory_rss'] = memory
+        sample['memory_mb'] = round(memory / 1024 / 1024, 1)
+        sample['memory_percent'] = round(memory / (cgroup['memory_max'] or memory_total) * 100, 1) \
+            if (cgroup['memory_max'] or memory_total) else 0.0
+        for field in ('io_read_bytes', 'io_write_bytes', 'io_read_rate', 'io_write_rate'):
+            sample[field] = cgroup[field]
+        sample['cgroup'] = {
+            'memory_max': cgroup['memory_max'],
+            'memory_anon': cgroup['memory_anon'],
+            'memory_file': cgroup['memory_file'],
+            'oom_kills': cgroup['oom_kills'],
+            'pids': cgroup['pids'],
+            'cpu_throttled_usec': cgroup['cpu_throttled_usec'],
+            'cpu_nr_throttled': cgroup['cpu_nr_throttled'],
+            'pressure': cgroup['pressure']
+        }
+
+    def latest(self, server_id):
+        with self._lock:
+            target = self._targets.get(server_id)
+            return dict(target.latest) if target and target.latest else None
+
+    def latest_all(self):
+        """Ostatnie próbki wszystkich obserwowanych serwerów {server_id: próbka}"""
+        with self._lock:
+            return {server_id: dict(target.latest) for server_id, target in self._targets.items()
+                    if target.latest}
+
+    def history(self, server_id, window):
+        """Uśrednione próbki z ostatnich `window` sekund (najstarsze pierwsze)"""
+        with self._lock:
+            target = self._targets.get(server_id)
+            if target is None:
+                return []
+            return target.ring.downsample(time.time() - window)
@@ -0,0 +1,201 @@
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .prometheus import (
+    db_queries, request_db_queries, request_db_time, request_latency, response_size
+)
+
+SLOW_REQUEST_THRESHOLD = 1.0
+WATCHDOG_INTERVAL = 0.25
+RECENT_LATENCIES = 512
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    db_queries.inc()
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get('query_started')
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    if has_request_context() and 'request_started' in g:
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_time = g.get('db_time', 0.0) + elapsed
+
+
+class _RouteStats:
+    __slots__ = ('count', 'errors', 'total', 'max', 'latencies', 'db_queries', 'db_time', 'bytes', 'slow')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.latencies = deque(maxlen=RECENT_LATENCIES)
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.bytes = 0
+        self.slow = 0
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    k = min(len(values) - 1, max(0, int(round(percent / 100 * (len(values) - 1)))))
+    return round(values[k] * 1000, 1)
+
+
+class RequestProfiler:
+    """Statystyki żądań per reguła routingu i próbki stosu wolnych żądań.
+
+    Wątek-strażnik co WATCHDOG_INTERVAL sprawdza żądania w toku; gdy któreś
+    trwa dłużej niż próg, zapisuje stos jego wątku (sys._current_frames) -
+    widać więc, na czym żądanie utknęło, a nie tylko, że było wolne.
+    """
+
+    def __init__(self, threshold=SLOW_REQUEST_THRESHOLD):
+        self.threshold = threshold
+        self._routes = {}
+        self._in_flight = {}
+        self._slow = deque(maxlen=50)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self, thread_id, started):
+        self._in_flight[thread_id] = [started, None]
+        if self._thread is None and self.threshold > 0:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._watch, name='RequestProfiler', daemon=True)
+                    self._thread.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            now = time.perf_counter()
+            frames = None
+            for thread_id, entry in list(self._in_flight.items()):
+                if entry[1] is None and now - entry[0] >= self.threshold:
+                    frames = frames or sys._current_frames()
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        entry[1] = ''.join(traceback.format_stack(frame, limit=25))
+
+    def discard(self, thread_id):
+        self._in_flight.pop(thread_id, None)
+
+    def end(self, thread_id, method, route, path, status, duration, db_count, db_time, size):
+        entry = self._in_flight.pop(thread_id, None)
+        key = (method, route)
+        with self._lock:
+            stats = self._routes.get(key)
+            if stats is None:
+                stats = self._routes[key] = _RouteStats()
+            stats.count += 1
+            stats.errors += status >= 500
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+            stats.latencies.append(duration)
+            stats.db_queries += db_count
+            stats.db_time += db_time
+            stats.bytes += size or 0
+
+        if self.threshold > 0 and duration >= self.threshold:
+            stack = entry[1] if entry else None
+            with self._lock:
+                stats.slow += 1
+                self._slow.append({
+                    'time': time.time(),
+                    'method': method,
+                    'route': route,
+                    'path': path,
+                    'status': status,
+                    'duration_ms': round(duration * 1000, 1),
+                    'db_queries': db_count,
+                    'db_time_ms': round(db_time * 1000, 1),
+                    'stack': stack
+                })
+            print(
+                f"Slow request {method} {path} ({route}) took {duration * 1000:.0f} ms, "
+                f"{db_count} queries / {db_time * 1000:.0f} ms DB"
+                + (f"\nStack at {self.threshold:.2f}s:\n{stack}" if stack else '')
+            )
+
+    def summary(self, sort='total'):
+        """Lista tras posortowana wg `sort` (total, p95, count, db_queries, db_time, bytes)"""
+        routes = []
+        with self._lock:
+            items = [(key, stats, sorted(stats.latencies)) for key, stats in self._routes.items()]
+            slow = list(self._slow)
+        for (method, route), stats, latencies in items:
+            routes.append({
+                'method': method,
+                'route': route,
+                'count': stats.count,
+                'errors': stats.errors,
+                'slow': stats.slow,
+                'total_ms': round(stats.total * 1000, 1),
+                'avg_ms': round(stats.total / stats.count * 1000, 1),
+                'max_ms': round(stats.max * 1000, 1),
+                'p50_ms': _percentile(latencies, 50),
+                'p95_ms': _percentile(latencies, 95),
+                'p99_ms': _percentile(latencies, 99),
+                'db_queries': stats.db_queries,
+                'db_queries_avg': round(stats.db_queries / stats.count, 1),
+                'db_time_ms': round(stats.db_time * 1000, 1),
+                'bytes': stats.bytes,
+                'bytes_avg': stats.bytes // stats.count
+            })
+        key = {'p95': 'p95_ms', 'count': 'count', 'db_queries': 'db_queries',
+               'db_time': 'db_time_ms', 'bytes': 'bytes'}.get(sort, 'total_ms')
+        routes.sort(key=lambda item: item[key] or 0, reverse=True)
+        return {'threshold_ms': round(self.threshold * 1000), 'routes': routes, 'slow_requests': slow[::-1]}
+
+
+profiler = RequestProfiler()
+
+
+def init_request_metrics(app):
+    """Czas, zapytania SQL i rozmiar odpowiedzi per reguła routingu (Prometheus + /admin/perf/routes)"""
+    profiler.threshold = app.config.get('SLOW_REQUEST_THRESHOLD', profiler.threshold)
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+        profiler.begin(threading.get_ident(), g.request_started)
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            duration = time.perf_counter() - started
+            # Reguła zamiast ścieżki - /servers/1 i /servers/2 to ta sama seria
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            db_count = g.get('db_queries', 0)
+            db_time = g.get('db_time', 0.0)
+            # Strumienie (SSE, send_file) nie mają znanej długości - ich rozmiar nie jest liczony
+            size = None if response.is_streamed or response.direct_passthrough else response.content_length
+            request_latency.observe(duration, method=request.method, route=route, status=response.status_code)
+            request_db_queries.observe(db_count, method=request.method, route=route)
+            request_db_time.observe(db_time, method=request.method, route=route)
+            if size is not None:
+                response_size.observe(size, method=request.method, route=route)
+            profiler.end(threading.get_ident(), request.method, route, request.path, response.status_code,
+                         duration, db_count, db_time, size)
+        return response
+
+    @app.teardown_request
+    def _discard_request(exc):
+        # Żądanie przerwane wyjątkiem nie przeszło przez after_request
+        profiler.discard(threading.get_ident())
@@ -516,10 +516,12 @@ class AgentHeartbeat(db.Model):
     memory_usage = db.Column(db.Float)
     disk_usage = db.Column(db.Float)
     running_servers = db.Column(db.Integer)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     agent = db.relationship('Agent', backref=db.backref('heartbeats', lazy=True))
     
+    __table_args__ = (db.Index('ix_agent_heartbeat_agent_time', 'agent_id', 'timestamp'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -530,3 +532,47 @@ class AgentHeartbeat(db.Model):
             'running_servers': self.running_servers,
             'timestamp': self.timestamp.isoformat()
         }
+
+class ServerMetricSample(db.Model):
+    """Surowe próbki metryk serwera (krótka retencja, zwijane do MetricRollup)"""
+    id = db.Column(db.Integer, primary_key=True)
+    server_id = db.Column(db.Integer, db.ForeignKey('server.id'), nullable=False)
+    cpu_usage = db.Column(db.Float)
+    memory_mb = db.Column(db.Float)
+    tps = db.Column(db.Float)
+    players_online = db.Column(db.Integer)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (db.Index('ix_server_metric_sample_server_time', 'server_id', 'timestamp'),)
+
+class MetricRollup(db.Model):
+    """Metryka agenta/serwera zagregowana w kubełku 1 min albo 1 h.
+
+    Zamiast średniej trzymana jest suma i liczba próbek, więc kubełki
+    godzinowe i zakresy wykresów składa się z minutowych bez utraty dokładności.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(10), nullable=False)  # agent, server
+    entity_id = db.Column(db.Integer, nullable=False)
+    metric = db.Column(db.String(32), nullable=False)
+    resolution = db.Column(db.Integer, nullable=False)  # sekundy: 60 albo 3600
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    sum_value = db.Column(db.Float)
+    sample_count = db.Column(db.Integer)
+    
+    __table_args__ = (
+        db.Index('ix_metric_rollup_series', 'scope', 'entity_id', 'metric', 'resolution', 'bucket_start',
+                 unique=True),
+        db.Index('ix_metric_rollup_bucket', 'resolution', 'bucket_start'),
+    )
+    
+    def to_dict(self):
+        return {
+            'time': self.bucket_start.isoformat(),
+            'min': self.min_value,
+            'avg': self.sum_value / self.sample_count if self.sample_count else None,
+            'max': self.max_value,
+            'samples': self.sample_count
+        }
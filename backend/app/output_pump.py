@@ -0,0 +1,202 @@
+import codecs
+import os
+import selectors
+import subprocess
+import sys
+import threading
+import time
+
+
+class _PumpEntry:
+    __slots__ = ('key', 'fd', 'on_line', 'on_close', 'decoder', 'partial')
+
+    def __init__(self, key, fd, on_line, on_close):
+        self.key = key
+        self.fd = fd
+        self.on_line = on_line
+        self.on_close = on_close
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.partial = ''
+
+
+class OutputPump:
+    """Jeden wątek (selectors/epoll) czytający stdout wszystkich procesów serwerów.
+
+    Zastępuje model wątek-na-serwer: potoki są nieblokujące, dane dzielone są
+    na linie bez blokowania, a każda linia trafia do callbacku `on_line`.
+    Po EOF wywoływany jest `on_close` (w osobnym wątku, bo zwykle pisze do bazy).
+    """
+
+    def __init__(self, read_size=64 * 1024, on_round=None):
+        self.read_size = read_size
+        self.on_round = on_round
+        self._selector = selectors.DefaultSelector()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._thread = None
+
+    @staticmethod
+    def is_supported():
+        """Potoki w selectors działają tylko poza Windows"""
+        return os.name != 'nt'
+
+    def register(self, key, stream, on_line, on_close=None):
+        """Podłącz strumień (np. process.stdout) do pompy"""
+        fd = stream.fileno()
+        os.set_blocking(fd, False)
+        with self._lock:
+            self._pending.append(_PumpEntry(key, fd, on_line, on_close))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='OutputPump', daemon=True)
+                self._thread.start()
+        os.write(self._wakeup_w, b'\0')
+
+    def watched_count(self):
+        return len(self._selector.get_map()) - 1
+
+    def _apply_pending(self):
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for entry in pending:
+            self._selector.register(entry.fd, selectors.EVENT_READ, entry)
+
+    def _run(self):
+        while True:
+            events = self._selector.select(timeout=5)
+            started = time.perf_counter()
+            for selector_key, _ in events:
+                entry = selector_key.data
+                if entry is None:
+                    self._apply_pending()
+                    continue
+                try:
+                    data = os.read(entry.fd, self.read_size)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b''
+
+                if data:
+                    self._dispatch(entry, entry.decoder.decode(data))
+                else:
+                    self._finish(entry)
+            if self.on_round is not None and events:
+                # Czas obsługi jednej porcji - o tyle linie konsoli mogą się spóźnić
+                self.on_round(time.perf_counter() - started)
+
+    def _dispatch(self, entry, text):
+        text = entry.partial + text
+        lines = text.split('\n')
+        entry.partial = lines.pop()
+        for line in lines:
+            try:
+                entry.on_line(line.rstrip('\r'))
+            except Exception as e:
+                print(f"Output pump callback error ({entry.key}): {e}")
+
+    def _finish(self, entry):
+        self._selector.unregister(entry.fd)
+        tail = entry.partial + entry.decoder.decode(b'', final=True)
+        entry.partial = ''
+        if tail:
+            self._dispatch(entry, tail + '\n')
+        if entry.on_close:
+            threading.Thread(target=entry.on_close, daemon=True).start()
+
+
+def _spawn_line_generator(lines, line_length):
+    """Syntetyczny proces serwera wypisujący `lines` linii na stdout"""
+    script = (
+        "import sys\n"
+        f"line = 'x' * {line_length} + '\\n'\n"
+        "write = sys.stdout.write\n"
+        f"for i in range({lines}):\n"
+        "    write('[Server thread/INFO]: ' + str(i) + ' ' + line)\n"
+    )
+    return subprocess.Popen(
+        [sys.executable, '-c', script],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
+    )
+
+
+def benchmark_output_capture(servers=20, lines=20000, line_length=80):
+    """Porównaj wątek-na-serwer z jedną pompą selectors na syntetycznych procesach.
+
+    Zwraca słownik {tryb: {'seconds', 'lines_per_sec', 'threads'}}.
+    """
+    results = {}
+    total_lines = servers * lines
+
+    # Model dotychczasowy: jeden wątek blokujący na readline() na serwer
+    counter = [0]
+    counter_lock = threading.Lock()
+    start = time.perf_counter()
+    processes = [_spawn_line_generator(lines, line_length) for _ in range(servers)]
+    threads_before = threading.active_count()
+
+    def read_lines(process):
+        local = 0
+        for _ in iter(process.stdout.readline, ''):
+            local += 1
+        with counter_lock:
+            counter[0] += local
+
+    threads = [threading.Thread(target=read_lines, args=(p,), daemon=True) for p in processes]
+    for thread in threads:
+        thread.start()
+    peak_threads = threading.active_count() - threads_before
+    for thread in threads:
+        thread.join()
+    for process in processes:
+        process.wait()
+    elapsed = time.perf_counter() - start
+    results['threads'] = {
+        'seconds': round(elapsed, 3),
+        'lines': counter[0],
+        'lines_per_sec': int(counter[0] / elapsed) if elapsed else 0,
+        'threads': peak_threads
+    }
+
+    # Jedna pompa selectors dla wszystkich procesów
+    pump = OutputPump()
+    received = [0]
+    done = threading.Event()
+    closed = [0]
+
+    def on_line(_line):
+        received[0] += 1
+
+    def on_close():
+        with counter_lock:
+            closed[0] += 1
+            if closed[0] == servers:
+                done.set()
+
+    start = time.perf_counter()
+    processes = [_spawn_line_generator(lines, line_length) for _ in range(servers)]
+    for index, process in enumerate(processes):
+        pump.register(index, process.stdout, on_line, on_close)
+    done.wait()
+    for process in processes:
+        process.wait()
+    elapsed = time.perf_counter() - start
+    results['selector'] = {
+        'seconds': round(elapsed, 3),
+        'lines': received[0],
+        'lines_per_sec': int(received[0] / elapsed) if elapsed else 0,
+        'threads': 1
+    }
+
+    results['expected_lines'] = total_lines
+    return results
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+import psutil
+
+RECONCILE_INTERVAL = 15
+
+# Statusy ustawiane przez panel na czas startu/zatrzymania - reconciler ich nie rusza
+TRANSITIONAL_STATUSES = ('starting', 'stopping', 'restarting')
+
+
+def _cmdline_hash(process):
+    return hashlib.sha1('\0'.join(process.cmdline()).encode('utf-8', errors='ignore')).hexdigest()
+
+
+class ProcessRegistry:
+    """Tożsamość procesów serwerów uruchomionych przez panel.
+
+    Przy starcie zapisywana jest trójka (pid, create_time, hash cmdline),
+    więc PID ponownie przydzielony przez system innemu procesowi nie
+    zostanie uznany za działający serwer. Rejestr trzymany jest w pliku,
+    żeby po restarcie panelu dało się rozpoznać osierocone procesy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return {int(server_id): record for server_id, record in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._records, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving process registry: {e}")
+
+    def record(self, server_id, pid):
+        try:
+            process = psutil.Process(pid)
+            with process.oneshot():
+                record = {
+                    'pid': pid,
+                    'create_time': process.create_time(),
+                    'cmdline_hash': _cmdline_hash(process)
+                }
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+        with self._lock:
+            self._records[server_id] = record
+            self._save()
+        return record
+
+    def forget(self, server_id, pid=None):
+        with self._lock:
+            record = self._records.get(server_id)
+            if record is None or (pid is not None and record['pid'] != pid):
+                return
+            del self._records[server_id]
+            self._save()
+
+    def get(self, server_id):
+        return self._records.get(server_id)
+
+    def is_alive(self, server_id, pid=None, check_cmdline=False):
+        """Czy zarejestrowany proces serwera nadal działa (i jest tym samym procesem).
+
+        Porównanie create_time to jeden odczyt /proc; `check_cmdline`
+        dodatkowo sprawdza linię poleceń - przy przejmowaniu procesu.
+        """
+        record = self._records.get(server_id)
+        if record is None or (pid is not None and record['pid'] != pid):
+            return False
+        try:
+            process = psutil.Process(record['pid'])
+            if abs(process.create_time() - record['create_time']) > 0.01:
+                return False
+            if process.status() == psutil.STATUS_ZOMBIE:
+                return False
+            return not check_cmdline or _cmdline_hash(process) == record['cmdline_hash']
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+
+
+class StatusReconciler:
+    """Jedyne miejsce, które poprawia Server.status/pid na podstawie stanu procesów.
+
+    Żądania GET tylko czytają; gdy zauważą rozbieżność, budzą reconciler
+    przez `wake()`. `collect(servers)` zwraca {server_id: stan} jak przy
+    statusie zbiorczym; zapis następuje wyłącznie przy faktycznej zmianie
+    running <-> stopped, jednym commitem na rundę.
+    """
+
+    def __init__(self, collect, interval=RECONCILE_INTERVAL):
+        self.collect = collect
+        self.interval = interval
+        self._app = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        with self._lock:
+            self._app = app
+            if self._thread is None:
+                self.interval = app.config.get('RECONCILE_INTERVAL', self.interval)
+                self._thread = threading.Thread(target=self._run, name='StatusReconciler', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                with self._app.app_context():
+                    self.reconcile()
+            except Exception as e:
+                print(f"Error reconciling server status: {e}")
+
+    def reconcile(self):
+        from .models import db, Server
+
+        servers = [server for server in Server.query.all() if server.status not in TRANSITIONAL_STATUSES]
+        states = self.collect(servers)
+        changed = 0
+        for server in servers:
+            state = states.get(server.id)
+            if state is None or state.get('status') == 'unknown':
+                # Agent niedostępny to nie dowód, że serwer stoi
+                continue
+            if state['is_running'] and (server.status != 'running' or server.pid != state.get('pid')):
+                server.status = 'running'
+                server.pid = state.get('pid')
+                changed += 1
+            elif not state['is_running'] and (server.status == 'running' or server.pid is not None):
+                server.status = 'stopped'
+                server.pid = None
+                changed += 1
+        if changed:
+            db.session.commit()
+        return changed
@@ -0,0 +1,193 @@
+import functools
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JOB_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800)
+LAG_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _labels(self.labelnames, key, ('le', _number(float(bound))))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {round(total, 6)}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+def gauge_family(name, documentation, samples, labelnames=()):
+    """Rodzina gauge z gotowych próbek [(wartości etykiet, wartość)] - dla kolektorów"""
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} gauge']
+    for label_values, value in samples:
+        if value is None:
+            continue
+        lines.append(f'{name}{_labels(labelnames, label_values)} {_number(value)}')
+    return lines
+
+
+class MetricsRegistry:
+    """Metryki w formacie tekstowym Prometheusa.
+
+    Liczniki i histogramy aktualizowane są na bieżąco; kolektory wołane przy
+    scrapowaniu czytają tylko gotowe dane z pamięci (sampler, prober, ...).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """`collector()` zwraca listę linii (np. z gauge_family)"""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                lines.append(f'# collector {getattr(collector, "__name__", collector)} failed: {_escape(e)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+request_latency = registry.histogram(
+    'mcpanel_http_request_duration_seconds', 'HTTP request latency per route.',
+    ('method', 'route', 'status'))
+db_queries = registry.counter(
+    'mcpanel_db_queries_total', 'SQL statements executed by the panel.')
+request_db_queries = registry.histogram(
+    'mcpanel_http_request_db_queries', 'SQL statements executed per request.',
+    ('method', 'route'), buckets=QUERY_COUNT_BUCKETS)
+request_db_time = registry.histogram(
+    'mcpanel_http_request_db_seconds', 'Time spent in SQL statements per request.',
+    ('method', 'route'))
+response_size = registry.histogram(
+    'mcpanel_http_response_size_bytes', 'Size of non-streamed responses.',
+    ('method', 'route'), buckets=SIZE_BUCKETS)
+job_duration = registry.histogram(
+    'mcpanel_job_duration_seconds', 'Duration of download and backup jobs.',
+    ('job', 'outcome'), buckets=JOB_BUCKETS)
+capture_lag = registry.histogram(
+    'mcpanel_output_capture_round_seconds', 'Time the output pump spends dispatching one batch of console output.',
+    buckets=LAG_BUCKETS)
+
+
+def _failed(result):
+    if result is False:
+        return True
+    if isinstance(result, tuple) and result:
+        if result[0] is False:
+            return True
+        return len(result) > 1 and isinstance(result[1], int) and result[1] >= 400
+    return False
+
+
+def timed_job(job):
+    """Dekorator mierzący czas zadania.
+
+    Za błąd uznawany jest wyjątek, wynik False, krotka (False, ...) oraz
+    odpowiedź widoku z kodem >= 400.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            outcome = 'error'
+            try:
+                result = func(*args, **kwargs)
+                outcome = 'error' if _failed(result) else 'ok'
+                return result
+            finally:
+                job_duration.observe(time.monotonic() - started, job=job, outcome=outcome)
+        return wrapper
+    return decorator
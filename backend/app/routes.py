@@ -1,8 +1,25 @@
-from flask import Blueprint, request, jsonify, current_app, send_file
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app, send_file, Response
+from flask_jwt_extended import jwt_required, get_jwt_identity, decode_token
 from .models import db, User, Server, Permission, BedrockVersion, Addon, UserSession, Agent
 from .managers import server_manager, file_manager
 from .bedrock_manager import BedrockAddonManager
+from .event_bus import event_bus
+from .dashboard import ServerStateMonitor, process_metrics, stream_dashboard_sse
+from .metrics_sampler import HISTORY_WINDOWS
+from .server_prober import BEDROCK_DEFAULT_PORT, JAVA_DEFAULT_PORT, ServerProber
+from .process_registry import StatusReconciler
+from .metrics_history import (
+    AGENT_METRICS as AGENT_HISTORY_METRICS, HISTORY_RANGES, MAX_POINTS, SERVER_METRICS as SERVER_HISTORY_METRICS,
+    MetricsHistory
+)
+from .prometheus import CONTENT_TYPE, gauge_family, registry as metrics_registry, timed_job
+from .middleware import profiler
+from .downloader import DownloadError
+from .download_scheduler import PRIORITY_NORMAL
+from .console_stream import (
+    console_sock, agent_console_relays, iter_console_batches, stream_console_sse
+)
+from urllib.parse import urlparse
 from zoneinfo import ZoneInfo
 from datetime import datetime, timedelta
 from functools import wraps
@@ -11,10 +28,13 @@ import requests
 import shutil
 import logging
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 import threading
 import time
 import uuid
 import zipfile
+import json
+import re
 
 # Configure logging
 logging.basicConfig(
@@ -29,7 +49,7 @@ installation_progress = {}
 
 def get_bedrock_manager():
     from flask import current_app
-    return BedrockAddonManager(current_app.config['SERVER_BASE_PATH'])
+    return BedrockAddonManager(current_app.config['SERVER_BASE_PATH'], downloader=server_manager.downloader)
 
 def _get_agent_client(server_id=None, agent_id=None):
     """Pobiera klienta agenta dla serwera lub agenta"""
@@ -60,7 +80,8 @@ class AgentClient:
         """Wykonuje zapytanie do agenta"""
         try:
             url = f"{self.base_url}{endpoint}"
-            response = requests.request(method, url, headers=self.headers, timeout=30, **kwargs)
+            kwargs.setdefault('timeout', 30)
+            response = requests.request(method, url, headers=self.headers, **kwargs)
             
             if response.status_code == 200:
                 return True, response.json()
@@ -91,21 +112,56 @@ class AgentClient:
         """Wysyła komendę do serwera"""
         return self._make_request('POST', f'/server/{server_name}/command', json={'command': command})
     
-    def get_console(self, server_name, lines=100):
-        """Pobiera konsolę serwera"""
-        return self._make_request('GET', f'/server/{server_name}/console?lines={lines}')
+    def get_console(self, server_name, lines=100, since=None):
+        """Pobiera konsolę serwera (z kursorem `since` tylko nowe linie)"""
+        params = {'lines': lines}
+        if since is not None:
+            params['since'] = since
+        return self._make_request('GET', f'/server/{server_name}/console', params=params)
+    
+    def console_stream_url(self, server_name):
+        """URL strumienia SSE konsoli serwera na agencie"""
+        return f"{self.base_url}/server/{server_name}/console/stream"
     
     def get_server_status(self, server_name):
         """Pobiera status serwera"""
         return self._make_request('GET', f'/server/{server_name}/status')
     
+    def get_servers_status(self, server_names, timeout=30):
+        """Pobiera status wielu serwerów jednym zapytaniem"""
+        success, result = self._make_request('POST', '/servers/status',
+                                             json={'servers': server_names}, timeout=timeout)
+        if success:
+            return True, result.get('servers', {})
+        return False, result
+    
     def install_server(self, server_data):
         """Instaluje serwer na agencie"""
         return self._make_request('POST', '/server/install', json=server_data)
     
-    def get_server_logs(self, server_name, lines=100):
+    def get_server_logs(self, server_name, lines=100, before=None):
         """Pobiera logi serwera"""
-        return self._make_request('GET', f'/logs/server/{server_name}?lines={lines}')
+        params = {'lines': lines}
+        if before is not None:
+            params['before'] = before
+        return self._make_request('GET', f'/logs/server/{server_name}', params=params)
+        
+    def get_server_logs_window(self, server_name, start=None, end=None, limit=1000):
+        """Pobiera logi serwera z okna czasowego (łącznie z archiwum)"""
+        params = {'limit': limit}
+        if start is not None:
+            params['from'] = start
+        if end is not None:
+            params['to'] = end
+        return self._make_request('GET', f'/logs/server/{server_name}/window', params=params)
+        
+    def search_server_logs(self, server_name, query=None, regex=None, start=None, end=None, limit=200):
+        """Przeszukuje indeks logów serwera na agencie"""
+        params = {'limit': limit}
+        for key, value in (('q', query), ('regex', regex), ('from', start), ('to', end)):
+            if value is not None:
+                params[key] = value
+        return self._make_request('GET', f'/logs/server/{server_name}/search', params=params)
         
     def check_server_files(self, server_name):
         """Sprawdza czy serwer ma pliki na agencie"""
@@ -313,11 +369,13 @@ def delete_server(server_id):
                 if os.path.exists(server_path):
                     logger.info(f"Deleting local server directory: {server_path}")
                     shutil.rmtree(server_path)
+                server_manager.disk_usage.forget(server_path)
             except Exception as e:
                 logger.error(f"Could not delete local server directory: {e}")
         
         # Usuń uprawnienia użytkowników
         Permission.query.filter_by(server_id=server_id).delete()
+        metrics_history.forget('server', server_id)
         
         # Usuń serwer z bazy danych
         db.session.delete(server)
@@ -1139,6 +1197,50 @@ def delete_bedrock_version(version_id):
     
     return jsonify({'message': 'Version deleted successfully'})
     
+@main.route('/servers/status', methods=['GET'])
+@jwt_required()
+def get_servers_status():
+    """Status, PID, uptime, gracze i metryki wszystkich widocznych serwerów w jednym żądaniu"""
+    started = time.perf_counter()
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if user.role == 'admin':
+        servers = Server.query.all()
+    else:
+        servers = Server.query.join(Permission).filter(
+            Permission.user_id == current_user_id
+        ).all()
+    
+    server_prober.start(current_app._get_current_object())
+    status_reconciler.start(current_app._get_current_object())
+    metrics_history.start(current_app._get_current_object())
+    states = _collect_server_states(servers)
+    
+    result = {}
+    for server in servers:
+        state = states[server.id]
+        metrics = state.pop('metrics', None)
+        ping = server_prober.get(server.id)
+        reachable = bool(ping and ping.get('reachable'))
+        if not state['is_running']:
+            players_online = 0
+        else:
+            players_online = ping['players_online'] if reachable else (server.player_count or 0)
+        state.update({
+            'database_status': server.status,
+            'uptime': metrics.get('uptime') if metrics else None,
+            'players_online': players_online,
+            'max_players': ping['max_players'] if reachable else server.max_players,
+            'metrics': metrics
+        })
+        result[server.id] = state
+    
+    return jsonify({
+        'servers': result,
+        'took_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+    
 @main.route('/servers/<int:server_id>/real-status', methods=['GET'])
 @jwt_required()
 def get_real_server_status(server_id):
@@ -1148,6 +1250,9 @@ def get_real_server_status(server_id):
     if not _check_permission(current_user_id, server_id, 'view'):
         return jsonify({'error': 'Access denied'}), 403
     
+    # Tylko odczyt - rozbieżność z bazą poprawia StatusReconciler
+    status_reconciler.start(current_app._get_current_object())
+    
     if server.agent_id:
         agent_client = _get_agent_client(server_id=server_id)
         if not agent_client:
@@ -1158,45 +1263,29 @@ def get_real_server_status(server_id):
         if success:
             agent_status = result.get('status', {})
             is_running = agent_status.get('running', False)
-            
-            # Zaktualizuj status w bazie danych
-            if is_running and server.status != 'running':
-                server.status = 'running'
-                server.pid = agent_status.get('pid')
-                db.session.commit()
-            elif not is_running and server.status != 'stopped':
-                server.status = 'stopped'
-                server.pid = None
-                db.session.commit()
+            if is_running != (server.status == 'running'):
+                status_reconciler.wake()
             
             return jsonify({
                 'database_status': server.status,
                 'real_status': agent_status,
                 'is_running': is_running,
-                'pid': server.pid,
+                'pid': agent_status.get('pid') if is_running else None,
                 'source': 'agent'
             })
         else:
             return jsonify({'error': f'Agent error: {result}'}), 500
     else:
         # Lokalny status
-        real_status = server_manager.get_server_status(server_id)
-        
-        if real_status['running'] and server.status != 'running':
-            server.status = 'running'
-            if real_status.get('pid'):
-                server.pid = real_status['pid']
-            db.session.commit()
-        elif not real_status['running'] and server.status != 'stopped':
-            server.status = 'stopped'
-            server.pid = None
-            db.session.commit()
+        real_status = server_manager.get_server_status(server_id, server.pid)
+        if real_status['running'] != (server.status == 'running'):
+            status_reconciler.wake()
         
         return jsonify({
             'database_status': server.status,
             'real_status': real_status,
             'is_running': real_status['running'],
-            'pid': server.pid,
+            'pid': real_status.get('pid'),
             'source': 'local'
         })
     
@@ -1210,24 +1299,116 @@ def get_server_logs(server_id):
         return jsonify({'error': 'Access denied'}), 403
     
     lines = request.args.get('lines', 100, type=int)
+    before = request.args.get('before', type=int)
+    
+    # Okno czasowe (?from=...&to=...) - czytane także z archiwum logów
+    if 'from' in request.args or 'to' in request.args:
+        try:
+            start = _parse_time_arg(request.args.get('from'))
+            end = _parse_time_arg(request.args.get('to'))
+        except ValueError:
+            return jsonify({'error': 'Invalid time range'}), 400
+        limit = request.args.get('limit', 1000, type=int)
+        
+        if server.agent_id:
+            agent_client = _get_agent_client(server_id=server_id)
+            if not agent_client:
+                return jsonify({'error': 'Agent not available'}), 500
+            success, result = agent_client.get_server_logs_window(server.name, start, end, limit)
+            if not success:
+                return jsonify({'error': f'Agent error: {result}'}), 500
+            window = {'lines': result.get('logs', []), 'truncated': result.get('truncated', False)}
+        else:
+            window, error = server_manager.get_server_logs_window(server.name, start, end, limit)
+            if error:
+                return jsonify({'error': error}), 500
+        
+        return jsonify({
+            'output': ''.join(window['lines']),
+            'lines': len(window['lines']),
+            'truncated': window['truncated']
+        })
     
     if server.agent_id:
         agent_client = _get_agent_client(server_id=server_id)
         if not agent_client:
             return jsonify({'error': 'Agent not available'}), 500
         
-        success, result = agent_client.get_server_logs(server.name, lines)
+        success, result = agent_client.get_server_logs(server.name, lines, before)
         
         if success:
             logs = result.get('logs', [])
-            return jsonify({'output': ''.join(logs)})
+            return jsonify({
+                'output': ''.join(logs),
+                'start': result.get('start'),
+                'has_more': result.get('has_more', False)
+            })
         else:
             return jsonify({'error': f'Agent error: {result}'}), 500
     else:
-        logs, error = server_manager.get_server_logs(server.name)
+        result, error = server_manager.get_server_logs(server.name, lines, before)
+        if error:
+            return jsonify({'error': error}), 500
+        return jsonify({
+            'output': ''.join(result['lines']),
+            'start': result['start'],
+            'has_more': result['has_more']
+        })
+    
+@main.route('/servers/<int:server_id>/logs/search', methods=['GET'])
+@jwt_required()
+def search_server_logs(server_id):
+    """Wyszukiwanie w bieżących i zarchiwizowanych logach (?q=, ?regex=, ?from=, ?to=)"""
+    current_user_id = get_jwt_identity()
+    server = Server.query.get_or_404(server_id)
+    
+    if not _check_permission(current_user_id, server_id, 'can_edit_files'):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    query = request.args.get('q', '').strip() or None
+    regex = request.args.get('regex') or None
+    limit = min(request.args.get('limit', 200, type=int), 5000)
+    try:
+        start = _parse_time_arg(request.args.get('from'))
+        end = _parse_time_arg(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'Invalid time range'}), 400
+    if regex:
+        try:
+            re.compile(regex)
+        except re.error as e:
+            return jsonify({'error': f'Invalid regex: {e}'}), 400
+    
+    if server.agent_id:
+        agent_client = _get_agent_client(server_id=server_id)
+        if not agent_client:
+            return jsonify({'error': 'Agent not available'}), 500
+        success, result = agent_client.search_server_logs(server.name, query, regex, start, end, limit)
+        if not success:
+            return jsonify({'error': f'Agent error: {result}'}), 500
+    else:
+        result, error = server_manager.search_server_logs(server.name, query, regex, start, end, limit)
         if error:
             return jsonify({'error': error}), 500
-        return jsonify({'output': logs})
+    
+    return jsonify(result)
+    
+@main.route('/servers/<int:server_id>/events', methods=['GET'])
+@jwt_required()
+def get_server_events(server_id):
+    """Stan serwera wyliczony z konsoli: gracze, gotowość, ostrzeżenia o opóźnieniu"""
+    current_user_id = get_jwt_identity()
+    server = Server.query.get_or_404(server_id)
+    
+    if not _check_permission(current_user_id, server_id, 'view'):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # Zdarzenia parsowane są tylko dla serwerów uruchomionych przez panel
+    state = None if server.agent_id else \
+        server_manager.get_server_events(server_id, min(request.args.get('limit', 50, type=int), 200))
+    if state is None:
+        return jsonify({'available': False})
+    return jsonify({'available': True, **state})
     
 @main.route('/servers/<int:server_id>/command', methods=['POST'])
 @jwt_required()
@@ -1272,12 +1453,429 @@ def get_realtime_output(server_id):
     if not _check_permission(current_user_id, server_id, 'can_edit_files'):
         return jsonify({'error': 'Access denied'}), 403
     
+    since = request.args.get('since', type=int)
+    lines = request.args.get('lines', 100, type=int)
+    
     # Get real-time output from server manager
     try:
-        output = server_manager.get_realtime_output(server_id)
-        return jsonify({'output': output})
+        if since is not None:
+            return jsonify(_incremental_output(server_manager.get_output_since(server_id, since, lines)))
+        output = server_manager.get_realtime_output(server_id, lines)
+        return jsonify({'output': output, 'next': server_manager.get_output_cursor(server_id)})
     except Exception as e:
         return jsonify({'error': f'Error getting output: {str(e)}'}), 500
+
+def _parse_time_arg(value):
+    """Czas z parametru zapytania: epoch w sekundach albo data ISO (czas lokalny)"""
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def _incremental_output(result):
+    """Odpowiedź dla odpytywania przyrostowego konsoli"""
+    result['output'] = ''.join(result['lines'])
+    return result
+    
+def _get_console_source(server):
+    """Zwraca funkcję otwierającą źródło konsoli: (get_buffer, on_close).
+
+    Serwery lokalne czytają bezpośrednio z bufora ServerManagera, a serwery
+    na agentach ze wspólnego przekaźnika (jedno połączenie z agentem na serwer).
+    """
+    server_id = server.id
+    
+    if server.agent_id:
+        agent_client = _get_agent_client(server_id=server_id)
+        if not agent_client:
+            return None
+        url = agent_client.console_stream_url(server.name)
+        headers = dict(agent_client.headers)
+        
+        def open_agent_source():
+            relay = agent_console_relays.acquire(
+                server_id, url, headers, server_manager.console_buffer_lines
+            )
+            return (lambda: relay.buffer), (lambda: agent_console_relays.release(relay))
+        
+        return open_agent_source
+    
+    return lambda: ((lambda: server_manager._get_console_buffer(server_id)), None)
+
+@main.route('/servers/<int:server_id>/console/stream', methods=['GET'])
+@jwt_required()
+def stream_console(server_id):
+    """Strumień SSE nowych linii konsoli (zamiast odpytywania co 2-3 sekundy)"""
+    current_user_id = get_jwt_identity()
+    server = Server.query.get_or_404(server_id)
+    
+    if not _check_permission(current_user_id, server_id, 'can_edit_files'):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = request.headers.get('Last-Event-ID', type=int)
+    lines = request.args.get('lines', 100, type=int)
+    
+    open_source = _get_console_source(server)
+    if open_source is None:
+        return jsonify({'error': 'Agent not available'}), 500
+    
+    response = Response(
+        stream_console_sse(open_source, since=since, backlog=lines),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+AGENT_STATUS_TIMEOUT = 5
+
+def _local_server_state(server):
+    real_status = server_manager.get_server_status(server.id, server.pid)
+    is_running = real_status['running']
+    pid = real_status['pid']
+    return {
+        'is_running': is_running,
+        'status': 'running' if is_running else 'stopped',
+        'pid': pid,
+        'source': 'local',
+        'metrics': (server_manager.metrics.latest(server.id) or process_metrics(pid))
+        if is_running else None
+    }
+
+def _agent_server_state(status):
+    is_running = status.get('running', False)
+    return {
+        'is_running': is_running,
+        'status': 'running' if is_running else 'stopped',
+        'pid': status.get('pid'),
+        'source': 'agent',
+        'metrics': status.get('metrics')
+    }
+
+def _unavailable_state(error):
+    return {'is_running': False, 'status': 'unknown', 'pid': None, 'source': 'agent', 'error': error}
+
+def _fetch_agent_statuses(agent_client, server_names):
+    """Statusy serwerów jednego agenta; starsze agenty bez /servers/status pytane po kolei"""
+    success, result = agent_client.get_servers_status(server_names, timeout=AGENT_STATUS_TIMEOUT)
+    if success or 'Agent error 404' not in str(result):
+        return success, result
+    statuses = {}
+    for name in server_names:
+        success, result = agent_client.get_server_status(name)
+        if success:
+            statuses[name] = result.get('status', {})
+    return True, statuses
+
+def _collect_server_states(servers):
+    """Stan serwerów bez zapisów do bazy - każdy agent pytany raz, wszyscy agenci równolegle"""
+    states = {}
+    by_agent = {}
+    for server in servers:
+        if server.agent_id:
+            by_agent.setdefault(server.agent_id, []).append(server)
+        else:
+            states[server.id] = _local_server_state(server)
+    if not by_agent:
+        return states
+    
+    agents = {agent.id: agent for agent in Agent.query.filter(Agent.id.in_(list(by_agent))).all()}
+    jobs = []
+    with ThreadPoolExecutor(max_workers=min(len(by_agent), 16)) as pool:
+        for agent_id, agent_servers in by_agent.items():
+            agent = agents.get(agent_id)
+            if agent is None or not agent.is_active:
+                for server in agent_servers:
+                    states[server.id] = _unavailable_state('Agent not available')
+                continue
+            names = [server.name for server in agent_servers]
+            jobs.append((pool.submit(_fetch_agent_statuses, AgentClient(agent), names), agent_servers))
+        
+        for future, agent_servers in jobs:
+            success, result = future.result()
+            for server in agent_servers:
+                if not success:
+                    states[server.id] = _unavailable_state(result)
+                elif server.name not in result:
+                    states[server.id] = _unavailable_state('No status from agent')
+                else:
+                    states[server.id] = _agent_server_state(result[server.name])
+    return states
+
+def _probe_server_states(server_ids):
+    """Stan i metryki serwerów dla monitora panelu (bez zapisów do bazy)"""
+    return _collect_server_states(Server.query.filter(Server.id.in_(server_ids)).all())
+
+dashboard_monitor = ServerStateMonitor(event_bus, _probe_server_states)
+status_reconciler = StatusReconciler(_collect_server_states)
+
+def _collect_server_metrics():
+    """Metryki serwerów i agentów z pamięci podręcznych samplera, pomiaru ticków i pingu"""
+    names = dict(Server.query.with_entities(Server.id, Server.name).all())
+    labels = ('server_id', 'server')
+    
+    def family(name, documentation, values):
+        return gauge_family(name, documentation,
+                            [((server_id, names.get(server_id, '')), value) for server_id, value in values.items()],
+                            labels)
+    
+    samples = server_manager.metrics.latest_all()
+    ticks = server_manager.tick_health.latest_all()
+    pings = server_prober.results()
+    lines = []
+    lines += family('mcpanel_server_cpu_percent', 'CPU usage of the server process.',
+                    {sid: sample['cpu_percent'] for sid, sample in samples.items()})
+    lines += family('mcpanel_server_memory_rss_bytes', 'Resident memory of the server process.',
+                    {sid: sample['memory_rss'] for sid, sample in samples.items()})
+    lines += family('mcpanel_server_threads', 'Threads of the server process.',
+                    {sid: sample['threads'] for sid, sample in samples.items()})
+    lines += family('mcpanel_server_open_fds', 'Open file descriptors of the server process.',
+                    {sid: sample['open_fds'] for sid, sample in samples.items()})
+    cgroups = {sid: sample['cgroup'] for sid, sample in samples.items() if sample.get('cgroup')}
+    for resource in ('cpu', 'memory', 'io'):
+        lines += family(f'mcpanel_server_{resource}_pressure_some', f'Share of time (avg10) tasks of the server cgroup stalled on {resource}.',
+                        {sid: cgroup['pressure'][resource].get('some') for sid, cgroup in cgroups.items()})
+    lines += family('mcpanel_server_cpu_throttled_seconds', 'Time the server cgroup was throttled by cpu.max.',
+                    {sid: cgroup['cpu_throttled_usec'] / 1e6 for sid, cgroup in cgroups.items()})
+    lines += family('mcpanel_server_oom_kills', 'OOM kills inside the server cgroup.',
+                    {sid: cgroup['oom_kills'] for sid, cgroup in cgroups.items()})
+    lines += family('mcpanel_server_tps', 'Measured ticks per second.',
+                    {sid: tick.get('tps') for sid, tick in ticks.items()})
+    lines += family('mcpanel_server_mspt', 'Measured milliseconds per tick.',
+                    {sid: tick.get('mspt') for sid, tick in ticks.items()})
+    lines += family('mcpanel_server_reachable', 'Whether the game port answered the last ping.',
+                    {sid: int(bool(ping.get('reachable'))) for sid, ping in pings.items()})
+    lines += family('mcpanel_server_players_online', 'Players online reported by the game port.',
+                    {sid: ping.get('players_online') for sid, ping in pings.items()})
+    lines += family('mcpanel_server_max_players', 'Player slots reported by the game port.',
+                    {sid: ping.get('max_players') for sid, ping in pings.items()})
+    lines += family('mcpanel_server_ping_latency_seconds', 'Latency of the last game port ping.',
+                    {sid: ping['latency_ms'] / 1000 for sid, ping in pings.items() if ping.get('latency_ms') is not None})
+    
+    agents = Agent.query.all()
+    agent_labels = ('agent_id', 'agent')
+    for name, documentation, value in (
+            ('mcpanel_agent_up', 'Whether the agent is online.', lambda a: int(a.status == 'online')),
+            ('mcpanel_agent_cpu_percent', 'Last CPU usage reported by the agent.', lambda a: a.cpu_usage),
+            ('mcpanel_agent_memory_percent', 'Last memory usage reported by the agent.', lambda a: a.memory_usage),
+            ('mcpanel_agent_disk_percent', 'Last disk usage reported by the agent.', lambda a: a.disk_usage),
+            ('mcpanel_agent_running_servers', 'Servers running on the agent.', lambda a: a.running_servers)):
+        lines += gauge_family(name, documentation, [((a.id, a.name), value(a)) for a in agents], agent_labels)
+    
+    lines += gauge_family('mcpanel_metrics_sampler_round_seconds', 'Duration of the last process sampling round.',
+                          [((), server_manager.metrics.last_round_ms / 1000
+                            if server_manager.metrics.last_round_ms is not None else None)])
+    downloads = server_manager.downloader.snapshot()
+    lines += gauge_family('mcpanel_downloads_active', 'Downloads currently holding a scheduler slot.',
+                          [((), len(downloads['active']))])
+    lines += gauge_family('mcpanel_downloads_queued', 'Downloads waiting for a scheduler slot.',
+                          [((), len(downloads['queued']))])
+    return lines
+
+metrics_registry.register_collector(_collect_server_metrics)
+
+@main.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Metryki w formacie Prometheusa (METRICS_TOKEN; bez tokenu tylko z localhost przy METRICS_ALLOW_LOCALHOST)"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return jsonify({'error': 'Unauthorized'}), 401
+    elif not current_app.config.get('METRICS_ALLOW_LOCALHOST'):
+        # Za reverse proxy na tym samym hoście każde żądanie przychodzi z localhost
+        return jsonify({'error': 'Set METRICS_TOKEN to enable metrics'}), 403
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': 'Set METRICS_TOKEN to scrape metrics remotely'}), 403
+    
+    return Response(metrics_registry.render(), mimetype=CONTENT_TYPE)
+
+@main.route('/admin/perf/routes', methods=['GET'])
+@jwt_required()
+def get_route_performance():
+    """Czas, zapytania SQL i rozmiar odpowiedzi per trasa oraz ostatnie wolne żądania (?sort=total|p95|count|db_queries|db_time|bytes)"""
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(profiler.summary(request.args.get('sort', 'total')))
+
+@main.route('/admin/downloads', methods=['GET'])
+@jwt_required()
+def get_download_queue():
+    """Kolejka pobierań: aktywne i oczekujące pliki, limity współbieżności i przepustowości"""
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(server_manager.downloader.snapshot())
+
+def _game_port_targets():
+    """Adresy portów gry działających serwerów dla ServerProber"""
+    targets = {}
+    for server in Server.query.filter_by(status='running').all():
+        kind = 'bedrock' if server.type == 'bedrock' else 'java'
+        port = server.port or (BEDROCK_DEFAULT_PORT if kind == 'bedrock' else JAVA_DEFAULT_PORT)
+        if server.agent_id:
+            host = server.address or (urlparse(server.agent.url).hostname if server.agent else None)
+        else:
+            host = '127.0.0.1'
+        if host:
+            targets[server.id] = (kind, host, port)
+    return targets
+
+def _store_player_counts(results):
+    """Zapisz zmienione liczby graczy w Server.player_count (jeden commit na rundę)"""
+    changed = False
+    for server in Server.query.filter(Server.id.in_(list(results))).all():
+        result = results[server.id]
+        if not result.get('reachable'):
+            continue
+        if server.player_count != result['players_online'] or server.max_players != result['max_players']:
+            server.player_count = result['players_online']
+            server.max_players = result['max_players']
+            changed = True
+    if changed:
+        db.session.commit()
+
+server_prober = ServerProber(event_bus, _game_port_targets, on_results=_store_player_counts)
+
+def _history_server_metrics():
+    """Bieżące metryki serwerów z pamięci podręcznych do MetricsHistory"""
+    metrics = {}
+    for server_id, sample in server_manager.metrics.latest_all().items():
+        metrics.setdefault(server_id, {}).update(cpu_usage=sample['cpu_percent'], memory_mb=sample['memory_mb'])
+    for server_id, tick in server_manager.tick_health.latest_all().items():
+        metrics.setdefault(server_id, {})['tps'] = tick.get('tps')
+    for server_id, ping in server_prober.results().items():
+        if ping.get('reachable'):
+            metrics.setdefault(server_id, {})['players_online'] = ping.get('players_online')
+    return metrics
+
+metrics_history = MetricsHistory(_history_server_metrics)
+
+def _history_request(scope, entity_id):
+    """Zakres z ?range= albo ?start=&end= (sekundy epoki), metryki z ?metrics=a,b"""
+    now = datetime.utcnow()
+    try:
+        if request.args.get('start'):
+            start = datetime.utcfromtimestamp(float(request.args['start']))
+            end = datetime.utcfromtimestamp(float(request.args['end'])) if request.args.get('end') else now
+        else:
+            span = HISTORY_RANGES.get(request.args.get('range', '1h'))
+            if span is None:
+                return jsonify({'error': f"Invalid range, expected one of: {', '.join(HISTORY_RANGES)}"}), 400
+            start, end = now - timedelta(seconds=span), now
+        points = min(int(request.args.get('points', MAX_POINTS)), MAX_POINTS * 4)
+    except (ValueError, OverflowError, OSError):
+        return jsonify({'error': 'Invalid start, end or points'}), 400
+    if start >= end or points < 1:
+        return jsonify({'error': 'Invalid time range'}), 400
+    
+    metrics_history.start(current_app._get_current_object())
+    metrics = [name for name in request.args.get('metrics', '').split(',') if name] or \
+        list(AGENT_HISTORY_METRICS if scope == 'agent' else SERVER_HISTORY_METRICS)
+    result = metrics_history.query(scope, entity_id, metrics, start, end, points)
+    result.update({'start': start.isoformat(), 'end': end.isoformat()})
+    return jsonify(result)
+
+@main.route('/dashboard/stream', methods=['GET'])
+@jwt_required()
+def stream_dashboard():
+    """Jeden strumień SSE ze statusem, metrykami i (opcjonalnie) konsolą wielu serwerów.
+
+    ?servers=1,2,3 wybiera serwery (domyślnie wszystkie dostępne), ?console=1
+    dołącza linie konsoli. Uprawnienia sprawdzane są raz, przy subskrypcji.
+    """
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if user.role == 'admin':
+        visible = {server.id: None for server in Server.query.all()}
+    else:
+        visible = {perm.server_id: perm for perm in Permission.query.filter_by(user_id=current_user_id).all()}
+    
+    requested = request.args.get('servers')
+    if requested:
+        try:
+            server_ids = {int(value) for value in requested.split(',') if value.strip()}
+        except ValueError:
+            return jsonify({'error': 'Invalid server list'}), 400
+        server_ids &= set(visible)
+    else:
+        server_ids = set(visible)
+    
+    console_ids = set()
+    agent_sources = []
+    if request.args.get('console', '0').lower() in ('1', 'true'):
+        console_ids = {server_id for server_id in server_ids
+                       if visible[server_id] is None or visible[server_id].can_edit_files}
+        # Serwery na agentach - przekaźnik konsoli publikuje linie na szynę zdarzeń
+        for server in Server.query.filter(Server.id.in_(console_ids), Server.agent_id.isnot(None)).all():
+            open_source = _get_console_source(server)
+            if open_source is not None:
+                agent_sources.append(open_source)
+    
+    dashboard_monitor.start(current_app._get_current_object())
+    server_prober.start(current_app._get_current_object())
+    status_reconciler.start(current_app._get_current_object())
+    metrics_history.start(current_app._get_current_object())
+    
+    def open_subscription():
+        releases = [open_source()[1] for open_source in agent_sources]
+        
+        def close_sources():
+            for release in releases:
+                release()
+        
+        return event_bus.subscribe(server_ids, console_ids), close_sources
+    
+    response = Response(
+        stream_dashboard_sse(open_subscription),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+if console_sock is not None:
+    @console_sock.route('/servers/<int:server_id>/console/ws')
+    def console_websocket(ws, server_id):
+        """Kanał WebSocket konsoli - token JWT przekazywany jako ?token="""
+        try:
+            current_user_id = decode_token(request.args.get('token', ''))['sub']
+        except Exception:
+            ws.close()
+            return
+        
+        server = Server.query.get(server_id)
+        if not server or not _check_permission(current_user_id, server_id, 'can_edit_files'):
+            ws.close()
+            return
+        
+        open_source = _get_console_source(server)
+        if open_source is None:
+            ws.close()
+            return
+        
+        get_buffer, on_close = open_source()
+        try:
+            for batch in iter_console_batches(
+                get_buffer,
+                since=request.args.get('since', type=int),
+                backlog=request.args.get('lines', 100, type=int)
+            ):
+                ws.send(json.dumps(batch if batch is not None else {'event': 'keepalive'}))
+        finally:
+            if on_close:
+                on_close()
     
 # Endpointy do zarządzania addonami
 @main.route('/addons', methods=['GET'])
@@ -1738,6 +2336,18 @@ def get_addon_types():
         'minecraft_versions': ['1.20.15','1.20.10','1.20.1']
     })
 
+@main.route('/servers/<int:server_id>/history', methods=['GET'])
+@jwt_required()
+def get_server_history(server_id):
+    """Historia metryk serwera do wykresów (?range=24h albo ?start=&end=, ?metrics=, ?points=)"""
+    current_user_id = get_jwt_identity()
+    server = Server.query.get_or_404(server_id)
+    
+    if not _check_permission(current_user_id, server_id, 'view'):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return _history_request('server', server.id)
+
 @main.route('/servers/<int:server_id>/performance', methods=['GET'])
 @jwt_required()
 def get_server_performance(server_id):
@@ -1748,10 +2358,11 @@ def get_server_performance(server_id):
     if not _check_permission(current_user_id, server_id, 'view'):
         return jsonify({'error': 'Access denied'}), 403
     
+    window = request.args.get('window')
+    if window and window not in HISTORY_WINDOWS:
+        return jsonify({'error': f"Invalid window, use one of: {', '.join(HISTORY_WINDOWS)}"}), 400
+    
     try:
-        import psutil
-        import time
-        
         performance_data = {
             'cpu_percent': 0.0,
             'memory_percent': 0.0,
@@ -1759,56 +2370,66 @@ def get_server_performance(server_id):
             'players_online': 0,
             'network_up': 0,
             'network_down': 0,
-            'uptime': 0
+            'uptime': 0,
+            'threads': None,
+            'open_fds': None,
+            'io_read_rate': None,
+            'io_write_rate': None,
+            'sampled_at': None
         }
         
-        server_pid = server.pid
-        
-        # Pobierz rzeczywiste statystyki jeśli serwer działa
-        if server.status == 'running' and server_pid:
-            try:
-                process = psutil.Process(server_pid)
-                
-                # CPU usage
-                performance_data['cpu_percent'] = round(process.cpu_percent(interval=0.1), 1)
-                
-                # Memory usage
-                memory_info = process.memory_info()
-                performance_data['memory_percent'] = round((memory_info.rss / psutil.virtual_memory().total) * 100, 1)
-                
-                # Uptime
-                create_time = process.create_time()
-                performance_data['uptime'] = int(time.time() - create_time)
-                
-                # Network stats (jeśli dostępne)
-                try:
-                    net_io = process.io_counters()
-                    performance_data['network_up'] = net_io.write_bytes // 1024
-                    performance_data['network_down'] = net_io.read_bytes // 1024
-                except (AttributeError, psutil.AccessDenied):
-                    pass
-                    
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                # Proces nie istnieje lub brak uprawnień
-                server.status = 'stopped'
-                server.pid = None
-                db.session.commit()
+        # Ostatnia próbka z MetricsSampler - żądanie nie mierzy niczego samo
+        if server.status == 'running' and server.pid:
+            sample = server_manager.metrics.latest(server_id)
+            if sample:
+                performance_data.update({
+                    'cpu_percent': sample['cpu_percent'],
+                    'memory_percent': sample['memory_percent'],
+                    'uptime': sample['uptime'],
+                    'threads': sample['threads'],
+                    'open_fds': sample['open_fds'],
+                    'io_read_rate': sample['io_read_rate'],
+                    'io_write_rate': sample['io_write_rate'],
+                    'network_up': (sample['io_write_bytes'] or 0) // 1024,
+                    'network_down': (sample['io_read_bytes'] or 0) // 1024,
+                    'sampled_at': sample['time'],
+                    'cgroup': sample.get('cgroup')
+                })
+            elif server_manager.process_registry.is_alive(server_id, server.pid):
+                # Proces spoza samplera (np. sprzed restartu panelu) - szybki odczyt bez blokowania
+                metrics = process_metrics(server.pid)
+                if metrics:
+                    performance_data['cpu_percent'] = metrics['cpu_percent']
+        
+        if window:
+            performance_data['history'] = {
+                'window': window,
+                'samples': server_manager.metrics.history(server_id, HISTORY_WINDOWS[window])
+            }
         
-        # Pobierz liczbę graczy z server.properties (dla Minecraft)
-        try:
-            properties = server_manager.get_server_properties(server.name)
-            if properties and 'max-players' in properties:
-                # To jest uproszczenie - w rzeczywistości trzeba by parsować listę graczy
-                performance_data['players_online'] = 0  # Tymczasowo 0
-        except:
-            pass
-        
-        # TPS - trudne do zmierzenia bez bezpośredniego dostępu do logów serwera
-        # Można spróbować oszacować na podstawie obciążenia CPU
-        if performance_data['cpu_percent'] > 90:
-            performance_data['tps'] = round(20 * (1 - (performance_data['cpu_percent'] - 90) / 100), 1)
-        else:
-            performance_data['tps'] = 20.0
+        # Liczba graczy ze zdarzeń join/leave sparsowanych z konsoli
+        events = server_manager.get_server_events(server_id)
+        if events is not None:
+            performance_data['players_online'] = events['players_online']
+            performance_data['players'] = events['players']
+            performance_data['ready'] = events['ready']
+            performance_data['last_lag'] = events['last_lag']
+        
+        # Liczba graczy z pingu portu gry (ServerProber) ma pierwszeństwo przed konsolą
+        server_prober.start(current_app._get_current_object())
+        ping = server_prober.get(server_id)
+        if ping and ping.get('reachable'):
+            performance_data['players_online'] = ping['players_online']
+            performance_data['max_players'] = ping['max_players']
+            performance_data['latency_ms'] = ping.get('latency_ms')
+        performance_data['ping'] = ping
+        
+        # TPS/MSPT zmierzone przez TickHealthCollector (RCON, komendy Paper/Forge, ostrzeżenia vanilla)
+        tick = server_manager.tick_health.summary(server_id, HISTORY_WINDOWS.get(window, 300))
+        performance_data['tick'] = tick
+        if tick and tick['tps'] is not None:
+            performance_data['tps'] = tick['tps']
+            performance_data['mspt'] = tick['mspt']
         
         return jsonify(performance_data)
         
@@ -1910,6 +2531,7 @@ def get_server_backups(server_id):
 
 @main.route('/servers/<int:server_id>/backups', methods=['POST'])
 @jwt_required()
+@timed_job('backup')
 def create_server_backup(server_id):
     current_user_id = get_jwt_identity()
     server = Server.query.get_or_404(server_id)
@@ -2059,22 +2681,34 @@ def get_console_output(server_id):
         return jsonify({'error': 'Access denied'}), 403
     
     lines = request.args.get('lines', 100, type=int)
+    since = request.args.get('since', type=int)
     
     if server.agent_id:
         agent_client = _get_agent_client(server_id=server_id)
         if not agent_client:
             return jsonify({'error': 'Agent not available'}), 500
         
-        success, result = agent_client.get_console(server.name, lines)
+        success, result = agent_client.get_console(server.name, lines, since=since)
         
         if success:
-            return jsonify({'output': result.get('output', '')})
+            if since is not None:
+                return jsonify({
+                    'output': result.get('output', ''),
+                    'lines': result.get('entries', []),
+                    'next': result.get('next', since),
+                    'gap': result.get('gap', 0),
+                    'reset': result.get('reset', False),
+                    'running': result.get('running', False)
+                })
+            return jsonify({'output': result.get('output', ''), 'next': result.get('next')})
         else:
             return jsonify({'error': f'Agent error: {result}'}), 500
     else:
         try:
-            output = server_manager.get_realtime_output(server_id)
-            return jsonify({'output': output})
+            if since is not None:
+                return jsonify(_incremental_output(server_manager.get_output_since(server_id, since, lines)))
+            output = server_manager.get_realtime_output(server_id, lines)
+            return jsonify({'output': output, 'next': server_manager.get_output_cursor(server_id)})
         except Exception as e:
             return jsonify({'error': f'Error getting console: {str(e)}'}), 500
 
@@ -2113,21 +2747,13 @@ def get_server_size(server_id):
         return jsonify({'error': 'Access denied'}), 403
     
     try:
-        import shutil
-        server_path = server_manager.get_server_path(server.name)
+        backup_dir = current_app.config.get('BACKUP_PATH', os.path.join(current_app.config.get('SERVER_BASE_PATH', ''), '..', 'data', 'backups'))
+        usage = server_manager.get_disk_usage(server.name, os.path.realpath(backup_dir))
+        if usage is None:
+            return jsonify({'size_gb': 0, 'total_bytes': 0})
         
-        if os.path.exists(server_path):
-            total_size = 0
-            for dirpath, dirnames, filenames in os.walk(server_path):
-                for filename in filenames:
-                    filepath = os.path.join(dirpath, filename)
-                    total_size += os.path.getsize(filepath)
-            
-            # Convert to GB
-            size_gb = total_size / (1024 ** 3)
-            return jsonify({'size_gb': round(size_gb, 2)})
-        else:
-            return jsonify({'size_gb': 0})
+        usage['size_gb'] = round(usage['server_bytes'] / (1024 ** 3), 2)
+        return jsonify(usage)
             
     except Exception as e:
         return jsonify({'error': f'Error calculating size: {str(e)}'}), 500
@@ -2458,6 +3084,7 @@ def clean_install_server(server_id):
         if os.path.exists(server_path):
             shutil.rmtree(server_path)
             print(f"Removed server directory: {server_path}")
+        server_manager.disk_usage.invalidate(server_path)
         
         # Utwórz pusty katalog
         os.makedirs(server_path, exist_ok=True)
@@ -2795,6 +3422,19 @@ def get_agent(agent_id):
     agent = Agent.query.get_or_404(agent_id)
     return jsonify(agent.to_dict())
 
+@main.route('/agents/<int:agent_id>/history', methods=['GET'])
+@jwt_required()
+def get_agent_history(agent_id):
+    """Historia metryk agenta do wykresów (?range=24h albo ?start=&end=, ?metrics=, ?points=)"""
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    agent = Agent.query.get_or_404(agent_id)
+    return _history_request('agent', agent.id)
+
 @main.route('/agents/<int:agent_id>', methods=['PUT'])
 @jwt_required()
 def update_agent(agent_id):
@@ -2860,6 +3500,7 @@ def delete_agent(agent_id):
             'servers': server_names
         }), 400
     
+    metrics_history.forget('agent', agent.id)
     db.session.delete(agent)
     db.session.commit()
     
@@ -2981,6 +3622,19 @@ def report_agent_status():
         
         db.session.commit()
         
+        # Historia - zapis paczkami w tle, tu tylko bufor w pamięci
+        metrics_history.start(current_app._get_current_object())
+        metrics_history.record('agent', agent.id, data)
+        server_metrics = data.get('servers')
+        if server_metrics:
+            for server in Server.query.filter(Server.agent_id == agent.id,
+                                              Server.name.in_(list(server_metrics))).all():
+                sample = server_metrics[server.name]
+                metrics_history.record('server', server.id, {
+                    'cpu_usage': sample.get('cpu_percent'),
+                    'memory_mb': sample.get('memory_mb')
+                })
+        
         # Sprawdź czy dane zostały zapisane
         db.session.refresh(agent)
         print(f"DEBUG - After commit - CPU: {agent.cpu_usage}%, Memory: {agent.memory_usage}%, Disk: {agent.disk_usage}%")
@@ -3465,6 +4119,52 @@ def install_modpack(server_id):
         'status': 'running'
     })
 
+MRPACK_INDEX = 'modrinth.index.json'
+
+def _mrpack_target(root, relative_path):
+    """Ścieżka pliku paczki wewnątrz katalogu serwera (bez wychodzenia poza niego)"""
+    target = os.path.realpath(os.path.join(root, relative_path))
+    if not target.startswith(root + os.sep):
+        raise ValueError(f"Unsafe path in modpack: {relative_path}")
+    return target
+
+def _install_mrpack(zip_ref, server_path, installation_info):
+    """Paczka Modrinth: pliki z indeksu pobierane z weryfikacją sha512 w locie, potem overrides"""
+    index = json.loads(zip_ref.read(MRPACK_INDEX))
+    root = os.path.realpath(server_path)
+    files = [entry for entry in index.get('files', [])
+             if (entry.get('env') or {}).get('server') != 'unsupported']
+    
+    for i, entry in enumerate(files):
+        target = _mrpack_target(root, entry['path'])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        hashes = entry.get('hashes') or {}
+        algorithm = 'sha512' if hashes.get('sha512') else 'sha1'
+        checksums = {algorithm: hashes[algorithm]} if hashes.get(algorithm) else None
+        error = None
+        for url in entry.get('downloads') or []:
+            try:
+                server_manager.downloader.download(url, target, checksums=checksums, priority=PRIORITY_NORMAL)
+                break
+            except DownloadError as e:
+                error = e
+        else:
+            raise DownloadError(f"Could not download {entry['path']}: {error or 'no download URL'}")
+        installation_info['progress'] = min(70 + (i + 1) / len(files) * 20, 90)
+        installation_info['message'] = f'Downloaded {i + 1}/{len(files)} modpack files...'
+    
+    count = len(files)
+    # server-overrides po overrides - nadpisują wspólne pliki
+    for prefix in ('overrides/', 'server-overrides/'):
+        for name in zip_ref.namelist():
+            if name.startswith(prefix) and not name.endswith('/'):
+                target = _mrpack_target(root, name[len(prefix):])
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with zip_ref.open(name) as source_file, open(target, 'wb') as target_file:
+                    shutil.copyfileobj(source_file, target_file)
+                count += 1
+    return count
+
 def _async_install_modpack(app, installation_id, installation_info):
     """Async function to install modpack with application context - ADD files instead of replacing"""
     with app.app_context():
@@ -3519,24 +4219,15 @@ def _async_install_modpack(app, installation_id, installation_info):
                     
                     modpack_path = os.path.join(modpacks_dir, filename)
                     
-                    # Download file
-                    response = requests.get(download_url, stream=True)
-                    response.raise_for_status()
+                    def report(downloaded_size, total_size):
+                        if total_size:
+                            installation_info['progress'] = min(20 + (downloaded_size / total_size) * 50, 70)
+                            installation_info['message'] = f'Downloading: {downloaded_size/(1024*1024):.1f}MB / {total_size/(1024*1024):.1f}MB'
                     
-                    total_size = int(response.headers.get('content-length', 0))
-                    downloaded_size = 0
-                    
-                    with open(modpack_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                                downloaded_size += len(chunk)
-                                
-                                # Update progress
-                                if total_size > 0:
-                                    progress = 20 + (downloaded_size / total_size) * 50
-                                    installation_info['progress'] = min(progress, 70)
-                                    installation_info['message'] = f'Downloading: {downloaded_size/(1024*1024):.1f}MB / {total_size/(1024*1024):.1f}MB'
+                    # Download file (wspólna kolejka pobierań panelu)
+                    installation_info['message'] = 'Waiting in download queue...'
+                    server_manager.downloader.download(download_url, modpack_path, progress=report,
+                                                       priority=PRIORITY_NORMAL)
                     
                 except Exception as e:
                     installation_info['status'] = 'error'
@@ -3560,6 +4251,10 @@ def _async_install_modpack(app, installation_id, installation_info):
                     extracted_count = 0
                     total_files = len(file_list)
                     
+                    if MRPACK_INDEX in file_list:
+                        extracted_count = _install_mrpack(zip_ref, server_path, installation_info)
+                        file_list = []
+                    
                     for i, file_name in enumerate(file_list):
                         # Skip directory entries
                         if file_name.endswith('/'):
@@ -3858,11 +4553,10 @@ def create_custom_modpack(server_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@timed_job('download')
 def _download_server_jar(server_path, minecraft_version, loader):
     """Pobiera server.jar dla danej wersji"""
     try:
-        import requests
-        
         if loader == 'fabric':
             # Fabric installer
             url = f"https://maven.fabricmc.net/net/fabricmc/fabric-installer/0.11.2/fabric-installer-0.11.2.jar"
@@ -3873,16 +4567,8 @@ def _download_server_jar(server_path, minecraft_version, loader):
             # Vanilla
             url = f"https://piston-data.mojang.com/v1/objects/8f3112a1049751cc472ec13e397eade5336ca7ae/server.jar"
         
-        response = requests.get(url, stream=True, timeout=60)
-        
-        if response.status_code == 200:
-            jar_path = os.path.join(server_path, 'server.jar')
-            with open(jar_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            return True
-        
-        return False
+        server_manager.downloader.download(url, os.path.join(server_path, 'server.jar'), priority=PRIORITY_NORMAL)
+        return True
         
     except Exception as e:
         print(f"Error downloading server jar: {e}")
@@ -4289,6 +4975,7 @@ def create_database_table():
 
 @main.route('/database/backup', methods=['POST'])
 @jwt_required()
+@timed_job('database_backup')
 def create_database_backup():
     """Tworzy kopię zapasową bazy danych"""
     current_user_id = get_jwt_identity()
@@ -4,28 +4,110 @@ import signal
 import time
 import json
 import threading
-import requests
 import zipfile
 import tarfile
+import hashlib
 from .models import db, Server
+from .console_buffer import ConsoleBuffer
+from .log_sink import LogSinkRegistry
+from .output_pump import OutputPump
+from .log_tail import tail_lines
+from .log_archive import console_log_path, read_log_window
+from .log_index import LogSearchIndex
+from .event_bus import event_bus
+from .log_parser import ServerEventState
+from .metrics_sampler import MetricsSampler
+from .tick_health import TickHealthCollector, rcon_settings
+from .process_registry import ProcessRegistry
+from .disk_usage import DiskUsageAccountant, usage_breakdown
+from .cgroups import CgroupManager
+from .artifact_store import ArtifactStore, artifact_key, detach
+from .version_resolver import VersionResolver
+from .downloader import ChecksumMismatch, DownloadCancelled, DownloadError
+from .download_scheduler import DownloadScheduler, PRIORITY_INTERACTIVE
+from .prometheus import capture_lag, timed_job
 from flask import current_app
 from pathlib import Path
 from datetime import datetime
 
 class ServerManager:
-    def __init__(self, server_base_path):
+    def __init__(self, server_base_path, console_buffer_lines=1000, echo_output=False,
+                 log_flush_interval=1.0, log_flush_bytes=64 * 1024,
+                 log_rotate_bytes=0, log_rotate_daily=False, log_archive_keep=30,
+                 log_search_retention_days=30, metrics_interval=2, metrics_retention=3600,
+                 tick_interval=30, disk_usage_interval=5, disk_usage_rescan=3600, cgroups=None,
+                 artifacts=None, versions=None, downloader=None):
         self.server_base_path = server_base_path
+        self.console_buffer_lines = console_buffer_lines
+        self.echo_output = echo_output
+        self.log_index = LogSearchIndex(log_search_retention_days)
+        self.log_sinks = LogSinkRegistry(log_flush_interval, log_flush_bytes,
+                                         log_rotate_bytes, log_rotate_daily, log_archive_keep,
+                                         on_flush=self.log_index.enqueue)
+        self.output_pump = OutputPump(on_round=capture_lag.observe) if OutputPump.is_supported() else None
+        self.cgroups = cgroups or CgroupManager()
+        self.server_cgroups = {}
+        self.metrics = MetricsSampler(self._metric_targets, metrics_interval, metrics_retention,
+                                      cgroup_metrics=self._cgroup_metrics)
+        self.tick_health = TickHealthCollector(self._tick_targets, tick_interval, metrics_retention)
+        self.disk_usage = DiskUsageAccountant(disk_usage_interval, disk_usage_rescan)
+        self.artifacts = artifacts or ArtifactStore(os.path.join(server_base_path, '.artifacts'))
+        self.versions = versions or VersionResolver(os.path.join(server_base_path, '.versions'))
+        self.downloader = downloader or DownloadScheduler()
         self.processes = {}
         self.output_listeners = {}
         self.download_progress = {}
         self.download_threads = {}
-        self.download_processes = {} 
+        self.download_cancels = {}
         self.server_outputs = {} 
+        self.server_events = {}
+        self.server_paths = {}
+        self.process_registry = ProcessRegistry(os.path.join(server_base_path, '.processes.json'))
         self.lock = threading.Lock()
     
+    def _metric_targets(self):
+        """Procesy uruchomione przez panel, które próbkuje MetricsSampler"""
+        return {server_id: process.pid for server_id, process in list(self.processes.items())
+                if process.poll() is None}
+    
+    def _cgroup_metrics(self, server_id):
+        path = self.server_cgroups.get(server_id)
+        return self.cgroups.read_metrics(path) if path else None
+    
+    def _tick_targets(self):
+        """Gotowe serwery do pomiaru TPS/MSPT wraz ze sposobem pomiaru"""
+        flavors = {'paper': 'paper', 'forge': 'forge', 'java': 'vanilla'}
+        targets = {}
+        for server_id, process in list(self.processes.items()):
+            event_state = self.server_events.get(server_id)
+            if process.poll() is not None or event_state is None or not event_state.ready:
+                continue
+            flavor = flavors.get(event_state.log_format)
+            if flavor is None:
+                continue
+            server_path = self.server_paths.get(server_id)
+            properties = self.get_server_properties(os.path.basename(server_path)) if server_path else None
+            targets[server_id] = {
+                'flavor': flavor,
+                'rcon': rcon_settings(properties),
+                'send': lambda command, server_id=server_id: self.send_command(server_id, command)
+            }
+        return targets
+    
     def get_server_path(self, server_name):
         return os.path.join(self.server_base_path, server_name)
     
+    def _get_console_buffer(self, server_id, create=False):
+        """Pobierz (lub utwórz) bufor konsoli serwera"""
+        buffer = self.server_outputs.get(server_id)
+        if buffer is None and create:
+            with self.lock:
+                buffer = self.server_outputs.get(server_id)
+                if buffer is None:
+                    buffer = ConsoleBuffer(self.console_buffer_lines)
+                    self.server_outputs[server_id] = buffer
+        return buffer
+    
     def get_download_progress(self, server_id):
         """Get download progress for a server"""
         with self.lock:
@@ -53,20 +135,13 @@ class ServerManager:
     
     def _get_java_server_url(self, implementation, version):
         """Get download URL for Java server based on implementation and version"""
+        if implementation in ('vanilla', 'paper', 'purpur'):
+            resolved = self.versions.resolve(implementation, version)
+            if resolved:
+                return resolved['url']
+
         if implementation == 'vanilla':
-            # Pobierz URL z manifestu Mojang
-            version_manifest_url = "https://launchermeta.mojang.com/mc/game/version_manifest.json"
-            try:
-                version_manifest = requests.get(version_manifest_url).json()
-            
-                for v in version_manifest['versions']:
-                    if v['id'] == version and v['type'] == 'release':
-                        version_info = requests.get(v['url']).json()
-                        return version_info['downloads']['server']['url']
-            except:
-                pass
-        
-            # Fallback dla popularnych wersji
+            # Fallback dla popularnych wersji (API Mojang niedostępne i brak danych w pamięci podręcznej)
             fallback_urls = {
                 '1.20.1': 'https://piston-data.mojang.com/v1/objects/84194a2f286ef7c14ed7ce0090dba59902951553/server.jar',
                 '1.19.4': 'https://piston-data.mojang.com/v1/objects/8f3112a1049751cc472ec13e397eade5336ca7ae/server.jar',
@@ -74,55 +149,19 @@ class ServerManager:
             }
             return fallback_urls.get(version, fallback_urls['1.20.1'])
     
-        elif implementation == 'paper':
-            # API PaperMC v2
-            build_data = self._get_latest_paper_build(version)
-            if build_data:
-                return f"https://api.papermc.io/v2/projects/paper/versions/{version}/builds/{build_data['build']}/downloads/{build_data['download']}"
-    
         elif implementation == 'purpur':
-            # API PurpurMC
             return f"https://api.purpurmc.org/v2/purpur/{version}/latest/download"
     
         elif implementation == 'fabric':
-            # Fabric używa specjalnego instalatora
             return self._get_fabric_installer_url(version)
     
         return None
     
     def _get_fabric_installer_url(self, version):
         """Pobierz URL instalatora Fabric"""
-        try:
-            # Pobierz listę wersji Fabric
-            fabric_versions_url = "https://meta.fabricmc.net/v2/versions"
-            response = requests.get(fabric_versions_url)
-        
-            if response.status_code == 200:
-                data = response.json()
-            
-                # Znajdź installer
-                installer_version = None
-                for installer in data['installer']:
-                    if installer['stable']:
-                        installer_version = installer['version']
-                        break
-            
-                if installer_version:
-                    # Pobierz loader version dla danej wersji Minecraft
-                    loader_version = None
-                    for loader in data['loader']:
-                        if loader['version'] == version or loader['version'].startswith(version):
-                            loader_version = loader['version']
-                            break
-                
-                    if not loader_version:
-                        # Użyj najnowszego loadera
-                        loader_version = data['loader'][0]['version']
-                
-                    return f"https://meta.fabricmc.net/v2/versions/loader/{version}/{loader_version}/{installer_version}/server/jar"
-                
-        except Exception as e:
-            print(f"Error getting Fabric URL: {e}")
+        resolved = self.versions.resolve('fabric', version)
+        if resolved:
+            return resolved['url']
     
         # Fallback URL
         return f"https://meta.fabricmc.net/v2/versions/loader/{version}/latest/stable/server/jar"
@@ -136,7 +175,7 @@ class ServerManager:
             fabric_url = self._get_fabric_installer_url(version)
             fabric_jar = os.path.join(server_path, 'fabric-server.jar')
         
-            success = self._download_file_with_progress(fabric_url, fabric_jar, server_id)
+            success = self._fetch_artifact('fabric', version, fabric_url, fabric_jar, server_id)
             if not success:
                 return False
         
@@ -185,345 +224,98 @@ class ServerManager:
     
     def _get_latest_paper_build(self, version):
         """Get latest Paper build for a version"""
-        try:
-            url = f"https://api.papermc.io/v2/projects/paper/versions/{version}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                builds = data.get('builds', [])
-                if builds:
-                    latest_build = max(builds)
-                    build_info_url = f"https://api.papermc.io/v2/projects/paper/versions/{version}/builds/{latest_build}"
-                    build_info = requests.get(build_info_url).json()
-                    download_name = build_info['downloads']['application']['name']
-                    return {'build': latest_build, 'download': download_name}
-        except Exception as e:
-            print(f"Error getting Paper build: {e}")
+        resolved = self.versions.resolve('paper', version)
+        if resolved:
+            return {'build': int(resolved['build']), 'download': resolved['name']}
         return None
     
     def _get_latest_purpur_build(self, version):
         """Get latest Purpur build for a version"""
-        try:
-            url = f"https://api.purpurmc.org/v2/purpur/{version}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                return {'build': 'latest', 'download': f"purpur-{version}.jar"}
-        except Exception as e:
-            print(f"Error getting Purpur build: {e}")
+        resolved = self.versions.resolve('purpur', version)
+        if resolved:
+            return {'build': resolved['build'], 'download': f"purpur-{version}.jar"}
         return None
     
-    def _download_with_curl(self, url, file_path, server_id, total_size):
-        """Download using curl with progress tracking"""
-        try:
-            cmd = [
-                'curl', '-L', '--progress-bar',
-                '--retry', '3',  # Dodaj ponowne próby
-                '--retry-delay', '2',  # Opóźnienie między próbami
-                '--connect-timeout', '30',  # Timeout połączenia
-                '--max-time', '300',  # Maksymalny czas pobierania
-                '--user-agent', 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36',  # User-Agent
-                '--insecure',  # Ignoruj błędy SSL (ważne dla niektórych serwerów)
-                '--output', file_path, url
-            ]
-        
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True
-            )
-        
-            with self.lock:
-                self.download_processes[server_id] = process
-        
-            downloaded_size = 0
-            last_update_time = time.time()
-        
-            while True:
-                output = process.stdout.readline()
-                if output == '' and process.poll() is not None:
-                    break
-            
-                if output:
-                    # Debugowanie - wypisz output curl
-                    print(f"CURL output: {output.strip()}")
-                
-                    if '%' in output:
-                        try:
-                            parts = output.strip().split()
-                            if len(parts) >= 2:
-                                percentage_str = parts[0].replace('%', '')
-                                progress = float(percentage_str)
-                            
-                                current_time = time.time()
-                                if current_time - last_update_time > 0.5 or progress > downloaded_size:
-                                    downloaded_bytes = (progress / 100) * total_size if total_size > 0 else 0
-                                
-                                    self._update_progress(
-                                        server_id,
-                                        'downloading',
-                                        progress,
-                                        f'Pobieranie: {downloaded_bytes/(1024*1024):.1f}MB / {total_size/(1024*1024):.1f}MB',
-                                        total_size,
-                                        downloaded_bytes
-                                    )
-                                
-                                    last_update_time = current_time
-                                    downloaded_size = progress
-                        except Exception as e:
-                            print(f"Error parsing curl progress: {e}")
-        
-            return_code = process.poll()
-            print(f"CURL process finished with return code: {return_code}")
-        
-            if return_code == 0:
-                # Sprawdź czy plik został pobrany
-                if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-                    self._update_progress(
-                        server_id,
-                        'extracting',
-                        95,
-                        'Pobieranie zakończone, przygotowywanie serwera...',
-                        total_size,
-                        total_size
-                    )
-                    return True
-                else:
-                    self._update_progress(
-                        server_id,
-                        'error',
-                        0,
-                        'Plik został pobrany, ale jest pusty lub nie istnieje'
-                    )
-                    return False
-            else:
-                # Spróbuj pobrać za pomocą requests jako fallback
-                print("CURL failed, trying requests fallback...")
-                return self._download_with_requests_fallback(url, file_path, server_id, total_size)
-            
-        except Exception as e:
-            print(f"CURL download error: {e}")
-            # Fallback do requests
-            return self._download_with_requests_fallback(url, file_path, server_id, total_size)
-        finally:
-            with self.lock:
-                if server_id in self.download_processes:
-                    del self.download_processes[server_id]
-                    
-    def _download_with_requests_fallback(self, url, file_path, server_id, total_size):
-        """Fallback download using requests library"""
-        try:
-            self._update_progress(
-                server_id,
-                'downloading',
-                10,
-                'Używanie alternatywnej metody pobierania...',
-                total_size,
-                0
-            )
-        
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-        
-            response = requests.get(url, headers=headers, stream=True, timeout=30)
-            response.raise_for_status()
-        
-            # Pobierz rozmiar jeśli nie podano
-            if total_size == 0:
-                total_size = int(response.headers.get('content-length', 0))
-        
-            downloaded = 0
-            chunk_size = 8192
-        
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                    
-                        if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            self._update_progress(
-                                server_id,
-                                'downloading',
-                                progress,
-                                f'Pobieranie: {downloaded/(1024*1024):.1f}MB / {total_size/(1024*1024):.1f}MB',
-                                total_size,
-                                downloaded
-                            )
-        
-            self._update_progress(
-                server_id,
-                'extracting',
-                95,
-                'Pobieranie zakończone, przygotowywanie serwera...',
-                total_size,
-                total_size
-            )
-            return True
-        
-        except Exception as e:
-            print(f"Requests fallback error: {e}")
-            self._update_progress(
-                server_id,
-                'error',
-                0,
-                f'Błąd pobierania: {str(e)}'
-            )
-            return False
-    
-    def _download_with_wget(self, url, file_path, server_id, total_size):
-        """Download using wget with progress tracking"""
-        try:
-            cmd = [
-                'wget', '-O', file_path, url
-            ]
-            
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True
-            )
-            
-            with self.lock:
-                self.download_processes[server_id] = process
-            
-            downloaded_size = 0
-            last_update_time = time.time()
-            
-            while True:
-                output = process.stdout.readline()
-                if output == '' and process.poll() is not None:
-                    break
-                
-                if output:
-                    if '%' in output and '[' in output and ']' in output:
-                        try:
-                            percentage_str = output.split('%')[0].split()[-1]
-                            progress = float(percentage_str)
-                            
-                            current_time = time.time()
-                            if current_time - last_update_time > 0.5:
-                                downloaded_bytes = (progress / 100) * total_size if total_size > 0 else 0
-                                
-                                self._update_progress(
-                                    server_id,
-                                    'downloading',
-                                    progress,
-                                    f'Pobieranie: {downloaded_bytes/(1024*1024):.1f}MB / {total_size/(1024*1024):.1f}MB',
-                                    total_size,
-                                    downloaded_bytes
-                                )
-                                
-                                last_update_time = current_time
-                        except:
-                            pass
-            
-            if process.returncode == 0:
-                self._update_progress(
-                    server_id,
-                    'extracting',
-                    95,
-                    'Pobieranie zakończone, przygotowywanie serwera...',
-                    total_size,
-                    total_size
-                )
-                return True
-            else:
-                self._update_progress(
-                    server_id,
-                    'error',
-                    0,
-                    'Błąd podczas pobierania pliku'
-                )
-                return False
-                
-        except Exception as e:
-            print(f"WGET download error: {e}")
-            return False
-        finally:
-            with self.lock:
-                if server_id in self.download_processes:
-                    del self.download_processes[server_id]
-            
     def cancel_download(self, server_id):
         """Cancel ongoing download for a server"""
         with self.lock:
-            if server_id in self.download_processes:
-                process = self.download_processes[server_id]
-                try:
-                    process.terminate()
-                    time.sleep(1)
-                    if process.poll() is None:
-                        process.kill()
-                except:
-                    pass
-            
-            if server_id in self.download_processes:
-                del self.download_processes[server_id]
+            cancel = self.download_cancels.pop(server_id, None)
+            if cancel is not None:
+                cancel.set()
             if server_id in self.download_progress:
                 del self.download_progress[server_id]
             
             return True
         return False
     
-    def _download_file_with_progress(self, url, file_path, server_id):
-        """Download file with progress tracking using curl or wget"""
-        try:
-            print(f"Starting download from {url} to {file_path}")
-        
-            # Sprawdź dostępność narzędzi
-            curl_available = subprocess.run(['which', 'curl'], capture_output=True).returncode == 0
-            wget_available = subprocess.run(['which', 'wget'], capture_output=True).returncode == 0
-        
-            self._update_progress(
-                server_id, 
-                'preparing', 
-                5, 
-                'Sprawdzanie dostępnych narzędzi...',
-                0,
-                0
-            )
+    @staticmethod
+    def _artifact_build(url):
+        """Build artefaktu z URL: przypięte URL-e (hash Mojang, numer buildu Paper, wersje Fabric) się nie zmieniają"""
+        if 'latest' in url:
+            return 'latest'
+        return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+    def _java_checksums(self, implementation, version, url):
+        """Sumy kontrolne z API wersji (sha1 Mojang, sha256 Paper) dla rozwiązanego URL"""
+        resolved = self.versions.resolve(implementation, version)
+        if resolved and resolved['url'] == url:
+            return resolved['checksums']
+        return {}
+
+    def _fetch_artifact(self, implementation, version, url, file_path, server_id, checksums=None):
+        """Plik z magazynu artefaktów, a gdy go tam nie ma - pobrany z postępem i dodany do magazynu"""
+        key = artifact_key(implementation, version, self._artifact_build(url))
+        method, error = self.artifacts.fetch(
+            key, file_path, lambda path: self._download_file_with_progress(url, path, server_id, checksums),
+            source=url, checksums=checksums)
+        if error:
+            print(f"Artifact error: {error}")
+            if self.get_download_progress(server_id)['status'] != 'error':
+                self._update_progress(server_id, 'error', 0, f'Błąd pobierania: {error}')
+            return False
+        if method != 'downloaded':
+            print(f"Provisioned {key} from artifact store ({method})")
+            self._update_progress(server_id, 'extracting', 95,
+                                  f'Plik {os.path.basename(file_path)} z lokalnego magazynu ({method})...')
+        return True
+
+    @timed_job('download')
+    def _download_file_with_progress(self, url, file_path, server_id, checksums=None):
+        """Download file with exact byte progress; returns {'size', 'digests'} or False"""
+        cancel = threading.Event()
+        with self.lock:
+            self.download_cancels[server_id] = cancel
         
-            # Spróbuj najpierw pobrać rozmiar pliku
-            total_size = 0
-            try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
-                }
-                response = requests.head(url, headers=headers, allow_redirects=True, timeout=10)
-                if response.status_code == 200:
-                    total_size = int(response.headers.get('content-length', 0))
-                    print(f"Total size detected: {total_size} bytes")
-            except Exception as e:
-                print(f"Could not determine file size: {e}")
+        def report(downloaded, total):
+            progress = 5 + downloaded / total * 90 if total else 5
+            message = (f'Pobieranie: {downloaded/(1024*1024):.1f}MB / {total/(1024*1024):.1f}MB' if total
+                       else f'Pobieranie: {downloaded/(1024*1024):.1f}MB')
+            self._update_progress(server_id, 'downloading', progress, message, total or 0, downloaded)
         
+        try:
+            print(f"Starting download from {url} to {file_path}")
+            # Pierwszy raport postępu nadpisze komunikat, gdy kolejka zwolni slot
+            self._update_progress(server_id, 'downloading', 5, 'Oczekiwanie w kolejce pobierania...', 0, 0)
+            result = self.downloader.download(url, file_path, progress=report, cancel=cancel, checksums=checksums,
+                                              priority=PRIORITY_INTERACTIVE)
             self._update_progress(
-                server_id, 
-                'downloading', 
-                5, 
-                'Rozpoczynanie pobierania...',
-                total_size,
-                0
+                server_id,
+                'extracting',
+                95,
+                'Pobieranie zakończone, przygotowywanie serwera...',
+                result['size'],
+                result['size']
             )
+            return result
         
-            # Priorytet: curl -> wget -> requests fallback
-            success = False
-            if curl_available:
-                print("Using CURL for download")
-                success = self._download_with_curl(url, file_path, server_id, total_size)
-            elif wget_available:
-                print("Using WGET for download")
-                success = self._download_with_wget(url, file_path, server_id, total_size)
-            else:
-                print("Using requests fallback")
-                success = self._download_with_requests_fallback(url, file_path, server_id, total_size)
-        
-            return success
-            
-        except Exception as e:
+        except DownloadCancelled:
+            print(f"Download for server {server_id} cancelled")
+            return False
+        except ChecksumMismatch as e:
+            print(f"Checksum verification failed: {e}")
+            self._update_progress(server_id, 'error', 0, 'Pobrany plik jest uszkodzony (niezgodna suma kontrolna)')
+            return False
+        except (DownloadError, OSError) as e:
             print(f"Download error: {e}")
             self._update_progress(
                 server_id,
@@ -532,6 +324,10 @@ class ServerManager:
                 f'Błąd pobierania: {str(e)}'
             )
             return False
+        finally:
+            with self.lock:
+                if self.download_cancels.get(server_id) is cancel:
+                    del self.download_cancels[server_id]
     
     def _start_server_async(self, server_id, bedrock_url=None, app_context=None):
         """Start server in a separate thread with application context"""
@@ -588,7 +384,7 @@ class ServerManager:
                 
                     try:
                         temp_zip_path = os.path.join(server_path, 'bedrock_server.zip')
-                        success = self._download_file_with_progress(bedrock_url, temp_zip_path, server_id)
+                        success = self._fetch_artifact('bedrock', server.version, bedrock_url, temp_zip_path, server_id)
                         if not success:
                             return
                     
@@ -618,6 +414,14 @@ class ServerManager:
                         jar_file = file
                         jar_path = os.path.join(server_path, file)
                         break
+                
+                if jar_file:
+                    # Instalacje z czasu, gdy magazyn artefaktów dawał twarde dowiązania
+                    try:
+                        if detach(jar_path):
+                            print(f"Detached {jar_path} from the shared artifact store")
+                    except OSError as e:
+                        print(f"Could not detach {jar_path} from the artifact store: {e}")
         
                 if not jar_file:
                     try:
@@ -647,7 +451,9 @@ class ServerManager:
                                 jar_filename = f"server_{server.version}.jar"
                         
                             jar_path = os.path.join(server_path, jar_filename)
-                            success = self._download_file_with_progress(jar_url, jar_path, server_id)
+                            checksums = self._java_checksums(server.implementation, server.version, jar_url)
+                            success = self._fetch_artifact(server.implementation, server.version, jar_url,
+                                                           jar_path, server_id, checksums)
                             if not success:
                                 return
                     
@@ -687,6 +493,9 @@ class ServerManager:
                 else:
                     cmd = ['./bedrock_server']
         
+            # Osobna grupa cgroup v2 z limitami (gdy włączone i dostępne)
+            cgroup_path = self.cgroups.prepare(server_id)
+        
             # Start the process
             process = subprocess.Popen(
                 cmd,
@@ -698,10 +507,23 @@ class ServerManager:
                 bufsize=1,
                 universal_newlines=True
             )
+            if cgroup_path and not self.cgroups.attach(cgroup_path, process.pid):
+                cgroup_path = None
     
             # Store process reference
             self.processes[server_id] = process
-        
+            if cgroup_path:
+                self.server_cgroups[server_id] = cgroup_path
+            self.process_registry.record(server_id, process.pid)
+            event_bus.publish(server_id, 'status', {
+                'is_running': True,
+                'status': 'running',
+                'pid': process.pid,
+                'source': 'local'
+            })
+            self.metrics.start()
+            self.tick_health.start()
+
             # Update database with PID using application context
             if app_context:
                 try:
@@ -720,9 +542,9 @@ class ServerManager:
                 
             # Start output listener thread
             self.output_listeners[server_id] = True
-            thread = threading.Thread(target=self._capture_output, args=(server_id, process))
-            thread.daemon = True
-            thread.start()
+            with self.lock:
+                self.server_outputs[server_id] = ConsoleBuffer(self.console_buffer_lines)
+            self._start_output_capture(server_id, process, server_path, app_context)
         
             # Final success message
             self._update_progress(server_id, 'complete', 100, 'Serwer został pomyślnie uruchomiony!')
@@ -911,75 +733,111 @@ class ServerManager:
         except Exception as e:
            return False, f"Failed to send command: {str(e)}"
     
-    def _capture_output(self, server_id, process):
-        """Capture server output in real-time"""
-        output_buffer = []
+    def _start_output_capture(self, server_id, process, server_path=None, app_context=None):
+        """Podłącz stdout procesu do wspólnej pompy wyjścia (na Windows - osobny wątek)"""
+        output_buffer = self._get_console_buffer(server_id, create=True)
     
-        # Pobierz ścieżkę serwera RAZ na początku (bez kontekstu aplikacji)
-        server_path = None
-        try:
-            server = self._get_server_from_db(server_id)
-            if server:
-                server_path = self.get_server_path(server.name)
-        except Exception as e:
-            print(f"Error getting server path at start: {e}")
+        # Jeden otwarty plik logu na serwer, zapisywany paczkami
+        log_sink = None
+        if server_path:
+            log_sink = self.log_sinks.open(server_id, console_log_path(server_path))
+    
+        # Stan wyliczany ze zdarzeń konsoli zaczyna się od zera przy każdym starcie
+        event_state = ServerEventState()
+        self.server_events[server_id] = event_state
+        self.server_paths[server_id] = server_path
+        # Grupa tego procesu - sprzątana przy jego zakończeniu, nawet gdy stop_server usunął go już z processes
+        cgroup_path = self.server_cgroups.get(server_id)
+    
+        def on_line(line):
+            if self.output_listeners.get(server_id):
+                self._handle_output_line(server_id, line, output_buffer, log_sink, event_state)
+    
+        def on_close():
+            self._finish_output_capture(server_id, process, output_buffer, log_sink, app_context, cgroup_path)
     
+        if self.output_pump is not None:
+            self.output_pump.register(server_id, process.stdout, on_line, on_close)
+        else:
+            thread = threading.Thread(target=self._capture_output, args=(server_id, process, on_line, on_close))
+            thread.daemon = True
+            thread.start()
+    
+    def _capture_output(self, server_id, process, on_line, on_close):
+        """Capture server output in real-time (tryb wątek-na-serwer)"""
         while server_id in self.output_listeners and self.output_listeners[server_id]:
             try:
                 line = process.stdout.readline()
                 if not line and process.poll() is not None:
                     break
-                    
-                if "Applying patches" in line:
-                    print(f"Server {server_id}: Paper server is applying patches - this is normal")
-                elif "Downloading mojang" in line:
-                    print(f"Server {server_id}: Paper is downloading Minecraft vanilla jar - this is normal")
-                elif "Done" in line and "For help, type" in line:
-                    print(f"Server {server_id}: Paper server started successfully!")
-            
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                formatted_line = f"[{timestamp}] {line.strip()}\n"
-                output_buffer.append(formatted_line)
-            
-                if len(output_buffer) > 1000:
-                    output_buffer.pop(0)
-            
-                with self.lock:
-                    self.server_outputs[server_id] = output_buffer
-            
-                print(f"Server {server_id}: {line.strip()}")
-            
-                # Zapisz do pliku logu (tylko jeśli mamy ścieżkę)
-                if server_path:
-                    try:
-                        logs_dir = os.path.join(server_path, 'logs')
-                        os.makedirs(logs_dir, exist_ok=True)
-                    
-                        server_log_path = os.path.join(logs_dir, 'latest.log')
-                        with open(server_log_path, 'a', encoding='utf-8') as log_file:
-                            log_file.write(formatted_line)
-                    except Exception as e:
-                        print(f"Error writing to log file: {e}")
-            
+                on_line(line)
             except Exception as e:
                 print(f"Error reading output from server {server_id}: {e}")
                 break
+        on_close()
+    
+    def _handle_output_line(self, server_id, line, output_buffer, log_sink, event_state=None):
+        """Przetwórz jedną linię wyjścia serwera"""
+        event = event_state.feed(line) if event_state else None
+        if event:
+            kind = event['type']
+            if kind == 'patching':
+                print(f"Server {server_id}: Paper server is applying patches - this is normal")
+            elif kind == 'downloading':
+                print(f"Server {server_id}: Paper is downloading Minecraft vanilla jar - this is normal")
+            elif kind == 'ready':
+                print(f"Server {server_id}: server started successfully!")
+            elif kind == 'lag':
+                print(f"Server {server_id}: can't keep up - {event['behind_ms']}ms behind")
+                self.tick_health.record_lag(server_id, event['behind_ms'])
+            if kind in ('tps', 'mspt'):
+                self.tick_health.record(server_id, 'console', tps=event.get('tps'),
+                                        mspt=event.get('mspt'), mspt_max=event.get('mspt_max'))
+            else:
+                event_bus.publish(server_id, 'server_event', event)
+    
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        formatted_line = f"[{timestamp}] {line.strip()}\n"
+        output_buffer.append(formatted_line)
+        event_bus.publish(server_id, 'console', formatted_line)
+    
+        if self.echo_output:
+            print(f"Server {server_id}: {line.strip()}")
+    
+        # Zapisz do pliku logu (tylko jeśli mamy ścieżkę)
+        if log_sink:
+            log_sink.write(formatted_line)
+    
+    def _finish_output_capture(self, server_id, process, output_buffer, log_sink, app_context=None,
+                               cgroup_path=None):
+        """Sprzątanie po zakończeniu procesu serwera"""
+        if log_sink:
+            self.log_sinks.close(server_id)
     
         # Update database when server stops
         self._update_server_in_db(server_id, {
             'status': 'stopped',
             'pid': None
-        })
+        }, app_context)
     
         print(f"Server {server_id} output capture stopped")
     
         # Cleanup
-        if server_id in self.processes:
+        self.process_registry.forget(server_id, process.pid)
+        if self.processes.get(server_id) is process:
             del self.processes[server_id]
-        if server_id in self.output_listeners:
-            del self.output_listeners[server_id]
-        if server_id in self.server_outputs:
-            del self.server_outputs[server_id]
+            if server_id in self.output_listeners:
+                del self.output_listeners[server_id]
+        if cgroup_path:
+            # Wpis zostaje tylko, gdy pod tą samą ścieżką działa już nowy proces serwera
+            if self.server_cgroups.get(server_id) == cgroup_path and self.processes.get(server_id) in (None, process):
+                del self.server_cgroups[server_id]
+            # rmdir niepustej grupy (nowy proces już w niej jest) po prostu się nie uda
+            self.cgroups.release(cgroup_path)
+        output_buffer.close()
+        with self.lock:
+            if self.server_outputs.get(server_id) is output_buffer:
+                del self.server_outputs[server_id]
     
     def _get_server_from_db(self, server_id):
         """Pobierz serwer z bazy danych z kontekstem aplikacji"""
@@ -1001,9 +859,27 @@ class ServerManager:
             print(f"Error getting server from DB: {e}")
             return None
     
-    def _update_server_in_db(self, server_id, updates):
+    def _update_server_in_db(self, server_id, updates, app_context=None):
         """Update server in database with application context"""
+        if 'status' in updates:
+            event_bus.publish(server_id, 'status', {
+                'is_running': updates['status'] == 'running',
+                'status': updates['status'],
+                'pid': updates.get('pid'),
+                'source': 'local'
+            })
         try:
+            if app_context is not None:
+                from .models import db, Server
+                with app_context():
+                    server_obj = Server.query.get(server_id)
+                    if server_obj:
+                        for key, value in updates.items():
+                            setattr(server_obj, key, value)
+                        db.session.commit()
+                        print(f"Server {server_id} updated in database: {updates}")
+                return
+            
             from flask import current_app
             if current_app:
                 with current_app.app_context():
@@ -1091,6 +967,50 @@ class ServerManager:
         except Exception as e:
             return False, f"Failed to update properties: {str(e)}"
     
+    def get_disk_usage(self, server_name, backup_dir=None):
+        """Zajętość katalogu serwera z podziałem (world, plugins, logs, backups, other).
+
+        Sumy pochodzą z DiskUsageAccountant; do kopii doliczany jest katalog
+        backups/<serwer> panelu i archiwa backup_<serwer>_*.zip z `backup_dir`.
+        """
+        usage = self.disk_usage.usage(self.get_server_path(server_name))
+        if usage is None:
+            return None
+        
+        level_name = 'world'
+        properties_file = os.path.join(self.get_server_path(server_name), 'server.properties')
+        try:
+            with open(properties_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('level-name='):
+                        level_name = line.split('=', 1)[1].strip() or level_name
+                        break
+        except OSError:
+            pass
+        
+        breakdown = usage_breakdown(usage, level_name)
+        external_backups = 0
+        panel_backups = self.disk_usage.usage(os.path.join(self.server_base_path, 'backups', server_name))
+        if panel_backups:
+            external_backups += panel_backups['total']
+        if backup_dir and os.path.isdir(backup_dir):
+            prefix = f'backup_{server_name}_'
+            with os.scandir(backup_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith(prefix) and entry.is_file(follow_symlinks=False):
+                        external_backups += entry.stat(follow_symlinks=False).st_size
+        breakdown['backups'] += external_backups
+        
+        directories = sorted(usage['directories'].items(), key=lambda item: item[1], reverse=True)
+        return {
+            'total_bytes': usage['total'] + external_backups,
+            'server_bytes': usage['total'],
+            'breakdown': breakdown,
+            'directories': [{'name': name, 'bytes': size} for name, size in directories[:20]],
+            'scanned_at': usage['scanned_at'],
+            'tracking': self.disk_usage.mode
+        }
+
     def get_server_properties(self, server_name):
         server_path = self.get_server_path(server_name)
         if not server_path:
@@ -1183,100 +1103,83 @@ class ServerManager:
         except Exception as e:
             print(f"Error creating default server properties: {e}")
     
-    def get_server_status(self, server_id):
-        """Get detailed status of a server"""
-        from flask import current_app
+    def get_server_events(self, server_id, events=0):
+        """Stan wyliczony z konsoli (gracze, gotowość, opóźnienia) albo None"""
+        event_state = self.server_events.get(server_id)
+        if event_state is None or server_id not in self.processes:
+            return None
+        return event_state.snapshot(events)
     
-        if server_id in self.processes:
-            process = self.processes[server_id]
+    def get_server_status(self, server_id, pid=None):
+        """Status procesu serwera - tylko odczyt, bez zapisów do bazy.
+
+        `pid` (np. Server.pid) pozwala rozpoznać proces uruchomiony przed
+        restartem panelu; uznawany jest tylko, jeśli zgadza się z rejestrem procesów.
+        """
+        process = self.processes.get(server_id)
+        if process is not None:
             return_code = process.poll()
-    
             if return_code is None:
                 return {
                     'running': True,
                     'pid': process.pid,
                     'returncode': None
                 }
-            else:
-                if server_id in self.processes:
-                    del self.processes[server_id]
-                if server_id in self.output_listeners:
-                    self.output_listeners[server_id] = False
-            
-                try:
-                    from .models import db, Server
-                    with current_app.app_context():
-                        server_obj = Server.query.get(server_id)
-                        if server_obj:
-                            server_obj.pid = None
-                            server_obj.status = 'stopped'
-                            db.session.commit()
-                except Exception as e:
-                    print(f"Error updating database status: {e}")
-            
-                return {
-                    'running': False,
-                    'pid': None,
-                    'returncode': return_code
-                }
-        else:
-            try:
-                from .models import Server
-                with current_app.app_context():
-                    server = Server.query.get(server_id)
-                    if server and server.pid:
-                        try:
-                            import psutil
-                            process = psutil.Process(server.pid)
-                            if process.is_running():
-                                return {
-                                    'running': True,
-                                    'pid': server.pid,
-                                    'returncode': None,
-                                    'port_in_use': True
-                                }
-                        except (psutil.NoSuchProcess, psutil.AccessDenied):
-                            server.pid = None
-                            server.status = 'stopped'
-                            db.session.commit()
-            except Exception as e:
-                print(f"Error checking external process: {e}")
-    
+            # Wpis w processes i bazę sprząta _finish_output_capture po zamknięciu stdout
             return {
                 'running': False,
                 'pid': None,
-                'returncode': None
+                'returncode': return_code
             }
+        
+        if pid and self.process_registry.is_alive(server_id, pid, check_cmdline=True):
+            return {
+                'running': True,
+                'pid': pid,
+                'returncode': None,
+                'port_in_use': True
+            }
+        return {
+            'running': False,
+            'pid': None,
+            'returncode': None
+        }
             
-    def get_server_logs(self, server_name, lines=100):
-        """Get the last N lines of server logs"""
+    def get_server_logs_window(self, server_name, start=None, end=None, limit=1000):
+        """Linie logu panelu z okna czasowego [start, end], łącznie z archiwum"""
+        log_file = console_log_path(self.get_server_path(server_name))
+        try:
+            return read_log_window(log_file, start, end, limit), None
+        except Exception as e:
+            return None, f"Error reading log archive: {str(e)}"
+    
+    def search_server_logs(self, server_name, query=None, regex=None, start=None, end=None, limit=200):
+        """Przeszukaj bieżący i zarchiwizowany log panelu przez indeks pełnotekstowy"""
+        log_file = console_log_path(self.get_server_path(server_name))
+        try:
+            return self.log_index.search(log_file, query, regex, start, end, limit), None
+        except Exception as e:
+            return None, f"Error searching logs: {str(e)}"
+    
+    def get_server_logs(self, server_name, lines=100, before=None):
+        """Get the last N lines of server logs (before byte offset `before`)"""
         server_path = self.get_server_path(server_name)
-        log_file = os.path.join(server_path, 'logs', 'latest.log')
-
+        # Log konsoli panelu, a dla serwerów nieuruchomionych od aktualizacji - pliki serwera
+        log_file = console_log_path(server_path)
+        if not os.path.exists(log_file):
+            log_file = os.path.join(server_path, 'logs', 'latest.log')
         if not os.path.exists(log_file):
             log_file = os.path.join(server_path, 'server.log')
 
         try:
             if os.path.exists(log_file):
-                try:
-                    result = subprocess.run(
-                        ['tail', '-n', str(lines), log_file],
-                        capture_output=True, text=True
-                    )
-                    if result.returncode == 0:
-                        return result.stdout, None
-                except:
-                    pass
-            
-                with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                    all_lines = f.readlines()
-                    last_lines = ''.join(all_lines[-lines:])
-                    return last_lines, None
+                return tail_lines(log_file, lines, before), None
             else:
-                return "", "No log file found"
+                return None, "No log file found"
         except Exception as e:
-            return "", f"Error reading log file: {str(e)}"
+            return None, f"Error reading log file: {str(e)}"
             
+    @timed_job('backup')
     def backup_server(self, server_name, backup_name=None):
         """Create a backup of the server"""
         server_path = self.get_server_path(server_name)
@@ -1314,10 +1217,23 @@ class ServerManager:
             
     def get_realtime_output(self, server_id, lines=100):
         """Pobierz output serwera w czasie rzeczywistym"""
-        with self.lock:
-            if server_id in self.server_outputs:
-                output_buffer = self.server_outputs[server_id]
-                # Zwróć ostatnie 'lines' linii
-                recent_output = output_buffer[-lines:] if len(output_buffer) > lines else output_buffer
-                return '\n'.join(recent_output) if recent_output else ""
-            return "Brak danych wyjściowych"
+        output_buffer = self._get_console_buffer(server_id)
+        if output_buffer is not None:
+            # Zwróć ostatnie 'lines' linii
+            recent_output = output_buffer.tail(lines)
+            return '\n'.join(recent_output) if recent_output else ""
+        return "Brak danych wyjściowych"
+    
+    def get_output_since(self, server_id, since, limit=None):
+        """Pobierz tylko linie dopisane po kursorze `since` (odpytywanie przyrostowe)"""
+        output_buffer = self._get_console_buffer(server_id)
+        if output_buffer is None:
+            return {'lines': [], 'next': 0, 'gap': 0, 'reset': since > 0, 'running': False}
+        result = output_buffer.read_cursor(since, limit)
+        result['running'] = not output_buffer.closed
+        return result
+    
+    def get_output_cursor(self, server_id):
+        """Aktualny kursor bufora konsoli (do rozpoczęcia odpytywania przyrostowego)"""
+        output_buffer = self._get_console_buffer(server_id)
+        return output_buffer.next_seq if output_buffer is not None else 0
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import struct
+import threading
+import time
+
+PROBE_INTERVAL = 15
+PROBE_TIMEOUT = 2.0
+
+JAVA_DEFAULT_PORT = 25565
+BEDROCK_DEFAULT_PORT = 19132
+
+# Stała "offline message" protokołu RakNet
+RAKNET_MAGIC = bytes.fromhex('00ffff00fefefefefdfdfdfd12345678')
+
+
+class ProbeError(Exception):
+    pass
+
+
+def _pack_varint(value):
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _unpack_varint(data, offset=0):
+    value = 0
+    for shift in range(0, 35, 7):
+        if offset >= len(data):
+            raise ProbeError('Truncated varint')
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+    raise ProbeError('Varint too long')
+
+
+async def _read_varint(reader):
+    value = 0
+    for shift in range(0, 35, 7):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value
+    raise ProbeError('Varint too long')
+
+
+def _packet(packet_id, payload=b''):
+    body = _pack_varint(packet_id) + payload
+    return _pack_varint(len(body)) + body
+
+
+def _string(value):
+    data = value.encode('utf-8')
+    return _pack_varint(len(data)) + data
+
+
+def _flatten_motd(description):
+    """Tekst MOTD z komponentu czatu (string, {'text', 'extra'} albo lista)"""
+    if isinstance(description, str):
+        return description
+    if isinstance(description, list):
+        return ''.join(_flatten_motd(part) for part in description)
+    if isinstance(description, dict):
+        return description.get('text', '') + ''.join(_flatten_motd(part) for part in description.get('extra', []))
+    return ''
+
+
+async def java_ping(host, port=JAVA_DEFAULT_PORT, timeout=PROBE_TIMEOUT):
+    """Server List Ping serwera Java: {'players_online', 'max_players', 'motd', 'version', 'latency_ms'}"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        handshake = _pack_varint(-1) + _string(host) + struct.pack('>H', port) + _pack_varint(1)
+        writer.write(_packet(0x00, handshake) + _packet(0x00))
+        await writer.drain()
+
+        length = await asyncio.wait_for(_read_varint(reader), timeout)
+        data = await asyncio.wait_for(reader.readexactly(length), timeout)
+        packet_id, offset = _unpack_varint(data)
+        if packet_id != 0x00:
+            raise ProbeError(f'Unexpected packet {packet_id}')
+        size, offset = _unpack_varint(data, offset)
+        status = json.loads(data[offset:offset + size].decode('utf-8'))
+
+        started = time.perf_counter()
+        writer.write(_packet(0x01, struct.pack('>q', int(time.time() * 1000))))
+        await writer.drain()
+        latency = None
+        try:
+            length = await asyncio.wait_for(_read_varint(reader), timeout)
+            await asyncio.wait_for(reader.readexactly(length), timeout)
+            latency = round((time.perf_counter() - started) * 1000, 1)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+            # Część serwerów (np. proxy) zamyka połączenie bez odpowiedzi na ping
+            pass
+    finally:
+        writer.close()
+
+    players = status.get('players') or {}
+    version = status.get('version') or {}
+    return {
+        'players_online': players.get('online', 0),
+        'max_players': players.get('max', 0),
+        'motd': _flatten_motd(status.get('description', '')),
+        'version': version.get('name'),
+        'latency_ms': latency
+    }
+
+
+class _BedrockPingProtocol(asyncio.DatagramProtocol):
+    def __init__(self, future):
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+def parse_bedrock_pong(data):
+    """Rozbierz odpowiedź Unconnected Pong (0x1c) z danymi serwera po średnikach"""
+    if len(data) < 35 or data[0] != 0x1C or data[17:33] != RAKNET_MAGIC:
+        raise ProbeError('Invalid unconnected pong')
+    size = struct.unpack('>H', data[33:35])[0]
+    fields = data[35:35 + size].decode('utf-8', errors='ignore').split(';')
+    if len(fields) < 6:
+        raise ProbeError('Incomplete server info')
+    return {
+        'players_online': int(fields[4]),
+        'max_players': int(fields[5]),
+        'motd': fields[1],
+        'version': fields[3],
+        'level_name': fields[7] if len(fields) > 7 else None
+    }
+
+
+async def bedrock_ping(host, port=BEDROCK_DEFAULT_PORT, timeout=PROBE_TIMEOUT):
+    """RakNet Unconnected Ping serwera Bedrock (UDP)"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _BedrockPingProtocol(future), remote_addr=(host, port))
+    try:
+        started = time.perf_counter()
+        transport.sendto(b'\x01' + struct.pack('>q', int(time.time() * 1000)) + RAKNET_MAGIC +
+                         os.urandom(8))
+        data = await asyncio.wait_for(future, timeout)
+        result = parse_bedrock_pong(data)
+        result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+    finally:
+        transport.close()
+
+
+async def probe(kind, host, port, timeout=PROBE_TIMEOUT):
+    """Jedna próba; błędy zwracane jako {'reachable': False, 'error'}"""
+    ping = bedrock_ping if kind == 'bedrock' else java_ping
+    try:
+        result = await asyncio.wait_for(ping(host, port, timeout), timeout * 2)
+        result['reachable'] = True
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ProbeError, ValueError) as e:
+        result = {'reachable': False, 'error': str(e) or type(e).__name__}
+    result['time'] = time.time()
+    return result
+
+
+async def probe_all(targets, timeout=PROBE_TIMEOUT):
+    """Wszystkie serwery naraz: {server_id: (kind, host, port)} -> {server_id: wynik}"""
+    ids = list(targets)
+    results = await asyncio.gather(*(probe(*targets[server_id], timeout=timeout) for server_id in ids))
+    return dict(zip(ids, results))
+
+
+class ServerProber:
+    """Cykliczne pingowanie portów gry wszystkich działających serwerów.
+
+    Jedna pętla asyncio w wątku w tle wykonuje próby równolegle, wyniki
+    trafiają do pamięci podręcznej czytanej przez endpointy. Zmiana liczby
+    graczy lub dostępności publikowana jest jako zdarzenie 'players'.
+    `targets()` i `on_results(results)` wołane są w kontekście aplikacji.
+    """
+
+    def __init__(self, bus, targets, on_results=None, interval=PROBE_INTERVAL, timeout=PROBE_TIMEOUT):
+        self.bus = bus
+        self.targets = targets
+        self.on_results = on_results
+        self.interval = interval
+        self.timeout = timeout
+        self._app = None
+        self._results = {}
+        self._thread = None
+        self._lock = threading.Lock()
+        bus.on_subscribe(self._on_subscribe)
+
+    def start(self, app):
+        with self._lock:
+            self._app = app
+            if self._thread is None:
+                self.interval = app.config.get('PROBE_INTERVAL', self.interval)
+                self.timeout = app.config.get('PROBE_TIMEOUT', self.timeout)
+                self._thread = threading.Thread(target=self._run, name='ServerProber', daemon=True)
+                self._thread.start()
+
+    def get(self, server_id):
+        return self._results.get(server_id)
+
+    def results(self):
+        return dict(self._results)
+
+    def _on_subscribe(self, subscription):
+        for server_id in subscription.server_ids:
+            result = self._results.get(server_id)
+            if result is not None:
+                subscription.push({'event': 'players', 'server_id': server_id,
+                                   'time': time.time(), 'data': result})
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        while True:
+            started = time.monotonic()
+            try:
+                with self._app.app_context():
+                    targets = self.targets()
+                results = loop.run_until_complete(probe_all(targets, self.timeout)) if targets else {}
+                self._publish(targets, results)
+                if self.on_results and results:
+                    with self._app.app_context():
+                        self.on_results(results)
+            except Exception as e:
+                print(f"Error probing game ports: {e}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _publish(self, targets, results):
+        for server_id in list(self._results):
+            if server_id not in targets:
+                del self._results[server_id]
+        for server_id, result in results.items():
+            previous = self._results.get(server_id)
+            self._results[server_id] = result
+            if previous is None or any(previous.get(key) != result.get(key)
+                                       for key in ('reachable', 'players_online', 'max_players')):
+                self.bus.publish(server_id, 'players', result)
@@ -0,0 +1,275 @@
+import math
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from .event_bus import event_bus
+from .log_parser import parse_forge_tps_reply, parse_mspt_reply, parse_tps_reply
+from .metrics_sampler import MetricRing
+
+TICK_INTERVAL = 30
+TICK_FIELDS = ('tps', 'mspt', 'mspt_max')
+
+# Progi, poniżej/powyżej których serwer uznajemy za przeciążony
+TPS_ALERT = 18.0
+MSPT_ALERT = 50.0
+
+
+def rcon_settings(properties):
+    """(port, hasło) z server.properties albo None, jeśli RCON jest wyłączony"""
+    if not properties or str(properties.get('enable-rcon', 'false')).lower() != 'true':
+        return None
+    password = properties.get('rcon.password')
+    if not password:
+        return None
+    try:
+        return int(properties.get('rcon.port', 25575)), password
+    except ValueError:
+        return None
+
+
+class RconError(Exception):
+    pass
+
+
+class RconClient:
+    """Minimalny klient protokołu RCON (Source RCON, używany przez Minecraft)"""
+
+    LOGIN = 3
+    COMMAND = 2
+
+    def __init__(self, port, password, host='127.0.0.1', timeout=3):
+        self.port = port
+        self.password = password
+        self.host = host
+        self.timeout = timeout
+        self._socket = None
+        self._request_id = 0
+
+    def _send(self, kind, body):
+        self._request_id += 1
+        payload = struct.pack('<ii', self._request_id, kind) + body.encode('utf-8') + b'\x00\x00'
+        self._socket.sendall(struct.pack('<i', len(payload)) + payload)
+        return self._request_id
+
+    def _recv_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise RconError('Connection closed')
+            data += chunk
+        return data
+
+    def _recv(self):
+        length = struct.unpack('<i', self._recv_exact(4))[0]
+        data = self._recv_exact(length)
+        request_id, _ = struct.unpack('<ii', data[:8])
+        return request_id, data[8:-2].decode('utf-8', errors='ignore')
+
+    def connect(self):
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._send(self.LOGIN, self.password)
+        request_id, _ = self._recv()
+        if request_id == -1:
+            self.close()
+            raise RconError('Authentication failed')
+
+    def command(self, command):
+        if self._socket is None:
+            self.connect()
+        self._send(self.COMMAND, command)
+        return self._recv()[1]
+
+    def close(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
+
+
+class _TickSeries:
+    __slots__ = ('ring', 'lags', 'last', 'source', 'degraded')
+
+    def __init__(self, capacity):
+        # Brak pomiaru to NaN - prawdziwe 0.0 TPS (zawieszony serwer) musi zostać w statystykach
+        self.ring = MetricRing(capacity, TICK_FIELDS, missing=math.nan)
+        self.lags = deque(maxlen=256)
+        self.last = {}
+        self.source = None
+        self.degraded = False
+
+
+class TickHealthCollector:
+    """Pomiar TPS/MSPT serwerów zamiast szacowania z obciążenia CPU.
+
+    Co `interval` sekund dla każdego gotowego serwera:
+      - z włączonym RCON - `tps`/`mspt` (albo `forge tps`) przez RCON,
+        odpowiedź nie trafia do konsoli,
+      - Paper/Purpur/Forge bez RCON - ta sama komenda przez stdin; odpowiedź
+        wraca jako zdarzenie z LogLineParser i trafia do `record()`,
+      - vanilla - TPS szacowany z ostrzeżeń "Can't keep up!" z okresu.
+    `targets()` zwraca {server_id: {'flavor', 'rcon', 'send'}}.
+    """
+
+    def __init__(self, targets, interval=TICK_INTERVAL, retention=3600):
+        self.targets = targets
+        self.interval = interval
+        self.capacity = max(1, int(retention / max(interval, 1)) * 4)
+        self._series = {}
+        self._rcon = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='TickHealthCollector', daemon=True)
+                self._thread.start()
+
+    def _get_series(self, server_id):
+        series = self._series.get(server_id)
+        if series is None:
+            series = self._series[server_id] = _TickSeries(self.capacity)
+        return series
+
+    def forget(self, server_id):
+        with self._lock:
+            self._series.pop(server_id, None)
+            client = self._rcon.pop(server_id, None)
+        if client:
+            client.close()
+
+    def record(self, server_id, source, tps=None, mspt=None, mspt_max=None):
+        """Dopisz pomiar; brakujące pola przejmują ostatnią znaną wartość"""
+        now = time.time()
+        with self._lock:
+            series = self._get_series(server_id)
+            for field, value in (('tps', tps), ('mspt', mspt), ('mspt_max', mspt_max)):
+                if value is not None:
+                    series.last[field] = value
+            series.source = source
+            series.ring.append(now, series.last)
+            current_tps = series.last.get('tps')
+            current_mspt = series.last.get('mspt')
+            degraded = (current_tps is not None and current_tps < TPS_ALERT) or \
+                (current_mspt is not None and current_mspt > MSPT_ALERT)
+            changed = degraded != series.degraded
+            series.degraded = degraded
+
+        event_bus.publish(server_id, 'tick', {'tps': current_tps, 'mspt': current_mspt, 'source': source})
+        if changed:
+            event_bus.publish(server_id, 'server_event', {
+                'type': 'tick_regression' if degraded else 'tick_recovered',
+                'tps': current_tps,
+                'mspt': current_mspt,
+                'time': now
+            })
+
+    def record_lag(self, server_id, behind_ms):
+        with self._lock:
+            self._get_series(server_id).lags.append((time.time(), behind_ms))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                targets = self.targets()
+            except Exception as e:
+                print(f"Error listing tick health targets: {e}")
+                continue
+            for server_id in list(self._series):
+                if server_id not in targets:
+                    self.forget(server_id)
+            for server_id, target in targets.items():
+                try:
+                    self._collect(server_id, target)
+                except Exception as e:
+                    print(f"Error measuring tick health of server {server_id}: {e}")
+
+    def _collect(self, server_id, target):
+        flavor = target['flavor']
+        if target.get('rcon') and flavor in ('paper', 'forge'):
+            if self._collect_rcon(server_id, flavor, target['rcon']):
+                return
+        if flavor == 'paper':
+            target['send']('tps')
+            target['send']('mspt')
+        elif flavor == 'forge':
+            target['send']('forge tps')
+        else:
+            self._estimate_from_lag(server_id)
+
+    def _collect_rcon(self, server_id, flavor, settings):
+        client = self._rcon.get(server_id)
+        if client is None or (client.port, client.password) != settings:
+            if client:
+                client.close()
+            client = self._rcon[server_id] = RconClient(*settings)
+        try:
+            if flavor == 'forge':
+                reply = parse_forge_tps_reply(client.command('forge tps'))
+                if reply is None:
+                    return False
+                self.record(server_id, 'rcon', tps=reply[1], mspt=reply[0])
+                return True
+            tps = parse_tps_reply(client.command('tps'))
+            if tps is None:
+                return False
+            mspt = parse_mspt_reply(client.command('mspt'))
+            self.record(server_id, 'rcon', tps=tps, mspt=mspt[0] if mspt else None,
+                        mspt_max=mspt[1] if mspt else None)
+            return True
+        except (OSError, RconError) as e:
+            print(f"RCON tick query failed for server {server_id}: {e}")
+            client.close()
+            return False
+
+    def _estimate_from_lag(self, server_id):
+        """Vanilla: serwer zalegający o L ms w oknie W zrobił ~20*W/(W+L) ticków/s"""
+        now = time.time()
+        with self._lock:
+            series = self._get_series(server_id)
+            behind = sum(ms for ts, ms in series.lags if ts >= now - self.interval)
+        window_ms = self.interval * 1000
+        tps = round(20.0 * window_ms / (window_ms + behind), 2)
+        self.record(server_id, 'lag', tps=tps, mspt=round((window_ms + behind) / window_ms * 50.0, 1))
+
+    def latest_all(self):
+        """Ostatnie pomiary wszystkich serwerów {server_id: {'tps', 'mspt', 'mspt_max'}}"""
+        with self._lock:
+            return {server_id: dict(series.last) for server_id, series in self._series.items() if series.last}
+
+    def summary(self, server_id, window=300):
+        """Ostatni pomiar i percentyle TPS/MSPT z ostatnich `window` sekund"""
+        with self._lock:
+            series = self._series.get(server_id)
+            if series is None or not series.ring.count:
+                return None
+            ring = series.ring
+            indexes = ring.indexes_since(time.time() - window)
+            tps_values = sorted(v for v in (ring.columns[0][i] for i in indexes) if not math.isnan(v))
+            mspt_values = sorted(v for v in (ring.columns[1][i] for i in indexes) if not math.isnan(v))
+            return {
+                'tps': series.last.get('tps'),
+                'mspt': series.last.get('mspt'),
+                'mspt_max': series.last.get('mspt_max'),
+                'source': series.source,
+                'degraded': series.degraded,
+                'samples': len(indexes),
+                'tps_min': tps_values[0] if tps_values else None,
+                'tps_p5': _percentile(tps_values, 5),
+                'mspt_p50': _percentile(mspt_values, 50),
+                'mspt_p95': _percentile(mspt_values, 95),
+                'mspt_p99': _percentile(mspt_values, 99)
+            }
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    k = min(len(values) - 1, max(0, int(round(percent / 100 * (len(values) - 1)))))
+    return round(values[k], 2)
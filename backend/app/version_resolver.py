@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import requests
+
+MANIFEST_TTL = 600
+FETCH_TIMEOUT = 5.0
+CONNECT_TIMEOUT = 3.0
+FAILURE_BACKOFF = 60
+USER_AGENT = 'MCPanel/1.0 (+https://github.com/gekomod/mcpanel)'
+
+MOJANG_MANIFEST_URL = 'https://piston-meta.mojang.com/mc/game/version_manifest_v2.json'
+PAPER_BUILDS_URL = 'https://api.papermc.io/v2/projects/paper/versions/{version}/builds'
+PAPER_DOWNLOAD_URL = 'https://api.papermc.io/v2/projects/paper/versions/{version}/builds/{build}/downloads/{name}'
+PURPUR_VERSION_URL = 'https://api.purpurmc.org/v2/purpur/{version}'
+PURPUR_DOWNLOAD_URL = 'https://api.purpurmc.org/v2/purpur/{version}/{build}/download'
+FABRIC_VERSIONS_URL = 'https://meta.fabricmc.net/v2/versions'
+FABRIC_SERVER_URL = 'https://meta.fabricmc.net/v2/versions/loader/{version}/{loader}/{installer}/server/jar'
+
+
+class _Document:
+    __slots__ = ('data', 'etag', 'last_modified', 'fetched_at', 'immutable')
+
+    def __init__(self, data, etag=None, last_modified=None, fetched_at=0, immutable=False):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.immutable = immutable
+
+
+class ManifestCache:
+    """Dokumenty JSON z API wersji w pamięci i na dysku, odświeżane warunkowo.
+
+    Świeży wpis (młodszy niż `ttl`) jest zwracany z pamięci bez sieci.
+    Przeterminowany też jest zwracany od razu, a wątek w tle wysyła
+    zapytanie warunkowe (If-None-Match / If-Modified-Since) - 304 tylko
+    przedłuża ważność. Sieć blokuje wywołującego wyłącznie przy pustej
+    pamięci podręcznej i wtedy z limitem czasu; błąd odświeżenia zostawia
+    ostatnią poprawną wersję. Dokumenty niezmienne (`immutable`) nie wygasają.
+    """
+
+    def __init__(self, cache_dir, ttl=MANIFEST_TTL, timeout=FETCH_TIMEOUT):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        self._documents = {}
+        self._refreshing = set()
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest() + '.json')
+
+    def _load(self, url):
+        try:
+            with open(self._path(url), 'r') as f:
+                stored = json.load(f)
+            return _Document(stored['data'], stored.get('etag'), stored.get('last_modified'),
+                             stored.get('fetched_at', 0), stored.get('immutable', False))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, url, document):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(url)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'url': url, 'data': document.data, 'etag': document.etag,
+                           'last_modified': document.last_modified, 'fetched_at': document.fetched_at,
+                           'immutable': document.immutable}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not write version cache for {url}: {e}")
+
+    def get(self, url, immutable=False):
+        """Dane JSON spod `url` albo None, gdy nie ma ich ani w sieci, ani w pamięci podręcznej"""
+        document = self._documents.get(url)
+        if document is None:
+            with self._lock:
+                document = self._documents.get(url)
+                if document is None:
+                    document = self._load(url)
+                    if document is not None:
+                        self._documents[url] = document
+        if document is None:
+            # Bez danych i z niedostępnym API - nie czekaj na limit czasu przy każdej instalacji
+            if time.time() - self._failed.get(url, 0) < FAILURE_BACKOFF:
+                return None
+            document = self._fetch(url, None, immutable)
+            return document.data if document else None
+        if not document.immutable and time.time() - document.fetched_at > self.ttl:
+            self._refresh_async(url)
+        return document.data
+
+    def revalidate(self, url):
+        """Synchroniczne odświeżenie (np. gdy brakuje świeżo wydanej wersji); None gdy nic nowego"""
+        previous = self._documents.get(url)
+        if previous is not None and time.time() - previous.fetched_at < FAILURE_BACKOFF:
+            return None
+        document = self._fetch(url, previous, False)
+        return document.data if document and document is not previous else None
+
+    def _refresh_async(self, url):
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+
+        def refresh():
+            try:
+                self._fetch(url, self._documents.get(url), False)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(url)
+        threading.Thread(target=refresh, name='ManifestRefresh', daemon=True).start()
+
+    def _fetch(self, url, previous, immutable):
+        headers = {}
+        if previous is not None:
+            if previous.etag:
+                headers['If-None-Match'] = previous.etag
+            if previous.last_modified:
+                headers['If-Modified-Since'] = previous.last_modified
+        try:
+            response = self.session.get(url, headers=headers, timeout=(CONNECT_TIMEOUT, self.timeout))
+            if response.status_code == 304 and previous is not None:
+                document = _Document(previous.data, previous.etag, previous.last_modified, time.time(),
+                                     previous.immutable)
+            else:
+                response.raise_for_status()
+                document = _Document(response.json(), response.headers.get('ETag'),
+                                     response.headers.get('Last-Modified'), time.time(), immutable)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Version metadata fetch failed for {url}: {e}"
+                  + (" (using last known data)" if previous is not None else ""))
+            if previous is not None:
+                # Niedostępne API - następna próba dopiero po FAILURE_BACKOFF, nie przy każdym odczycie
+                previous.fetched_at = max(previous.fetched_at, time.time() - self.ttl + FAILURE_BACKOFF)
+            else:
+                self._failed[url] = time.time()
+            return None
+        self._failed.pop(url, None)
+        self._documents[url] = document
+        self._store(url, document)
+        return document
+
+    def prefetch(self, urls):
+        """Rozgrzej pamięć podręczną w tle (np. przy starcie panelu)"""
+        for url in urls:
+            if url not in self._documents and self._load(url) is None:
+                threading.Thread(target=self.get, args=(url,), name='ManifestPrefetch', daemon=True).start()
+
+
+class VersionResolver:
+    """Rozwiązywanie (implementacja, wersja) -> przypięty URL pobrania z buildem i sumą kontrolną.
+
+    Wynik: {'url', 'build', 'name', 'checksums': {'sha1' | 'sha256': ...}} albo None.
+    Wszystkie dokumenty pochodzą z ManifestCache, więc przy ciepłej pamięci
+    podręcznej rozwiązanie nie dotyka sieci.
+    """
+
+    def __init__(self, cache_dir, ttl=MANIFEST_TTL, timeout=FETCH_TIMEOUT):
+        self.cache = ManifestCache(cache_dir, ttl, timeout)
+
+    def start(self):
+        self.cache.prefetch([MOJANG_MANIFEST_URL, FABRIC_VERSIONS_URL])
+
+    def resolve(self, implementation, version):
+        resolver = getattr(self, f'_resolve_{implementation}', None)
+        if resolver is None:
+            return None
+        try:
+            return resolver(version)
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            print(f"Unexpected version metadata for {implementation} {version}: {e}")
+            return None
+
+    def _resolve_vanilla(self, version):
+        manifest = self.cache.get(MOJANG_MANIFEST_URL)
+        if not manifest:
+            return None
+        entry = self._find_release(manifest, version)
+        if entry is None:
+            # Wersja nowsza niż manifest w pamięci podręcznej
+            manifest = self.cache.revalidate(MOJANG_MANIFEST_URL)
+            entry = self._find_release(manifest, version) if manifest else None
+        if entry is None:
+            return None
+        # Dokument wersji ma w URL własny hash - nigdy się nie zmienia
+        version_info = self.cache.get(entry['url'], immutable=True)
+        if not version_info:
+            return None
+        server = version_info['downloads']['server']
+        return {'url': server['url'], 'build': server['sha1'], 'name': 'server.jar',
+                'checksums': {'sha1': server['sha1']}}
+
+    @staticmethod
+    def _find_release(manifest, version):
+        return next((entry for entry in manifest['versions']
+                     if entry['id'] == version and entry['type'] == 'release'), None)
+
+    def _resolve_paper(self, version):
+        data = self.cache.get(PAPER_BUILDS_URL.format(version=version))
+        builds = (data or {}).get('builds') or []
+        if not builds:
+            return None
+        # Najnowszy build z kanału default, a gdy go brak - najnowszy w ogóle
+        stable = [build for build in builds if build.get('channel', 'default') == 'default']
+        latest = max(stable or builds, key=lambda build: build['build'])
+        application = latest['downloads']['application']
+        return {
+            'url': PAPER_DOWNLOAD_URL.format(version=version, build=latest['build'], name=application['name']),
+            'build': str(latest['build']),
+            'name': application['name'],
+            'checksums': {'sha256': application['sha256']} if application.get('sha256') else {}
+        }
+
+    def _resolve_purpur(self, version):
+        data = self.cache.get(PURPUR_VERSION_URL.format(version=version))
+        build = ((data or {}).get('builds') or {}).get('latest')
+        if not build:
+            return None
+        return {'url': PURPUR_DOWNLOAD_URL.format(version=version, build=build), 'build': str(build),
+                'name': f'purpur-{version}-{build}.jar', 'checksums': {}}
+
+    def _resolve_fabric(self, version):
+        data = self.cache.get(FABRIC_VERSIONS_URL)
+        if not data:
+            return None
+        installer = next((item['version'] for item in data['installer'] if item['stable']), None)
+        if not installer:
+            return None
+        loader = next((item['version'] for item in data['loader']
+                       if item['version'] == version or item['version'].startswith(version)), None)
+        if not loader:
+            loader = next((item['version'] for item in data['loader'] if item.get('stable')),
+                          data['loader'][0]['version'])
+        return {'url': FABRIC_SERVER_URL.format(version=version, loader=loader, installer=installer),
+                'build': f'{loader}-{installer}', 'name': 'fabric-server.jar', 'checksums': {}}
@@ -13,6 +13,46 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     SERVER_BASE_PATH = os.path.join(basedir, '..', 'servers')
     MAX_BACKUP_COUNT = 10
+    CONSOLE_BUFFER_LINES = int(os.environ.get('CONSOLE_BUFFER_LINES', 1000))
+    CONSOLE_ECHO_STDOUT = os.environ.get('CONSOLE_ECHO_STDOUT', 'false').lower() == 'true'
+    LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', 1.0))
+    LOG_FLUSH_BYTES = int(os.environ.get('LOG_FLUSH_BYTES', 64 * 1024))
+    LOG_ROTATE_BYTES = int(os.environ.get('LOG_ROTATE_BYTES', 32 * 1024 * 1024))
+    LOG_ROTATE_DAILY = os.environ.get('LOG_ROTATE_DAILY', 'true').lower() == 'true'
+    LOG_ARCHIVE_KEEP = int(os.environ.get('LOG_ARCHIVE_KEEP', 30))
+    LOG_SEARCH_RETENTION_DAYS = int(os.environ.get('LOG_SEARCH_RETENTION_DAYS', 30))
+    METRICS_SAMPLE_INTERVAL = float(os.environ.get('METRICS_SAMPLE_INTERVAL', 2))
+    METRICS_RETENTION = int(os.environ.get('METRICS_RETENTION', 3600))
+    TICK_HEALTH_INTERVAL = int(os.environ.get('TICK_HEALTH_INTERVAL', 30))
+    PROBE_INTERVAL = float(os.environ.get('PROBE_INTERVAL', 15))
+    PROBE_TIMEOUT = float(os.environ.get('PROBE_TIMEOUT', 2.0))
+    RECONCILE_INTERVAL = float(os.environ.get('RECONCILE_INTERVAL', 15))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_ALLOW_LOCALHOST = os.environ.get('METRICS_ALLOW_LOCALHOST', 'false').lower() == 'true'
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 1.0))
+    METRICS_HISTORY_INTERVAL = float(os.environ.get('METRICS_HISTORY_INTERVAL', 10))
+    METRICS_RAW_RETENTION = int(os.environ.get('METRICS_RAW_RETENTION', 6 * 3600))
+    METRICS_MINUTE_RETENTION = int(os.environ.get('METRICS_MINUTE_RETENTION', 14 * 86400))
+    METRICS_HOUR_RETENTION = int(os.environ.get('METRICS_HOUR_RETENTION', 400 * 86400))
+    DISK_USAGE_INTERVAL = float(os.environ.get('DISK_USAGE_INTERVAL', 5))
+    DISK_USAGE_RESCAN = int(os.environ.get('DISK_USAGE_RESCAN', 3600))
+    CGROUPS_ENABLED = os.environ.get('CGROUPS_ENABLED', 'false').lower() == 'true'
+    CGROUP_PARENT = os.environ.get('CGROUP_PARENT', 'mcpanel.slice')
+    CGROUP_CPU_MAX = os.environ.get('CGROUP_CPU_MAX')
+    CGROUP_MEMORY_MAX = os.environ.get('CGROUP_MEMORY_MAX')
+    CGROUP_IO_WEIGHT = os.environ.get('CGROUP_IO_WEIGHT')
+    ARTIFACT_CACHE_PATH = os.environ.get('ARTIFACT_CACHE_PATH')
+    ARTIFACT_LATEST_TTL = int(os.environ.get('ARTIFACT_LATEST_TTL', 6 * 3600))
+    VERSION_CACHE_PATH = os.environ.get('VERSION_CACHE_PATH')
+    VERSION_CACHE_TTL = int(os.environ.get('VERSION_CACHE_TTL', 600))
+    VERSION_FETCH_TIMEOUT = float(os.environ.get('VERSION_FETCH_TIMEOUT', 5.0))
+    DOWNLOAD_CONNECT_TIMEOUT = float(os.environ.get('DOWNLOAD_CONNECT_TIMEOUT', 10.0))
+    DOWNLOAD_READ_TIMEOUT = float(os.environ.get('DOWNLOAD_READ_TIMEOUT', 60.0))
+    DOWNLOAD_RETRIES = int(os.environ.get('DOWNLOAD_RETRIES', 5))
+    DOWNLOAD_SEGMENTS = int(os.environ.get('DOWNLOAD_SEGMENTS', 4))
+    DOWNLOAD_SEGMENT_MIN_SIZE = int(os.environ.get('DOWNLOAD_SEGMENT_MIN_SIZE', 32 * 1024 * 1024))
+    DOWNLOAD_MAX_CONCURRENT = int(os.environ.get('DOWNLOAD_MAX_CONCURRENT', 3))
+    DOWNLOAD_BANDWIDTH_LIMIT = int(os.environ.get('DOWNLOAD_BANDWIDTH_LIMIT', 0))
         
     # Ustawienia CORS
     CORS_ORIGINS = ["http://0.0.0.0:3000"]
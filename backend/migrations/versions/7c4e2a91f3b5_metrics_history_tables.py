@@ -0,0 +1,94 @@
+"""metrics history tables and agent heartbeat indexes
+
+Revision ID: 7c4e2a91f3b5
+Revises: 2d1796b30ba2
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2a91f3b5'
+down_revision = '2d1796b30ba2'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_agent_heartbeat_timestamp', ['timestamp']),
+    ('ix_agent_heartbeat_agent_time', ['agent_id', 'timestamp']),
+)
+
+
+def _existing_indexes(inspector):
+    if not inspector.has_table('agent_heartbeat'):
+        return None
+    return {index['name'] for index in inspector.get_indexes('agent_heartbeat')}
+
+
+def upgrade():
+    # Bazy utworzone przez db.create_all() po zmianie modeli mają już te tabele i indeksy
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('server_metric_sample'):
+        op.create_table(
+            'server_metric_sample',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('server_id', sa.Integer(), nullable=False),
+            sa.Column('cpu_usage', sa.Float(), nullable=True),
+            sa.Column('memory_mb', sa.Float(), nullable=True),
+            sa.Column('tps', sa.Float(), nullable=True),
+            sa.Column('players_online', sa.Integer(), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['server_id'], ['server.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_server_metric_sample_timestamp', 'server_metric_sample', ['timestamp'], unique=False)
+        op.create_index('ix_server_metric_sample_server_time', 'server_metric_sample',
+                        ['server_id', 'timestamp'], unique=False)
+
+    if not inspector.has_table('metric_rollup'):
+        op.create_table(
+            'metric_rollup',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('scope', sa.String(length=10), nullable=False),
+            sa.Column('entity_id', sa.Integer(), nullable=False),
+            sa.Column('metric', sa.String(length=32), nullable=False),
+            sa.Column('resolution', sa.Integer(), nullable=False),
+            sa.Column('bucket_start', sa.DateTime(), nullable=False),
+            sa.Column('min_value', sa.Float(), nullable=True),
+            sa.Column('max_value', sa.Float(), nullable=True),
+            sa.Column('sum_value', sa.Float(), nullable=True),
+            sa.Column('sample_count', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_metric_rollup_series', 'metric_rollup',
+                        ['scope', 'entity_id', 'metric', 'resolution', 'bucket_start'], unique=True)
+        op.create_index('ix_metric_rollup_bucket', 'metric_rollup', ['resolution', 'bucket_start'], unique=False)
+
+    existing = _existing_indexes(inspector)
+    if existing is not None:
+        for name, columns in INDEXES:
+            if name not in existing:
+                op.create_index(name, 'agent_heartbeat', columns, unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    existing = _existing_indexes(inspector)
+    if existing is not None:
+        for name, _columns in reversed(INDEXES):
+            if name in existing:
+                op.drop_index(name, table_name='agent_heartbeat')
+
+    if inspector.has_table('metric_rollup'):
+        op.drop_index('ix_metric_rollup_bucket', table_name='metric_rollup')
+        op.drop_index('ix_metric_rollup_series', table_name='metric_rollup')
+        op.drop_table('metric_rollup')
+
+    if inspector.has_table('server_metric_sample'):
+        op.drop_index('ix_server_metric_sample_server_time', table_name='server_metric_sample')
+        op.drop_index('ix_server_metric_sample_timestamp', table_name='server_metric_sample')
+        op.drop_table('server_metric_sample')
@@ -0,0 +1,198 @@
+"""Downloader panelu i jego kopia w agencie na lokalnym serwerze HTTP, który zrywa połączenia"""
+import hashlib
+import http.server
+import importlib.util
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import AGENT_PATH
+
+DATA = os.urandom(2 * 1024 * 1024 + 123)
+PIECE = 16 * 1024
+
+
+def _load_agent():
+    spec = importlib.util.spec_from_file_location('mcpanel_agent', AGENT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module', params=['backend', 'agent'])
+def impl(request):
+    """Moduł z Downloader/DownloadError/ChecksumMismatch - backend albo samodzielny agent"""
+    if request.param == 'agent':
+        return _load_agent()
+    from app import downloader
+    return downloader
+
+
+class _FastTime:
+    """Moduł time bez czekania między próbami"""
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    @staticmethod
+    def sleep(seconds):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch, impl):
+    monkeypatch.setattr(impl, 'time', _FastTime())
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        header = self.headers.get('Range')
+        with server.lock:
+            server.requests.append(header)
+        start, end = 0, len(DATA) - 1
+        if header and server.ranges:
+            first, _, last = header.partition('=')[2].partition('-')
+            start, end = int(first), int(last) if last else len(DATA) - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+
+        body = DATA[start:end + 1]
+        drop = False
+        if header != 'bytes=0-0':
+            with server.lock:
+                if server.drops:
+                    server.drops -= 1
+                    drop = True
+        sent = 0
+        while sent < len(body):
+            if drop and sent >= server.drop_after:
+                # Zerwij połączenie w połowie odpowiedzi
+                self.wfile.flush()
+                self.close_connection = True
+                self.connection.shutdown(2)
+                return
+            piece = body[sent:sent + PIECE]
+            self.wfile.write(piece)
+            sent += len(piece)
+
+
+@pytest.fixture
+def http_server():
+    """Serwer plików: `ranges` - obsługa Range, `drops` - ile odpowiedzi zerwać po `drop_after` bajtach"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.ranges = True
+    server.drops = 0
+    # Więcej niż jeden kawałek CHUNK_SIZE, żeby przed zerwaniem coś trafiło do pliku
+    server.drop_after = 300 * 1024
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/server.jar'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_resumes_with_range_after_dropped_connection(impl, http_server, tmp_path):
+    http_server.drops = 2
+    path = str(tmp_path / 'server.jar')
+
+    result = impl.Downloader(segments=1).download(http_server.url, path)
+
+    assert _read(path) == DATA
+    assert result['size'] == len(DATA)
+    starts = [int(header.split('=')[1].split('-')[0]) for header in http_server.requests[1:]]
+    # Pierwsze pobranie od zera, potem dwa wznowienia od kolejnych zapisanych pozycji
+    assert len(starts) == 3
+    assert 0 == starts[0] < starts[1] < starts[2]
+    assert not os.path.exists(path + '.part')
+    assert not os.path.exists(path + '.part.json')
+
+
+def test_segmented_fetch(impl, http_server, tmp_path):
+    path = str(tmp_path / 'server.jar')
+    progress = []
+
+    impl.Downloader(segments=4, segment_min_size=64 * 1024).download(
+        http_server.url, path, progress=lambda done, total: progress.append((done, total)))
+
+    assert _read(path) == DATA
+    segments = [header for header in http_server.requests if header != 'bytes=0-0']
+    assert len(segments) == 4
+    assert len({header.split('=')[1].split('-')[0] for header in segments}) == 4
+    assert progress[-1] == (len(DATA), len(DATA))
+
+
+def test_segmented_fetch_survives_drops(impl, http_server, tmp_path):
+    http_server.drops = 3
+    path = str(tmp_path / 'server.jar')
+
+    impl.Downloader(segments=4, segment_min_size=64 * 1024).download(http_server.url, path)
+
+    assert _read(path) == DATA
+
+
+def test_bounded_retries_without_range_support(impl, http_server, tmp_path):
+    http_server.ranges = False
+    http_server.drops = 1000
+    path = str(tmp_path / 'server.jar')
+
+    with pytest.raises(impl.DownloadError):
+        impl.Downloader(retries=3).download(http_server.url, path)
+
+    # Próba sondująca + pierwsze pobranie + `retries` ponowień - bez postępu za najdalszą pozycją
+    transfers = [header for header in http_server.requests if header != 'bytes=0-0']
+    assert len(transfers) == 4
+    assert not os.path.exists(path)
+
+
+def test_without_range_support_restarts_from_zero(impl, http_server, tmp_path):
+    http_server.ranges = False
+    http_server.drops = 1
+    path = str(tmp_path / 'server.jar')
+
+    impl.Downloader().download(http_server.url, path)
+
+    assert _read(path) == DATA
+
+
+def test_checksum_mismatch_leaves_nothing_behind(impl, http_server, tmp_path):
+    path = str(tmp_path / 'server.jar')
+
+    with pytest.raises(impl.ChecksumMismatch):
+        impl.Downloader().download(http_server.url, path, checksums={'sha256': '0' * 64})
+
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + '.part')
+    assert not os.path.exists(path + '.part.json')
+
+
+def test_checksum_verified_while_streaming(impl, http_server, tmp_path):
+    path = str(tmp_path / 'server.jar')
+    expected = hashlib.sha1(DATA).hexdigest()
+
+    result = impl.Downloader().download(http_server.url, path, checksums={'sha1': expected})
+
+    assert result['digests']['sha1'] == expected
+    assert result['digests']['sha256'] == hashlib.sha256(DATA).hexdigest()
+    assert _read(path) == DATA
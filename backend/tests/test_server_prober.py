@@ -0,0 +1,152 @@
+"""Sondy portów gry na lokalnym fałszywym serwerze Java (Server List Ping) i Bedrock (RakNet)"""
+import asyncio
+import json
+import socket
+import struct
+
+import pytest
+
+from app.server_prober import (
+    RAKNET_MAGIC, ProbeError, _pack_varint, _packet, _read_varint, bedrock_ping, java_ping,
+    parse_bedrock_pong, probe_all
+)
+
+JAVA_STATUS = {
+    'version': {'name': 'Paper 1.21.1', 'protocol': 767},
+    'players': {'max': 20, 'online': 3},
+    'description': {'text': 'Witaj ', 'extra': [{'text': 'na serwerze'}]}
+}
+BEDROCK_INFO = 'MCPE;Bedrock test;686;1.21.2;5;10;1234567890;Overworld;Survival;1;19132;19133;'
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def _java_responder(reader, writer):
+    """Handshake + status request -> status JSON, ping -> pong z tym samym payloadem"""
+    try:
+        while True:
+            length = await _read_varint(reader)
+            data = await reader.readexactly(length)
+            packet_id = data[0]
+            if packet_id == 0x00 and len(data) > 1:
+                continue  # handshake
+            if packet_id == 0x00:
+                status = json.dumps(JAVA_STATUS).encode('utf-8')
+                writer.write(_packet(0x00, _pack_varint(len(status)) + status))
+            elif packet_id == 0x01:
+                writer.write(_packet(0x01, data[1:]))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+class _BedrockResponder(asyncio.DatagramProtocol):
+    """Unconnected Ping (0x01) -> Unconnected Pong (0x1c) z opisem serwera"""
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if data[:1] != b'\x01' or data[9:25] != RAKNET_MAGIC:
+            return
+        info = BEDROCK_INFO.encode('utf-8')
+        pong = (b'\x1c' + data[1:9] + struct.pack('>q', 0x1122334455667788) + RAKNET_MAGIC +
+                struct.pack('>H', len(info)) + info)
+        self.transport.sendto(pong, addr)
+
+
+def _silent_udp_port():
+    """Port UDP, pod którym nikt nie odpowiada (gniazdo otwarte, ale bez odczytu)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    return sock
+
+
+def test_java_ping():
+    async def scenario():
+        server = await asyncio.start_server(_java_responder, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await java_ping('127.0.0.1', port, timeout=2)
+
+    result = _run(scenario())
+
+    assert result['players_online'] == 3
+    assert result['max_players'] == 20
+    assert result['motd'] == 'Witaj na serwerze'
+    assert result['version'] == 'Paper 1.21.1'
+    assert result['latency_ms'] is not None and result['latency_ms'] >= 0
+
+
+def test_bedrock_ping():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(_BedrockResponder, local_addr=('127.0.0.1', 0))
+        try:
+            return await bedrock_ping('127.0.0.1', transport.get_extra_info('sockname')[1], timeout=2)
+        finally:
+            transport.close()
+
+    result = _run(scenario())
+
+    assert result['players_online'] == 5
+    assert result['max_players'] == 10
+    assert result['motd'] == 'Bedrock test'
+    assert result['version'] == '1.21.2'
+    assert result['level_name'] == 'Overworld'
+    assert result['latency_ms'] >= 0
+
+
+def test_parse_bedrock_pong_rejects_garbage():
+    with pytest.raises(ProbeError):
+        parse_bedrock_pong(b'\x1c' + bytes(40))
+
+
+def test_probe_all():
+    async def scenario(silent_port):
+        loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(_java_responder, '127.0.0.1', 0)
+        transport, _ = await loop.create_datagram_endpoint(_BedrockResponder, local_addr=('127.0.0.1', 0))
+        try:
+            async with server:
+                return await probe_all({
+                    1: ('java', '127.0.0.1', server.sockets[0].getsockname()[1]),
+                    2: ('bedrock', '127.0.0.1', transport.get_extra_info('sockname')[1]),
+                    3: ('bedrock', '127.0.0.1', silent_port),
+                }, timeout=0.3)
+        finally:
+            transport.close()
+
+    silent = _silent_udp_port()
+    try:
+        results = _run(scenario(silent.getsockname()[1]))
+    finally:
+        silent.close()
+
+    assert results[1]['reachable'] is True
+    assert results[1]['players_online'] == 3
+    assert results[2]['reachable'] is True
+    assert results[2]['max_players'] == 10
+    assert results[3]['reachable'] is False
+    assert 'error' in results[3]
+
+
+def test_java_probe_unreachable_when_nothing_answers():
+    async def scenario():
+        # Serwer przyjmuje połączenie, ale nic nie odsyła - próba kończy się po limicie czasu
+        async def mute(reader, writer):
+            await reader.read()
+            writer.close()
+
+        server = await asyncio.start_server(mute, '127.0.0.1', 0)
+        async with server:
+            return await probe_all({7: ('java', '127.0.0.1', server.sockets[0].getsockname()[1])}, timeout=0.3)
+
+    result = _run(scenario())[7]
+
+    assert result['reachable'] is False
+    assert 'players_online' not in result
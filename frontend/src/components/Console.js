@@ -14,9 +14,12 @@ import {
   FiBox
 } from 'react-icons/fi';
 import { useParams, useNavigate } from 'react-router-dom';
-import api from '../services/api';
+import api, { openConsoleStream } from '../services/api';
 import { useLanguage } from '../context/LanguageContext';
 
+// Tyle linii trzyma bufor konsoli backendu (CONSOLE_BUFFER_LINES)
+const MAX_OUTPUT_LINES = 1000;
+
 const Container = styled.div`
   padding: 15px 20px;
   color: #a4aabc;
@@ -262,13 +265,23 @@ function Console() {
       if (server.status === 'running') {
         fetchOutput();
         
-        // Set up auto-refresh if server is running
+        // Auto-refresh: nowe linie przychodzą strumieniem, odpytywanie tylko jako fallback
         let refreshInterval;
+        let closeStream;
         if (autoRefresh) {
-          refreshInterval = setInterval(fetchOutput, 2000); // Refresh every 2 seconds
+          closeStream = openConsoleStream(serverId, {
+            lines: 0,
+            onLines: (lines) => setOutput(prev => [...prev, ...lines.map(line => toOutputEntry(removeAnsiCodes(line)))].slice(-MAX_OUTPUT_LINES)),
+            onReset: () => setOutput([]),
+            onError: () => {
+              refreshInterval = setInterval(fetchOutput, 2000);
+              return false;
+            },
+          });
         }
 
         return () => {
+          if (closeStream) closeStream();
           if (refreshInterval) clearInterval(refreshInterval);
         };
       }
@@ -309,16 +322,7 @@ const fetchOutput = async () => {
       }
       
       const lines = logContent.split('\n').filter(line => line.trim());
-      const formattedOutput = lines.map(line => {
-        // Parse timestamp from log line if available
-        const timestampMatch = line.match(/\[(.*?)\]/);
-        const timestamp = timestampMatch ? parseLogTimestamp(timestampMatch[1]) : new Date();
-        return {
-          timestamp: timestamp,
-          message: line.replace(/\[.*?\]\s*/, '') // Remove timestamp from message
-        };
-      });
-      setOutput(formattedOutput);
+      setOutput(lines.slice(-MAX_OUTPUT_LINES).map(toOutputEntry));
     }
   } catch (error) {
     console.error('Error fetching output:', error);
@@ -326,6 +330,16 @@ const fetchOutput = async () => {
   }
 };
 
+const toOutputEntry = (line) => {
+  // Parse timestamp from log line if available
+  const timestampMatch = line.match(/\[(.*?)\]/);
+  const timestamp = timestampMatch ? parseLogTimestamp(timestampMatch[1]) : new Date();
+  return {
+    timestamp: timestamp,
+    message: line.replace(/\[.*?\]\s*/, '') // Remove timestamp from message
+  };
+};
+
 // Funkcja do usuwania kodów ANSI
 const removeAnsiCodes = (text) => {
   return text.replace(/[\u001b\u009b][[()#;?]*(?:[0-9]{1,4}(?:;[0-9]{0,4})*)?[0-9A-ORZcf-nqry=><]/g, '');
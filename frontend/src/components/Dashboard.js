@@ -20,7 +20,7 @@ import {
 import { FaTimesCircle } from "react-icons/fa";
 import { useNavigate } from 'react-router-dom';
 import { toast } from 'react-toastify'; 
-import api from '../services/api';
+import api, { fetchServersStatus, openDashboardStream, statusEventToCheck } from '../services/api';
 import AddServer from './AddServer';
 import AddUserDialog from './AddUserDialog';
 import { useLanguage } from '../context/LanguageContext';
@@ -486,23 +486,44 @@ function Dashboard() {
   const [showAddUser, setShowAddUser] = useState(false);
   const { t } = useLanguage(); 
 
+  const serverIdsKey = servers.map(server => server.id).join(',');
+
   useEffect(() => {
     fetchServers();
-    
-    const interval = setInterval(checkRealStatus, 10000);
-    return () => clearInterval(interval);
   }, []);
 
+  // Statusy wszystkich serwerów z jednego strumienia zamiast odpytywania każdego osobno
+  useEffect(() => {
+    if (!serverIdsKey) return undefined;
+    // Stan początkowy jednym żądaniem, dalsze zmiany przychodzą strumieniem
+    fetchServersStatus()
+      .then((states) => {
+        setStatusChecks(prev => {
+          const next = { ...prev };
+          Object.entries(states).forEach(([id, state]) => {
+            next[id] = statusEventToCheck(state);
+          });
+          return next;
+        });
+      })
+      .catch((error) => console.error('Error fetching servers status:', error));
+    return openDashboardStream({
+      servers: serverIdsKey.split(','),
+      onStatus: (payload) => {
+        setStatusChecks(prev => ({
+          ...prev,
+          [payload.server_id]: statusEventToCheck(payload)
+        }));
+      }
+    });
+  }, [serverIdsKey]);
+
   const fetchServers = async () => {
     try {
       const response = await api.get('/servers');
       const serversData = response.data;
       setServers(serversData);
       
-      serversData.forEach(server => {
-        checkServerRealStatus(server.id);
-      });
-      
       fetchServerSizes(serversData);
     } catch (error) {
       console.error('Error fetching servers:', error);
@@ -554,12 +575,6 @@ function Dashboard() {
     }
   };
 
-  const checkRealStatus = () => {
-    servers.forEach(server => {
-      checkServerRealStatus(server.id);
-    });
-  };
-
   const handleServerAction = async (serverId, action) => {
     setActionErrors(prev => ({ ...prev, [serverId]: null }));
     
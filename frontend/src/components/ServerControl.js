@@ -28,7 +28,7 @@ import {
 } from 'react-icons/fi';
 import { FaWrench } from "react-icons/fa";
 import { useParams, useNavigate } from 'react-router-dom';
-import api from '../services/api';
+import api, { openConsoleStream } from '../services/api';
 import ProgressBar from './ProgressBar';
 import { toast } from 'react-toastify';
 import { useLanguage } from '../context/LanguageContext';
@@ -695,18 +695,15 @@ useEffect(() => {
 
 useEffect(() => {
   let performanceInterval;
-  let playerStatsInterval;
 
   if (server?.status === 'running') {
     fetchPerformanceStats();
     performanceInterval = setInterval(fetchPerformanceStats, 5000);
-    playerStatsInterval = setInterval(fetchRealtimeOutput, 3000);
   }
 
   return () => {
     stopProgressPolling();
     if (performanceInterval) clearInterval(performanceInterval);
-    if (playerStatsInterval) clearInterval(playerStatsInterval);
   };
 }, [serverId, server?.status]);
 	
@@ -1158,13 +1155,26 @@ const startStatusPolling = (targetStatus) => {
     });
   };
 
-  // Fetch real-time output logs
+  // Real-time output logs - strumień SSE, odpytywanie tylko jako fallback
 	useEffect(() => {
 	  if (server?.status === 'running') {
-		fetchRealtimeOutput();
-		const logInterval = setInterval(fetchRealtimeOutput, 3000);
+		let logInterval = null;
+		setConsoleLogs([]);
 		
-		return () => clearInterval(logInterval);
+		const closeStream = openConsoleStream(serverId, {
+		  onLines: (lines) => setConsoleLogs((prev) => [...prev, ...lines].slice(-100)),
+		  onReset: () => setConsoleLogs([]),
+		  onError: () => {
+			fetchRealtimeOutput();
+			logInterval = setInterval(fetchRealtimeOutput, 3000);
+			return false;
+		  },
+		});
+		
+		return () => {
+		  closeStream();
+		  if (logInterval) clearInterval(logInterval);
+		};
 	  } else {
 		setConsoleLogs([]);
 		setPlayerStats(null); // Resetuj liczbę graczy gdy serwer jest wyłączony
@@ -1173,6 +1183,17 @@ const startStatusPolling = (targetStatus) => {
 
 
 useEffect(() => {
+  // Backend liczy graczy ze sparsowanych zdarzeń konsoli - skan logów tylko jako fallback
+  if (server?.status === 'running' && Array.isArray(performanceStats?.players)) {
+    if (performanceStats.players.join(',') !== (playerStats?.list || []).join(',')) {
+      setPlayerStats({
+        online: performanceStats.players_online,
+        max: server.max_players || 20,
+        list: performanceStats.players
+      });
+    }
+    return;
+  }
   if (server?.status === 'running' && consoleLogs.length > 0) {
     const playerData = trackPlayersFromLogs(consoleLogs);
     
@@ -1185,7 +1206,7 @@ useEffect(() => {
       });
     }
   }
-}, [consoleLogs, server?.status]);
+}, [consoleLogs, server?.status, performanceStats]);
 
   // Funkcja do filtrowania logów
   const getFilteredLogs = () => {
@@ -6,7 +6,7 @@ import {
   FiX
 } from 'react-icons/fi';
 import { useNavigate } from 'react-router-dom';
-import api from '../services/api';
+import api, { fetchServersStatus, openDashboardStream, statusEventToCheck } from '../services/api';
 import AddServer from './AddServer';
 
 const ServersContainer = styled.div`
@@ -210,23 +210,48 @@ function Servers() {
   const [loading, setLoading] = useState(true);
   const [showAddServer, setShowAddServer] = useState(false);
   const [statusChecks, setStatusChecks] = useState({});
+  const [playerCounts, setPlayerCounts] = useState({});
   const navigate = useNavigate();
 
+  const serverIdsKey = servers.map(server => server.id).join(',');
+
   useEffect(() => {
     fetchServers();
-    
-    const interval = setInterval(checkRealStatus, 10000);
-    return () => clearInterval(interval);
   }, []);
 
+  // Statusy wszystkich serwerów z jednego strumienia zamiast odpytywania każdego osobno
+  useEffect(() => {
+    if (!serverIdsKey) return undefined;
+    // Stan początkowy jednym żądaniem, dalsze zmiany przychodzą strumieniem
+    fetchServersStatus()
+      .then((states) => {
+        setStatusChecks(prev => {
+          const next = { ...prev };
+          Object.entries(states).forEach(([id, state]) => {
+            next[id] = statusEventToCheck(state);
+          });
+          return next;
+        });
+      })
+      .catch((error) => console.error('Error fetching servers status:', error));
+    return openDashboardStream({
+      servers: serverIdsKey.split(','),
+      onStatus: (payload) => {
+        setStatusChecks(prev => ({
+          ...prev,
+          [payload.server_id]: statusEventToCheck(payload)
+        }));
+      },
+      onPlayers: (payload) => {
+        setPlayerCounts(prev => ({ ...prev, [payload.server_id]: payload }));
+      }
+    });
+  }, [serverIdsKey]);
+
   const fetchServers = async () => {
     try {
       const response = await api.get('/servers');
       setServers(response.data);
-      
-      response.data.forEach(server => {
-        checkServerRealStatus(server.id);
-      });
     } catch (error) {
       console.error('Error fetching servers:', error);
     } finally {
@@ -234,24 +259,6 @@ function Servers() {
     }
   };
 
-  const checkServerRealStatus = async (serverId) => {
-    try {
-      const response = await api.get(`/servers/${serverId}/real-status`);
-      setStatusChecks(prev => ({
-        ...prev,
-        [serverId]: response.data
-      }));
-    } catch (error) {
-      console.error('Error checking real status:', error);
-    }
-  };
-
-  const checkRealStatus = () => {
-    servers.forEach(server => {
-      checkServerRealStatus(server.id);
-    });
-  };
-
   const isServerReallyRunning = (server) => {
     const statusCheck = statusChecks[server.id];
     if (statusCheck) {
@@ -283,7 +290,9 @@ function Servers() {
       <ServerGrid>
         {servers.map(server => {
           const isRunning = isServerReallyRunning(server);
-          const playerCount = isRunning ? '4/20' : '0/20';
+          const ping = playerCounts[server.id];
+          const online = isRunning ? (ping?.reachable ? ping.players_online : server.player_count || 0) : 0;
+          const playerCount = `${online}/${ping?.max_players || server.max_players || 20}`;
           
           return (
             <ServerCard key={server.id} onClick={() => handleServerClick(server.id)}>
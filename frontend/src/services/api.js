@@ -79,4 +79,109 @@ api.interceptors.response.use(
   }
 );
 
+// Odczyt strumienia SSE przez fetch - EventSource nie wysyła nagłówka Authorization.
+// Wywołuje onMessage(event, payload) dla każdej wiadomości i ponawia połączenie
+// co 3 sekundy; onError może zwrócić false, żeby zakończyć ponawianie.
+const readEventStream = (controller, getUrl, onMessage, onError) => {
+  const handleMessage = (message) => {
+    let event = 'message';
+    let data = '';
+    message.split('\n').forEach((field) => {
+      if (field.startsWith('event:')) event = field.slice(6).trim();
+      else if (field.startsWith('data:')) data += field.slice(5).trim();
+    });
+    if (data) onMessage(event, JSON.parse(data));
+  };
+
+  const run = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const response = await fetch(getUrl(), {
+          headers: { Authorization: `Bearer ${localStorage.getItem('access_token')}` },
+          credentials: 'include',
+          signal: controller.signal,
+        });
+        if (!response.ok || !response.body) {
+          throw new Error(`Event stream error ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let pending = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          pending += decoder.decode(value, { stream: true });
+          const messages = pending.split('\n\n');
+          pending = messages.pop();
+          messages.forEach(handleMessage);
+        }
+      } catch (error) {
+        if (controller.signal.aborted) return;
+        if (onError && onError(error) === false) return;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 3000));
+    }
+  };
+
+  run();
+};
+
+// Strumień konsoli serwera (SSE). Zwraca funkcję zamykającą połączenie.
+export const openConsoleStream = (serverId, { lines = 100, onLines, onReset, onError } = {}) => {
+  const controller = new AbortController();
+  let cursor = null;
+
+  const getUrl = () => {
+    const params = new URLSearchParams({ lines });
+    if (cursor !== null) params.set('since', cursor);
+    return `${API_BASE_URL}/servers/${serverId}/console/stream?${params}`;
+  };
+
+  readEventStream(controller, getUrl, (event, payload) => {
+    if (payload.next !== undefined) cursor = payload.next;
+    if (event === 'lines' && onLines) onLines(payload.lines.map((line) => line.replace(/\n$/, '')));
+    if (event === 'reset' && onReset) onReset();
+  }, onError);
+
+  return () => controller.abort();
+};
+
+// Jeden strumień statusów, metryk i (opcjonalnie) konsoli wielu serwerów
+// zamiast osobnego odpytywania /real-status dla każdego serwera.
+export const openDashboardStream = ({ servers, console: withConsole = false, onStatus, onMetrics, onPlayers, onConsole, onError } = {}) => {
+  const controller = new AbortController();
+
+  const getUrl = () => {
+    const params = new URLSearchParams();
+    if (servers && servers.length) params.set('servers', servers.join(','));
+    if (withConsole) params.set('console', '1');
+    return `${API_BASE_URL}/dashboard/stream?${params}`;
+  };
+
+  readEventStream(controller, getUrl, (event, payload) => {
+    if (event === 'status' && onStatus) onStatus(payload);
+    if (event === 'metrics' && onMetrics) onMetrics(payload);
+    if (event === 'players' && onPlayers) onPlayers(payload);
+    if (event === 'console' && onConsole) onConsole(payload);
+  }, onError);
+
+  return () => controller.abort();
+};
+
+// Zdarzenie 'status' ze strumienia w kształcie odpowiedzi /servers/<id>/real-status
+export const statusEventToCheck = (payload) => ({
+  database_status: payload.status,
+  real_status: { running: payload.is_running, pid: payload.pid },
+  is_running: payload.is_running,
+  pid: payload.pid,
+  source: payload.source,
+});
+
+// Stan wszystkich widocznych serwerów jednym żądaniem: {server_id: {is_running, status, pid, ...}}
+export const fetchServersStatus = async () => {
+  const response = await api.get('/servers/status');
+  return response.data.servers;
+};
+
 export default api;